@@ -1,39 +1,152 @@
 from fastapi import FastAPI, BackgroundTasks, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware # Import the CORS middleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
 import asyncio
+import json
 import time
 import uuid
 
 from langchain.globals import set_llm_cache
-from langchain_community.cache import InMemoryCache
 from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.types import Command
-from langfuse.langchain import CallbackHandler
 
 from app.workflow.graph import research_workflow
+from app.workflow.runner import run_graph, warm_up
+from app.workflow.speculation import speculation
 from app.models.schemas import *
-from app.models.model_config import ModelConfig
+from app.models.llm_registry import llm_registry
+from app.workflow.budget import budget_limits
 
 from app.utils.config import settings
+from app.utils.admission import (
+    QueueFullError, RunQueue, llm_rate_limiters, planning_queue, resume_queue, share_rate_limits, tool_rate_limiters,
+)
+from app.utils.job_queue import event_log, job_queue
+from app.utils.tool_cache import tool_cache
+from app.utils.findings_index import findings_index
+from app.utils.cassettes import cassettes
+from app.utils.tools import tool_callers
+from app.utils.tracing import get_run_callbacks
+from app.utils.llm_cache import build_llm_cache
+from app.utils.logs import configure_logging, get_logger
+from app.utils.metrics import gauge, metrics
+from app.utils.checkpointer import DurableSqliteSaver
+from app.utils.result_store import final_results
+from app.utils import http
+from app.utils.events import TERMINAL_EVENTS, event_bus
+from app.worker import WorkerPool
 
 LANGFUSE_PUBLIC_KEY = settings.LANGFUSE_PUBLIC_KEY
 LANGFUSE_SECRET_KEY = settings.LANGFUSE_SECRET_KEY
 LANGFUSE_HOST = settings.LANGFUSE_HOST
 
-langfuse_handler = CallbackHandler()
-
-set_llm_cache(InMemoryCache())
+configure_logging()
+log = get_logger(__name__)
+llm_cache = build_llm_cache()
+set_llm_cache(llm_cache)
 memory = InMemorySaver()
+worker_pool: Optional[WorkerPool] = None
+# Set once startup, including the warm-up, is done; /ready answers 503 until then
+ready = asyncio.Event()
+
+
+async def _warm_up():
+    """Warms up the configured provider's client in the background, then marks the server ready."""
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        # Tasks still build their client on first use, and report the error then
+        log.exception("warm_up_failed", error=str(e))
+    ready.set()
+
+
+async def _relay_worker_events():
+    """Forwards the progress events written by worker processes to this process's event bus."""
+    last_id = await asyncio.to_thread(event_log.last_id)
+    last_prune = time.monotonic()
+    while True:
+        rows = await asyncio.to_thread(event_log.read_after, last_id)
+        for last_id, task_id, event, data in rows:
+            if event == "report_token":
+                event_bus.append_report(task_id, data["text"])
+            else:
+                event_bus.publish(task_id, event, data)
+        if time.monotonic() - last_prune > 600:
+            # Relayed events are only needed for a moment; finished jobs are kept a while for /stats
+            await asyncio.to_thread(event_log.prune, 3600)
+            await asyncio.to_thread(job_queue.prune, settings.JOB_RETENTION_SECONDS)
+            last_prune = time.monotonic()
+        if not rows:
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL_MS / 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens the durable checkpointer when configured. The SQLite saver needs a running
+    event loop, so the graph is recompiled against it at startup.
+    In queue mode, also starts the worker processes and relays their events.
+    The server accepts requests while the warm-up runs; /ready reports when it is done.
+    """
+    global memory, research_graph, worker_pool
+    checkpointer = settings.CHECKPOINTER.lower()
+    if checkpointer == "sqlite":
+        memory = await DurableSqliteSaver.open(
+            settings.CHECKPOINT_PATH,
+            commit_interval=settings.CHECKPOINT_COMMIT_INTERVAL_MS / 1000
+        )
+        memory.start_sweeper(settings.CHECKPOINT_TTL_SECONDS, settings.CHECKPOINT_SWEEP_INTERVAL_SECONDS)
+        research_graph = research_workflow.compile(checkpointer=memory)
+        log.info("checkpointer_opened", kind="sqlite", path=settings.CHECKPOINT_PATH)
+    elif checkpointer != "memory":
+        raise ValueError(f"Unsupported checkpointer: '{settings.CHECKPOINTER}'. Please choose 'sqlite' or 'memory'.")
+
+    relay_task = None
+    if settings.EXECUTION_MODE == "queue":
+        if checkpointer != "sqlite":
+            raise ValueError("EXECUTION_MODE=queue needs CHECKPOINTER=sqlite, so workers can share the task state.")
+        relay_task = asyncio.create_task(_relay_worker_events())
+        if settings.WORKER_PROCESSES > 0:
+            share_rate_limits(settings.WORKER_PROCESSES + 1)
+            worker_pool = WorkerPool(settings.WORKER_PROCESSES, settings.WORKER_CONCURRENCY)
+            worker_pool.start()
+            log.info("workers_started", processes=settings.WORKER_PROCESSES)
+    elif settings.EXECUTION_MODE != "inline":
+        raise ValueError(f"Unsupported execution mode: '{settings.EXECUTION_MODE}'. Please choose 'inline' or 'queue'.")
+
+    if cassettes is not None:
+        # Replay reads every cassette; doing it now keeps that out of the first task's timings
+        await cassettes.aload()
+
+    warmup_task = None
+    if settings.WARMUP_ENABLED:
+        warmup_task = asyncio.create_task(_warm_up())
+    else:
+        ready.set()
+
+    yield
+
+    if warmup_task is not None:
+        warmup_task.cancel()
+
+    if worker_pool is not None:
+        # Workers hand their running jobs back to the queue before they exit
+        await asyncio.to_thread(worker_pool.stop)
+    if relay_task is not None:
+        relay_task.cancel()
+    await http.aclose()
+    if isinstance(memory, DurableSqliteSaver):
+        await memory.aclose()
 
-final_results: Dict[str, Any] = {}
 
 app = FastAPI(
     title="Deep Research AI Agent API",
     description="An API for orchestrating an autonomous research agent.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 origins = ["*"]
@@ -50,67 +163,108 @@ app.add_middleware(
 # Binded the checkpointer to the graph at compile time for consistency.
 research_graph = research_workflow.compile(checkpointer=memory)
 
-def _resume_and_run_to_completion(task_id: str, resume_value: Any):
+async def _run_graph(task_id: str, graph_input: Any, config: dict) -> Dict[str, Any]:
+    """
+    Runs the graph in this process until it finishes or pauses at the approval step,
+    publishing its progress to the task's event stream. Returns the latest state.
     """
-    A helper function to resume the graph with a Command and run it to completion.
+    return await run_graph(research_graph, task_id, graph_input, config, event_bus)
+
+async def _resume_and_run_to_completion(task_id: str, resume_value: Any):
+    """
+    A helper coroutine to resume the graph with a Command and run it to completion.
+    It is scheduled on the event loop by BackgroundTasks, so the graph never blocks request handling.
     """
     config = {
         "configurable": {"thread_id": task_id},
-        "callbacks": [langfuse_handler]
+        "callbacks": get_run_callbacks()
     }
     try:
-        command = Command(resume=resume_value)
-        # Capture the final state returned by the invoke call
-        final_state = research_graph.invoke(command, config)
+        async with resume_queue.slot(task_id):
+            if speculation is not None:
+                # Research done during the approval pause, for the questions the user kept
+                resume_value["speculative"] = await speculation.collect(task_id, resume_value["research_questions"])
+            event_bus.publish(task_id, "running")
+            final_state = await _run_graph(task_id, Command(resume=resume_value), config)
         
-        # Store the completed state in our "finish line" dictionary
-        final_results[task_id] = final_state
+        # Store the completed state in our "finish line" result store
+        await final_results.aset(task_id, final_state)
+        event_bus.publish(task_id, "complete")
         
-        print(f"--- [Task: {task_id}] --- ✅ Completed final run and stored result. ---")
+        log.info("task_completed", task_id=task_id)
     except Exception as e:
-        print(f"Error in resume background task for {task_id}: {e}")
+        log.exception("task_failed", task_id=task_id, error=str(e))
         # Store an error state so the frontend knows something went wrong
-        final_results[task_id] = {"error": str(e)}
+        await final_results.aset(task_id, {"error": str(e)})
+        event_bus.publish(task_id, "error", {"detail": str(e)})
+
+def _queue_full(e: QueueFullError) -> HTTPException:
+    """The 429 answer for a full run queue, with the position the task would have had and a Retry-After estimate."""
+    return HTTPException(
+        status_code=429,
+        detail={
+            "message": f"The server is busy: the {e.queue} queue is full. Please retry later.",
+            "queue_position": e.position,
+            "retry_after_seconds": e.retry_after,
+        },
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+def _admit(queue: RunQueue, task_id: str) -> int:
+    """Reserves a place in a run queue, or answers 429."""
+    try:
+        return queue.reserve(task_id)
+    except QueueFullError as e:
+        raise _queue_full(e)
+
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 # --- API Endpoints ---
 
 @app.post("/research", response_model=TaskResponse, status_code=202)
 async def start_research(request: ResearchRequest):
     """
-    Starts a new research task. This is now a SYNCHRONOUS call.
-    The graph will run the planner and then pause immediately, guaranteeing
-    the state is saved before this endpoint returns.
+    Starts a new research task.
+    The request waits for the planner and the pause at the approval step, guaranteeing
+    the state is saved before this endpoint returns. The graph runs natively on the
+    event loop, so other requests keep being served while the planner is thinking.
+    Planning runs are bounded; when too many are waiting, the request is rejected with a 429.
     """
     
     task_id = str(uuid.uuid4())
     config = {
         "configurable": {"thread_id": task_id},
-        "callbacks": [langfuse_handler] 
+        "callbacks": get_run_callbacks() 
     }    
+    provider = (request.model_provider or settings.LLM_PROVIDER).lower()
     try:
-        model_config = ModelConfig.get_model_config(
-            request.model_provider or "groq", 
-            request.api_key
-        )
-
-        ModelConfig.update_environment(model_config)
+        # Builds (or reuses) the task's client; the key never leaves this process
+        credential_id = await llm_registry.aregister(provider, request.api_key)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
     initial_state = {
         "original_query": request.query,
         "task_id": task_id,
-        "model_provider": request.model_provider or "groq",
-        "api_key": request.api_key
+        "model_provider": provider,
+        "credential_id": credential_id,
+        "budget": budget_limits(request.budget.model_dump() if request.budget else None),
     }
     
+    _admit(planning_queue, task_id)
+    event_bus.publish(task_id, "planning")
     try:
-        research_graph.invoke(initial_state, config)
+        async with planning_queue.slot(task_id):
+            state_values = await _run_graph(task_id, initial_state, config)
     except Exception as e:
-        print(f"Error during initial planning for task {task_id}: {e}")
+        log.exception("planning_failed", task_id=task_id, error=str(e))
+        event_bus.publish(task_id, "error", {"detail": "Failed to start research task."})
         raise HTTPException(status_code=500, detail="Failed to start research task.")
 
-
+    if speculation is not None:
+        # Research the plan while the user reviews it
+        speculation.start(task_id, state_values)
     return TaskResponse(task_id=task_id)
 
 
@@ -122,13 +276,41 @@ async def resume_research(
 ):
     """
     Resumes a paused research task with the user-approved research plan.
+    The task waits in the bounded run queue for a free slot; when the queue is full,
+    the request is rejected with a 429 and can be retried as is.
+    In queue mode the run is handed to the worker processes, except for tasks with a
+    user-supplied API key: the key only lives in this process's memory, so they run here.
+    With speculative research, the kept questions still being researched are waited for
+    before the job is queued, so the response can take up to one research step longer.
     """
     resume_value = {
         "research_questions": request.research_questions,
         "task_id": task_id
     }
-    background_tasks.add_task(_resume_and_run_to_completion, task_id, resume_value)
+    run_in_worker = job_queue is not None
+    if run_in_worker:
+        state_snapshot = await research_graph.aget_state({"configurable": {"thread_id": task_id}})
+        run_in_worker = not state_snapshot.values.get("credential_id")
+
+    if run_in_worker:
+        if speculation is not None:
+            # Speculation runs in this process, so its results go to the worker with the job
+            resume_value["speculative"] = await speculation.collect(task_id, request.research_questions)
+        try:
+            position = await asyncio.to_thread(job_queue.enqueue, task_id, resume_value, settings.RESUME_MAX_QUEUED)
+        except QueueFullError as e:
+            raise _queue_full(e)
+    else:
+        position = _admit(resume_queue, task_id)
+        background_tasks.add_task(_resume_and_run_to_completion, task_id, resume_value)
+    event_bus.publish(task_id, "resumed", {"research_questions": request.research_questions, "queue_position": position})
     
+    if position:
+        return StatusResponse(
+            task_id=task_id,
+            status="QUEUED",
+            details=f"Research will continue in the background. Position in queue: {position}."
+        )
     return StatusResponse(
         task_id=task_id, 
         status="RESUMED", 
@@ -141,9 +323,9 @@ async def get_task_status(task_id: str):
     """
     Retrieves the current state of a research task.
     """
-    # First, check if the task is already complete in our final results dict
-    if task_id in final_results:
-        final_state_values = final_results[task_id]
+    # First, check if the task is already complete in our result store
+    final_state_values = await final_results.aget(task_id)
+    if final_state_values is not None:
         return GraphStateResponse(
             status="COMPLETE",
             research_questions=final_state_values.get("research_questions")
@@ -151,13 +333,19 @@ async def get_task_status(task_id: str):
     config = {"configurable": {"thread_id": task_id}}
     
     try:
-        state_snapshot = research_graph.get_state(config)
+        state_snapshot = await research_graph.aget_state(config)
     except Exception:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found.")
 
     current_state_values = state_snapshot.values
     
-    if state_snapshot.interrupts:
+    queued = resume_queue.position(task_id)
+    if not queued and job_queue is not None:
+        queued = await asyncio.to_thread(job_queue.position, task_id)
+    if queued:
+        status = "QUEUED"
+        questions = state_snapshot.values.get("research_questions")
+    elif state_snapshot.interrupts:
         status = "AWAITING_INPUT"
         questions = state_snapshot.interrupts[0].value.get("research_questions")
     else:
@@ -170,39 +358,169 @@ async def get_task_status(task_id: str):
     )
 
 
-@app.get("/results/{task_id}", response_model=FinalReport)
-async def get_task_results(task_id: str):
+@app.get("/events/{task_id}")
+async def stream_task_events(task_id: str):
     """
-    Retrieves the final report of a completed research task.
-    This now looks in our dedicated 'final_results' dictionary.
+    Streams a task's progress as Server-Sent Events, as it happens:
+    planning, planned, awaiting_input, resumed (with the position in the run queue), running,
+    question_researched, research_complete,
+    budget_exhausted (when the task's budget cut the research short), summarizing,
+    report_token (one per streamed piece of the report) and finally complete (or error).
+    A subscriber joining mid-report first gets a report_partial event with the text so far.
+    Waiting subscribers cost nothing but an idle queue, unlike polling /status.
     """
-    # Check if the task is in our "finish line" dictionary
-    if task_id not in final_results:
-        # If not, the task is either still running or doesn't exist.
-        raise HTTPException(status_code=400, detail="Task is not yet complete.")
+    # Nothing was published for this task in this process (e.g. it ran before a restart):
+    # start the stream from a snapshot of its current state.
+    snapshot_events = []
+    if not event_bus.has_history(task_id):
+        final_state_values = await final_results.aget(task_id)
+        if final_state_values is not None:
+            if "error" in final_state_values:
+                snapshot_events.append(("error", {"detail": final_state_values["error"]}))
+            else:
+                snapshot_events.append(("complete", {}))
+        else:
+            state_snapshot = await research_graph.aget_state({"configurable": {"thread_id": task_id}})
+            if not state_snapshot.values:
+                raise HTTPException(status_code=404, detail=f"Task {task_id} not found.")
+            if state_snapshot.interrupts:
+                snapshot_events.append(("awaiting_input", {
+                    "research_questions": state_snapshot.interrupts[0].value.get("research_questions")
+                }))
 
-    final_state_values = final_results[task_id]
-    
-    if "error" in final_state_values:
-        raise HTTPException(status_code=500, detail=f"Task failed: {final_state_values['error']}")
+    async def event_stream():
+        for event, data in snapshot_events:
+            yield _format_sse(event, data)
+            if event in TERMINAL_EVENTS:
+                return
+        async for message in event_bus.subscribe(task_id):
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield _format_sse(message["event"], message["data"])
 
-    # --- Logic to assemble the final report (this part is unchanged) ---
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _build_report(state_values: Dict[str, Any], summary: str, is_partial: bool = False) -> FinalReport:
+    """
+    Assembles the report returned by /results from a task's state values.
+    """
     all_sources = []
-    for question_sources in final_state_values.get('sources', {}).values():
+    for question_sources in state_values.get('sources', {}).values():
         all_sources.extend(question_sources)
 
     unique_citations = []
     seen_sources = set()
     for src in all_sources:
-        source_identifier = src.get('source') or src.get('Title')
-        if source_identifier and source_identifier not in seen_sources:
-            unique_citations.append(Citation(source=source_identifier, content=""))
-            seen_sources.add(source_identifier)
+        # Sources of duplicate findings that were merged into this one are cited too
+        identifiers = [src.get('source') or src.get('Title')]
+        identifiers += [entry.get('source') for entry in src.get('also_found_in') or ()]
+        for source_identifier in identifiers:
+            if source_identifier and source_identifier not in seen_sources:
+                unique_citations.append(Citation(source=source_identifier, content=""))
+                seen_sources.add(source_identifier)
 
     return FinalReport(
-        original_query=final_state_values.get("original_query"),
-        summary=final_state_values.get('final_report', "Summarization failed."),
+        original_query=state_values.get("original_query"),
+        summary=summary,
         findings=[{"question": q, "results": r}
-                  for q, r in (final_state_values.get("findings") or {}).items()],
-        citations=unique_citations
+                  for q, r in (state_values.get("findings") or {}).items()],
+        citations=unique_citations,
+        is_partial=is_partial,
+        budget_exhausted=state_values.get("budget_exhausted"),
+        skipped_questions=state_values.get("skipped_questions") or []
     )
+
+
+@app.get("/results/{task_id}", response_model=FinalReport)
+async def get_task_results(task_id: str):
+    """
+    Retrieves the final report of a completed research task.
+    This now looks in our dedicated 'final_results' store, which pages spilled results back in.
+    While the summarizer is still writing, it returns the report so far with is_partial set.
+    """
+    # Check if the task is in our "finish line" store
+    final_state_values = await final_results.aget(task_id)
+    if final_state_values is None:
+        partial_report = event_bus.partial_report(task_id)
+        if partial_report is not None:
+            state_snapshot = await research_graph.aget_state({"configurable": {"thread_id": task_id}})
+            return _build_report(state_snapshot.values, partial_report, is_partial=True)
+        # If not, the task is either still running or doesn't exist.
+        raise HTTPException(status_code=400, detail="Task is not yet complete.")
+    
+    if "error" in final_state_values:
+        raise HTTPException(status_code=500, detail=f"Task failed: {final_state_values['error']}")
+
+    return _build_report(final_state_values, final_state_values.get('final_report', "Summarization failed."))
+
+
+@app.get("/health")
+async def health():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: answers 503 until startup, including the client warm-up, is done."""
+    if not ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus metrics: latency histograms of graph nodes, agent chains and tools, chat model calls
+    and tokens per provider, cache hit ratios, and tasks in flight and waiting. In queue mode the
+    histograms and counters include those the worker processes last reported.
+    """
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=false).")
+    planning, research = planning_queue.stats(), resume_queue.stats()
+    jobs = await asyncio.to_thread(job_queue.stats) if job_queue else {"running": 0, "queued": 0}
+    gauges = {
+        "deepresearch_tasks_in_flight": gauge("Tasks planning or researching right now.", ["stage"], {
+            ("planning",): planning["running"],
+            ("research",): research["running"] + jobs["running"],
+        }),
+        "deepresearch_queue_depth": gauge("Tasks waiting for a slot to plan or research.", ["stage"], {
+            ("planning",): planning["queued"],
+            ("research",): research["queued"] + jobs["queued"],
+        }),
+    }
+    if worker_pool is not None:
+        gauges["deepresearch_worker_processes_alive"] = gauge(
+            "Worker processes running.", [], {(): worker_pool.stats()["alive"]})
+    other_processes = await asyncio.to_thread(job_queue.worker_metrics) if job_queue else []
+    return PlainTextResponse(metrics.render(other_processes, gauges), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+async def get_stats():
+    """
+    Returns runtime statistics of the backend's caches and stores.
+    """
+    return {
+        "result_store": final_results.stats(),
+        "tool_cache": tool_cache.stats() if tool_cache else None,
+        "findings_index": findings_index.stats() if findings_index else None,
+        "speculation": speculation.stats() if speculation else None,
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "cassettes": cassettes.stats() if cassettes else None,
+        "llm_clients": llm_registry.stats(),
+        "tools": {name: caller.stats() for name, caller in tool_callers.items()},
+        "admission": {queue.name: queue.stats() for queue in (planning_queue, resume_queue)},
+        "jobs": await asyncio.to_thread(job_queue.stats) if job_queue else None,
+        "workers": worker_pool.stats() if worker_pool else None,
+        "rate_limits": {
+            "llm": {name: limiter.stats() for name, limiter in llm_rate_limiters.items() if limiter},
+            "tools": {name: limiter.stats() for name, limiter in tool_rate_limiters.items() if limiter},
+        },
+    }
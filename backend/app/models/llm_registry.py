@@ -0,0 +1,175 @@
+"""
+Reusable chat model clients and their agent chains, keyed by provider, model and credential.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from app.models.model_config import ModelConfig
+from app.utils.config import settings
+from app.workflow.agents import Agents, create_llm
+
+
+def credential_id(api_key: Optional[str]) -> Optional[str]:
+    """A stable, non-reversible reference to an API key, safe to keep in task state and logs."""
+    if not api_key:
+        return None
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class _Client:
+    agents: Agents
+    last_used: float
+
+
+class LLMClientRegistry:
+    """
+    Builds one chat model client (and its HTTP connection pool) per provider, model and
+    credential, and hands out the agent chains built on it. Tasks that use the same
+    provider and key share a warm client; tasks on different providers or keys never share one.
+
+    At most `max_clients` clients are kept, least recently used first out, and clients idle
+    for `idle_seconds` are dropped. User-supplied API keys stay in process memory only;
+    task state stores their credential id. Keys unused for `credential_ttl_seconds` are forgotten.
+
+    Building a client can import the provider's SDK, which takes up to a second, so it happens
+    outside the lock, once per key however many callers want it; async code uses the `a`-prefixed
+    methods, which build in a thread.
+    """
+
+    def __init__(self, max_clients: int, idle_seconds: int, credential_ttl_seconds: int):
+        self.max_clients = max_clients
+        self.idle_seconds = idle_seconds
+        self.credential_ttl_seconds = credential_ttl_seconds
+        self._clients: "OrderedDict[Tuple[str, str, str], _Client]" = OrderedDict()
+        # Builds in progress, which later callers for the same key wait for
+        self._building: Dict[Tuple[str, str, str], Future] = {}
+        self._credentials: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+
+    def _evict(self, now: float):
+        for key in [k for k, c in self._clients.items() if now - c.last_used > self.idle_seconds]:
+            del self._clients[key]
+            self.evictions += 1
+        # Makes room for the client about to be added; with a pool size below 1, only it is kept
+        while self._clients and len(self._clients) >= self.max_clients:
+            self._clients.popitem(last=False)
+            self.evictions += 1
+        for cred in [c for c, (_, used) in self._credentials.items() if now - used > self.credential_ttl_seconds]:
+            del self._credentials[cred]
+
+    async def aregister(self, provider: str, api_key: Optional[str] = None) -> Optional[str]:
+        """
+        Validates the provider and key of a new task and warms its client.
+        Returns the credential id to store in the task state (None for the server's own key).
+        Raises ValueError for an unknown provider or a missing key.
+        """
+        ModelConfig.get_model_config(provider, api_key)
+        cred = credential_id(api_key)
+        if cred is not None:
+            with self._lock:
+                self._credentials[cred] = (api_key, time.monotonic())
+        await self.aget(provider, cred)
+        return cred
+
+    def _lookup(self, provider: Optional[str], credential: Optional[str]) -> Tuple[Any, Dict[str, Any], Optional[Agents]]:
+        """The client key and model config for a provider and credential, and the agents if already built."""
+        provider = (provider or settings.LLM_PROVIDER).lower()
+        with self._lock:
+            now = time.monotonic()
+            api_key = None
+            if credential is not None:
+                entry = self._credentials.get(credential)
+                if entry is None:
+                    raise ValueError("The API key for this task is no longer available. Please start a new research task.")
+                api_key = entry[0]
+                self._credentials[credential] = (api_key, now)
+
+            config = ModelConfig.get_model_config(provider, api_key)
+            key = (config["provider"], config["model"], credential_id(config["api_key"]) or "")
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                client.last_used = now
+                self.hits += 1
+                return key, config, client.agents
+            return key, config, None
+
+    def _claim(self, key: Tuple[str, str, str]) -> Tuple[Future, bool]:
+        """The build in progress for `key`, and whether the caller has to run it."""
+        with self._lock:
+            future = self._building.get(key)
+            if future is not None:
+                return future, False
+            future = self._building[key] = Future()
+            return future, True
+
+    def _build(self, key: Tuple[str, str, str], config: Dict[str, Any], future: Future) -> Agents:
+        try:
+            agents = Agents(create_llm(config["provider"], config["model"], config["api_key"]), config["provider"])
+        except BaseException as e:
+            with self._lock:
+                self._building.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            self._clients[key] = _Client(agents=agents, last_used=now)
+            self._building.pop(key, None)
+            self.builds += 1
+        future.set_result(agents)
+        return agents
+
+    def get(self, provider: Optional[str] = None, credential: Optional[str] = None) -> Agents:
+        """
+        Returns the agents for a provider and a registered credential id, building the client on first use.
+        Blocks while it is built, so async code uses `aget`.
+        """
+        key, config, agents = self._lookup(provider, credential)
+        if agents is not None:
+            return agents
+        future, owner = self._claim(key)
+        return self._build(key, config, future) if owner else future.result()
+
+    async def aget(self, provider: Optional[str] = None, credential: Optional[str] = None) -> Agents:
+        """`get` for the event loop: a client that is not built yet is built in a thread."""
+        key, config, agents = self._lookup(provider, credential)
+        if agents is not None:
+            return agents
+        future, owner = self._claim(key)
+        if owner:
+            return await asyncio.to_thread(self._build, key, config, future)
+        return await asyncio.wrap_future(future)
+
+    async def afor_task(self, state: Mapping[str, Any]) -> Agents:
+        """The agents for a research task, from the provider and credential in its state."""
+        return await self.aget(state.get("model_provider"), state.get("credential_id"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "max_clients": self.max_clients,
+                "by_provider": dict(Counter(provider for provider, _, _ in self._clients)),
+                "credentials": len(self._credentials),
+                "hits": self.hits,
+                "builds": self.builds,
+                "evictions": self.evictions,
+            }
+
+
+llm_registry = LLMClientRegistry(
+    max_clients=settings.LLM_CLIENT_POOL_SIZE,
+    idle_seconds=settings.LLM_CLIENT_IDLE_SECONDS,
+    credential_ttl_seconds=settings.CHECKPOINT_TTL_SECONDS,
+)
@@ -4,8 +4,19 @@ Model configuration handler for dynamic model selection.
 import os
 from typing import Optional
 from app.utils.config import settings
+from app.utils.logs import get_logger
 from langsmith import Client
 
+log = get_logger(__name__)
+
+# The model each provider runs with; context windows in app/workflow/context.py follow these
+DEFAULT_MODELS = {
+    "groq": "llama3-8b-8192",
+    "google": "gemini-1.5-flash",
+    "ollama": "gemma3:4b",
+    "openrouter": "anthropic/claude-3.5-sonnet",
+}
+
 class ModelConfig:
     """Handles dynamic model configuration based on user selection."""
     
@@ -24,7 +35,7 @@ class ModelConfig:
             return {
                 "provider": "groq",
                 "api_key": api_key,
-                "model": "llama3-8b-8192"  # Default Groq model
+                "model": DEFAULT_MODELS["groq"]
             }
             
         elif provider == "google":
@@ -34,7 +45,7 @@ class ModelConfig:
             return {
                 "provider": "google",
                 "api_key": api_key,
-                "model": "gemini-pro"  # Default Gemini model
+                "model": DEFAULT_MODELS["google"]
             }
             
         elif provider == "ollama":
@@ -42,7 +53,7 @@ class ModelConfig:
             return {
                 "provider": "ollama",
                 "api_key": None,
-                "model": "llama2"  # Default Ollama model
+                "model": DEFAULT_MODELS["ollama"]
             }
             
         elif provider == "openrouter":
@@ -52,45 +63,24 @@ class ModelConfig:
             return {
                 "provider": "openrouter",
                 "api_key": api_key,
-                "model": "openrouter/auto"  # Default OpenRouter model
+                "model": DEFAULT_MODELS["openrouter"]
             }
         else:
             raise ValueError(f"Unsupported model provider: {provider}")
     
-    @staticmethod
-    def update_environment(model_config: dict):
-        """
-        Temporarily update environment variables for the current request.
-        This allows the existing LangChain setup to work without major changes.
-        """
-        provider = model_config["provider"]
-        api_key = model_config["api_key"]
-        
-        # Update environment for current process
-        if provider == "groq" and api_key:
-            os.environ["GROQ_API_KEY"] = api_key
-        elif provider == "google" and api_key:
-            os.environ["GOOGLE_API_KEY"] = api_key
-        elif provider == "openrouter" and api_key:
-            os.environ["OPENROUTER_API_KEY"] = api_key
-        # Ollama doesn't need API key updates
-        
-        # Update the LLM_PROVIDER setting
-        os.environ["LLM_PROVIDER"] = provider
-
     @staticmethod
     def setup_langsmith():
         """Setup LangSmith tracing"""
         # Check if LangSmith is configured
         if not os.getenv("LANGCHAIN_API_KEY"):
-            print("⚠️ LangSmith API key not found. Tracing disabled.")
+            log.info("langsmith_disabled", reason="LANGCHAIN_API_KEY is not set")
             return None
             
         try:
             client = Client()
             project_name = os.getenv("LANGCHAIN_PROJECT", "deep_research_agent")
-            print(f"🔍 LangSmith tracing enabled for project: {project_name}")
+            log.info("langsmith_enabled", project=project_name)
             return client
         except Exception as e:
-            print(f"⚠️ LangSmith client initialization failed: {e}")
+            log.exception("langsmith_failed", error=str(e))
             return None
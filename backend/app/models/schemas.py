@@ -3,11 +3,18 @@ from typing import List, Dict, Any, Optional, TypedDict
 
 # === API Schemas (for FastAPI input/output) ===
 
+class ResearchBudget(BaseModel):
+    """Optional limits for one research task. Unset or 0 means no limit beyond the server's own."""
+    max_seconds: Optional[float] = Field(default=None, ge=0, description="Seconds spent researching and writing, not counting the wait for approval.")
+    max_tokens: Optional[int] = Field(default=None, ge=0, description="LLM tokens (prompt and completion) across all steps.")
+    max_tool_calls: Optional[int] = Field(default=None, ge=0, description="Research tool calls, one per researched question.")
+
 class ResearchRequest(BaseModel):
     """Request model for starting a new research task."""
     query: str = Field(..., description="The user's research query.")
-    model_provider: Optional[str] = Field(default="groq", description="The LLM provider to use (groq, google, ollama, openrouter)")
+    model_provider: Optional[str] = Field(default=None, description="The LLM provider to use (groq, google, ollama, openrouter); defaults to the server's provider")
     api_key: Optional[str] = Field(default=None, description="Optional API key for the selected provider")
+    budget: Optional[ResearchBudget] = Field(default=None, description="Optional time, token and tool call limits. When they run low, the remaining questions are skipped and the report is written from what was found.")
 
 class TaskResponse(BaseModel):
     """Response model for acknowledging a task has started."""
@@ -34,6 +41,9 @@ class FinalReport(BaseModel):
     summary: str = Field(..., description="A high-level summary of the research findings.")
     findings: List[Dict[str, Any]] = Field(..., description="A list of detailed findings, possibly structured by sub-topic.")
     citations: List[Citation]
+    is_partial: bool = Field(default=False, description="True while the summary is still being written.")
+    budget_exhausted: Optional[str] = Field(default=None, description="The budget ('time', 'tokens' or 'tool calls') that ran out and cut the research short, if any.")
+    skipped_questions: List[str] = Field(default_factory=list, description="Research questions skipped because the budget ran out.")
 
 class ResumeRequest(BaseModel):
     """take the list of research questions sent by the user and update the agent's saved "memory" for that specific task."""
@@ -61,8 +71,23 @@ class GraphState(TypedDict):
     current_task_status: str
     final_report: str
     task_id : str
+
+    # How many duplicate findings were removed before summarization, and what that saved
+    dedup_stats: Dict[str, Any]
+    # What the summarizer's context packer kept and dropped
+    context_stats: Dict[str, Any]
+    # Summarization mode ('single' or 'map_reduce') and per-stage timings in seconds
+    summary_stats: Dict[str, Any]
+    
+    # Budget limits (max_seconds, max_tokens, max_tool_calls; 0 is unlimited), what was spent so far,
+    # and which budget cut the research short along with the questions it skipped
+    budget: Dict[str, float]
+    budget_usage: Dict[str, float]
+    budget_exhausted: Optional[str]
+    skipped_questions: List[str]
     
-    # Model configuration
+    # Model configuration. The API key itself stays in process memory (app/models/llm_registry.py);
+    # the state only references it, so it never reaches the checkpointer
     model_provider: Optional[str]
-    api_key: Optional[str]
+    credential_id: Optional[str]
     
\ No newline at end of file
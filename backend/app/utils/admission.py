@@ -0,0 +1,212 @@
+"""
+Admission control: token-bucket rate limiters for LLM providers and research tools, and
+bounded run queues for the graph runs started by /research and /resume.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from app.utils.config import settings
+
+
+class TokenBucket(BaseRateLimiter):
+    """
+    Allows `rate` requests per second on average and bursts of up to `burst`.
+
+    A caller that finds the bucket empty reserves the next token anyway and sleeps until it
+    is due, so waiting callers are served in arrival order without polling. It plugs into
+    chat models as their `rate_limiter`, and tools await `aacquire` directly.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self, blocking: bool) -> Optional[float]:
+        """Takes a token. Returns the seconds until it is due, or None if not blocking and none is free."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if not blocking and self._tokens < 1:
+                return None
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.acquired += 1
+            if wait:
+                self.waited += 1
+                self.wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            return wait
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        wait = self._reserve(blocking)
+        if wait is None:
+            return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        wait = self._reserve(blocking)
+        if wait is None:
+            return False
+        if wait:
+            await asyncio.sleep(wait)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate_per_second": self.rate,
+                "burst": self.burst,
+                "available": round(max(0.0, self._tokens), 2),
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "mean_wait_ms": round(self.wait_seconds / self.waited * 1000, 1) if self.waited else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 1),
+            }
+
+
+def _bucket(name: str, rate: float, burst: int) -> Optional[TokenBucket]:
+    return TokenBucket(name, rate, burst) if rate > 0 else None
+
+
+# Shared by every task and client in the process. A rate of 0 disables the limiter.
+llm_rate_limiters: Dict[str, Optional[TokenBucket]] = {
+    "groq": _bucket("groq", settings.LLM_RATE_LIMIT_GROQ, settings.LLM_RATE_LIMIT_BURST),
+    "google": _bucket("google", settings.LLM_RATE_LIMIT_GOOGLE, settings.LLM_RATE_LIMIT_BURST),
+    "openrouter": _bucket("openrouter", settings.LLM_RATE_LIMIT_OPENROUTER, settings.LLM_RATE_LIMIT_BURST),
+    "ollama": _bucket("ollama", settings.LLM_RATE_LIMIT_OLLAMA, settings.LLM_RATE_LIMIT_BURST),
+}
+tool_rate_limiters: Dict[str, Optional[TokenBucket]] = {
+    "web_search": _bucket("web_search", settings.TOOL_RATE_LIMIT_WEB_SEARCH, settings.TOOL_RATE_LIMIT_BURST),
+    "arxiv_search": _bucket("arxiv_search", settings.TOOL_RATE_LIMIT_ARXIV_SEARCH, settings.TOOL_RATE_LIMIT_BURST),
+    "wikipedia_search": _bucket("wikipedia_search", settings.TOOL_RATE_LIMIT_WIKIPEDIA_SEARCH, settings.TOOL_RATE_LIMIT_BURST),
+}
+
+
+def share_rate_limits(processes: int):
+    """
+    Splits every limiter's rate evenly between `processes` processes calling the same
+    providers, such as the API process and its research workers.
+    """
+    for limiter in (*llm_rate_limiters.values(), *tool_rate_limiters.values()):
+        if limiter is not None:
+            limiter.rate /= processes
+
+
+class QueueFullError(Exception):
+    """Raised when a run queue has no room. Carries the position the job would have had."""
+
+    def __init__(self, queue: str, position: int, retry_after: int):
+        super().__init__(f"The {queue} queue is full.")
+        self.queue = queue
+        self.position = position
+        self.retry_after = retry_after
+
+
+class RunQueue:
+    """
+    Runs at most `max_running` jobs at once. Up to `max_queued` more wait their turn in
+    arrival order; beyond that, jobs are rejected straight away with an estimate of when to
+    retry, so overload shows up as fast 429s instead of every job slowing down and timing out.
+
+    Admission (`reserve`) is separate from running (`slot`), so an endpoint can reject a job
+    before it hands the job to a background task.
+    """
+
+    def __init__(self, name: str, max_running: int, max_queued: int):
+        self.name = name
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self._slots = asyncio.Semaphore(max_running)
+        self._waiting: Deque[str] = deque()
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self._wait_seconds: Deque[float] = deque(maxlen=200)
+        self._run_seconds: Deque[float] = deque(maxlen=200)
+
+    def _free_slots(self) -> int:
+        return max(0, self.max_running - self.running)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Where a job is in the queue: 0 once it runs (or is about to), None when unknown."""
+        try:
+            index = self._waiting.index(job_id)
+        except ValueError:
+            return None
+        return max(0, index + 1 - self._free_slots())
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up, from recent run times."""
+        mean_run = sum(self._run_seconds) / len(self._run_seconds) if self._run_seconds else 30.0
+        queued = max(0, len(self._waiting) - self._free_slots())
+        return max(1, math.ceil(mean_run * (queued + 1) / self.max_running))
+
+    def reserve(self, job_id: str) -> int:
+        """Admits a job and returns its queue position (0 runs straight away). Raises QueueFullError."""
+        position = max(0, len(self._waiting) + 1 - self._free_slots())
+        if position > self.max_queued:
+            self.rejected += 1
+            raise QueueFullError(self.name, position, self.retry_after())
+        self._waiting.append(job_id)
+        self.admitted += 1
+        return position
+
+    @asynccontextmanager
+    async def slot(self, job_id: str) -> AsyncIterator[None]:
+        """Waits for a running slot for a reserved job and holds it for the job's duration."""
+        enqueued = time.monotonic()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting.remove(job_id)
+        started = time.monotonic()
+        self._wait_seconds.append(started - enqueued)
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._run_seconds.append(time.monotonic() - started)
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._wait_seconds)
+        return {
+            "running": self.running,
+            "queued": max(0, len(self._waiting) - self._free_slots()),
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 1) if waits else None,
+            "wait_max_ms": round(waits[-1] * 1000, 1) if waits else None,
+        }
+
+
+# Planning runs inside the /research request; resumed tasks run in the background
+planning_queue = RunQueue("planning", settings.PLANNING_MAX_RUNNING, settings.PLANNING_MAX_QUEUED)
+resume_queue = RunQueue("research", settings.RESUME_MAX_RUNNING, settings.RESUME_MAX_QUEUED)
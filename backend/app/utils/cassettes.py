@@ -0,0 +1,262 @@
+"""
+Record and replay of agent chain and tool calls, for profiling captured traffic offline.
+
+In 'record' mode every agent chain call and research tool call is written, with its input,
+output and measured latency, to a cassette: one gzipped JSON-lines file per task. In 'replay'
+mode the calls are served from the cassettes instead, optionally at their recorded speed, so a
+captured task can be rerun without network or provider costs to profile the graph, serialization
+and the API.
+
+A replayed task is matched to a recorded one by the first call whose input is found in a cassette
+(usually the planner's, by query). Later calls are looked up by input in that task's cassette
+first; when an input differs from the recording (e.g. a context packed differently), the next
+unused call of the same chain or tool is served instead.
+"""
+import asyncio
+import glob
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+
+from app.utils.config import settings
+from app.utils.logs import current_task_id, get_logger
+
+log = get_logger(__name__)
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode when a call has no recording to serve."""
+
+
+class ReplayedError(Exception):
+    """A call that failed when it was recorded, failing again on replay."""
+
+
+def _key(kind: str, name: str, inputs: Any) -> str:
+    canonical = json.dumps([kind, name, inputs], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def _encode(value: Any) -> Dict[str, Any]:
+    """A chain or tool output as JSON: text, a message, a pydantic model or a list of documents."""
+    if isinstance(value, str):
+        return {"text": value}
+    if isinstance(value, BaseMessage):
+        return {"message": value.content, "usage": getattr(value, "usage_metadata", None)}
+    if isinstance(value, BaseModel):
+        return {"model": f"{type(value).__module__}:{type(value).__qualname__}", "data": value.model_dump()}
+    documents = list(value)
+    return {"documents": [[doc.page_content, doc.metadata] for doc in documents]}
+
+
+def _decode(encoded: Dict[str, Any]) -> Any:
+    if "text" in encoded:
+        return encoded["text"]
+    if "message" in encoded:
+        return AIMessage(content=encoded["message"], usage_metadata=encoded.get("usage"))
+    if "model" in encoded:
+        module, name = encoded["model"].split(":")
+        return getattr(importlib.import_module(module), name).model_validate(encoded["data"])
+    return [Document(page_content=content, metadata=metadata) for content, metadata in encoded["documents"]]
+
+
+class Cassettes:
+    """Records calls to, or replays them from, the cassettes in a directory."""
+
+    def __init__(self, mode: str, directory: str, latency_scale: float):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported cassette mode: '{mode}'. Please choose 'off', 'record' or 'replay'.")
+        self.mode = mode
+        self.directory = directory
+        self.latency_scale = latency_scale
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.inexact = 0
+        self.misses = 0
+        # Replay: the recorded calls, by key and by (recorded task, kind, name) in recorded order
+        self._entries: Optional[List[Dict[str, Any]]] = None
+        self._by_key: Dict[str, List[int]] = defaultdict(list)
+        self._by_name: Dict[Tuple[str, str, str], List[int]] = defaultdict(list)
+        # Replay: the recorded task each running task was matched to, the calls it was served and when
+        # it last made one. Tasks idle for the checkpoint TTL are forgotten, as their runs cannot resume.
+        self._sources: Dict[str, str] = {}
+        self._used: Dict[str, Set[int]] = {}
+        self._last_call: Dict[str, float] = {}
+
+    # --- Recording ---
+
+    def _path(self, task_id: str) -> str:
+        return os.path.join(self.directory, f"{task_id}.jsonl.gz")
+
+    def _append(self, task_id: str, entry: Dict[str, Any]):
+        line = json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+        # Each entry is a gzip member of its own, so processes can append to a task's cassette in turn
+        with self._lock, gzip.open(self._path(task_id), "ab") as f:
+            f.write(line.encode("utf-8"))
+        self.recorded += 1
+
+    async def _record(self, kind: str, name: str, inputs: Any, started: float, output: Dict[str, Any]):
+        task_id = current_task_id()
+        if task_id is None:
+            return
+        entry = {"kind": kind, "name": name, "key": _key(kind, name, inputs), "ts": round(time.time(), 3),
+                 "latency": round(time.perf_counter() - started, 4), "input": inputs, **output}
+        await asyncio.to_thread(self._append, task_id, entry)
+
+    # --- Replay ---
+
+    def _load(self):
+        """Reads every cassette in the directory, once."""
+        with self._lock:
+            if self._entries is not None:
+                return
+            entries = []
+            for path in sorted(glob.glob(os.path.join(self.directory, "*.jsonl.gz"))):
+                source = os.path.basename(path)[:-len(".jsonl.gz")]
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        entry["source"] = source
+                        self._by_key[entry["key"]].append(len(entries))
+                        self._by_name[(source, entry["kind"], entry["name"])].append(len(entries))
+                        entries.append(entry)
+            self._entries = entries
+        log.info("cassettes_loaded", directory=self.directory, calls=len(entries))
+
+    async def aload(self):
+        """Loads the cassettes in a thread, at startup or else on the first replayed call."""
+        if self.mode == "replay" and self._entries is None:
+            await asyncio.to_thread(self._load)
+
+    def _find(self, kind: str, name: str, inputs: Any) -> Dict[str, Any]:
+        task_id = current_task_id() or ""
+        with self._lock:
+            if task_id not in self._used:
+                self._forget_idle_tasks()
+                self._used[task_id] = set()
+            self._last_call[task_id] = time.monotonic()
+            used = self._used[task_id]
+            source = self._sources.get(task_id)
+            exact = [i for i in self._by_key.get(_key(kind, name, inputs), []) if i not in used]
+            if source is not None:
+                exact = [i for i in exact if self._entries[i]["source"] == source] or exact
+            if exact:
+                index = exact[0]
+                self._sources.setdefault(task_id, self._entries[index]["source"])
+            elif source is not None:
+                unused = [i for i in self._by_name.get((source, kind, name), []) if i not in used]
+                if not unused:
+                    self.misses += 1
+                    raise CassetteMissError(f"No recorded {kind} call '{name}' is left in cassette {source}.")
+                index = unused[0]
+                self.inexact += 1
+                log.debug("cassette_inexact", kind=kind, name=name, source=source)
+            else:
+                self.misses += 1
+                raise CassetteMissError(f"No cassette has a recording of this {kind} call to '{name}'.")
+            used.add(index)
+            self.replayed += 1
+        return self._entries[index]
+
+    def _forget_idle_tasks(self):
+        cutoff = time.monotonic() - settings.CHECKPOINT_TTL_SECONDS
+        for task_id in [t for t, last in self._last_call.items() if last < cutoff]:
+            self._used.pop(task_id, None)
+            self._sources.pop(task_id, None)
+            self._last_call.pop(task_id, None)
+
+    async def _wait(self, seconds: float):
+        if self.latency_scale > 0 and seconds > 0:
+            await asyncio.sleep(seconds * self.latency_scale)
+
+    # --- Calls ---
+
+    async def call(self, kind: str, name: str, inputs: Any, run: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs and records a call, or serves it from a cassette."""
+        if self.mode == "replay":
+            await self.aload()
+            entry = self._find(kind, name, inputs)
+            await self._wait(entry["latency"])
+            if "error" in entry:
+                raise ReplayedError(entry["error"])
+            return _decode(entry["output"])
+
+        started = time.perf_counter()
+        try:
+            result = await run()
+        except Exception as e:
+            await self._record(kind, name, inputs, started, {"error": f"{type(e).__name__}: {e}"})
+            raise
+        await self._record(kind, name, inputs, started, {"output": _encode(result)})
+        return result
+
+    async def stream(self, kind: str, name: str, inputs: Any, run: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Streams and records a call's chunks with their timing, or replays them from a cassette."""
+        if self.mode == "replay":
+            await self.aload()
+            entry = self._find(kind, name, inputs)
+            elapsed = 0.0
+            for offset, text in entry.get("chunks", []):
+                await self._wait(offset - elapsed)
+                elapsed = offset
+                yield AIMessageChunk(content=text)
+            if "error" in entry:
+                raise ReplayedError(entry["error"])
+            return
+
+        started = time.perf_counter()
+        chunks = []
+        try:
+            async for chunk in run():
+                content = getattr(chunk, "content", chunk)
+                chunks.append([round(time.perf_counter() - started, 4), content if isinstance(content, str) else str(content)])
+                yield chunk
+        except Exception as e:
+            await self._record(kind, name, inputs, started, {"chunks": chunks, "error": f"{type(e).__name__}: {e}"})
+            raise
+        await self._record(kind, name, inputs, started, {"chunks": chunks})
+
+    def wrap_chain(self, name: str, chain: Runnable, streaming: bool = False) -> Runnable:
+        """The chain behind a cassette, running under `name` as the unwrapped chain would."""
+        if streaming:
+            async def run_streaming(inputs: Dict[str, Any], config: RunnableConfig):
+                async for chunk in self.stream("chain", name, inputs, lambda: chain.astream(inputs, config)):
+                    yield chunk
+            return RunnableLambda(run_streaming, name=name)
+
+        async def run(inputs: Dict[str, Any], config: RunnableConfig):
+            return await self.call("chain", name, inputs, lambda: chain.ainvoke(inputs, config))
+        return RunnableLambda(run, name=name)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"mode": self.mode, "directory": self.directory}
+        if self.mode == "record":
+            stats["recorded_calls"] = self.recorded
+        else:
+            stats.update({
+                "loaded_calls": len(self._entries) if self._entries is not None else None,
+                "replayed_calls": self.replayed,
+                "inexact_matches": self.inexact,
+                "misses": self.misses,
+                "replaying_tasks": len(self._used),
+                "latency_scale": self.latency_scale,
+            })
+        return stats
+
+
+cassettes: Optional[Cassettes] = None
+if settings.CASSETTE_MODE != "off":
+    cassettes = Cassettes(settings.CASSETTE_MODE, settings.CASSETTE_DIR, settings.CASSETTE_LATENCY_SCALE)
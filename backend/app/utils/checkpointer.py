@@ -0,0 +1,191 @@
+"""
+Durable, file-backed checkpointer for the research graph.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Optional, Sequence
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from app.utils.logs import get_logger
+
+log = get_logger(__name__)
+
+
+class DurableSqliteSaver(AsyncSqliteSaver):
+    """
+    An AsyncSqliteSaver tuned for the API server.
+
+    - The database runs in WAL mode with synchronous=NORMAL.
+    - Commits are batched: writes made within `commit_interval` seconds share one commit.
+      The connection that wrote them reads them back immediately; other processes see
+      them once the batch is committed.
+    - The last activity of each thread is recorded, and a background sweeper deletes
+      threads that have been idle for longer than the TTL, whether they finished or
+      were abandoned at the approval step.
+    """
+
+    def __init__(self, conn: aiosqlite.Connection, *, commit_interval: float = 0.02):
+        super().__init__(conn)
+        self.commit_interval = commit_interval
+        self._commit_task: Optional[asyncio.Task] = None
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def open(cls, path: str, *, commit_interval: float = 0.02) -> "DurableSqliteSaver":
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = await aiosqlite.connect(path, timeout=30)
+        saver = cls(conn, commit_interval=commit_interval)
+        await saver.setup()
+        return saver
+
+    async def setup(self) -> None:
+        if self.is_setup:
+            return
+        await super().setup()
+        async with self.lock:
+            await self.conn.executescript(
+                """
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS thread_activity (
+                    thread_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS thread_activity_updated ON thread_activity (updated_at);
+                """
+            )
+            await self.conn.commit()
+
+    async def _commit_soon(self) -> None:
+        """Commits now, or schedules one commit for every write in the current batch. Call with the lock held."""
+        if self.commit_interval <= 0:
+            await self.conn.commit()
+            return
+        if self._commit_task is None or self._commit_task.done():
+            self._commit_task = asyncio.create_task(self._delayed_commit())
+
+    async def _delayed_commit(self) -> None:
+        await asyncio.sleep(self.commit_interval)
+        async with self.lock:
+            await self.conn.commit()
+
+    async def flush(self) -> None:
+        """Commits any writes still waiting for their batch."""
+        if self._commit_task is not None and not self._commit_task.done():
+            self._commit_task.cancel()
+        async with self.lock:
+            await self.conn.commit()
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        await self.setup()
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        serialized_metadata = self.jsonplus_serde.dumps(get_checkpoint_metadata(config, metadata))
+        async with self.lock:
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized_checkpoint,
+                    serialized_metadata,
+                ),
+            )
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+            await self._commit_soon()
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        query = (
+            "INSERT OR REPLACE INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            if all(w[0] in WRITES_IDX_MAP for w in writes)
+            else "INSERT OR IGNORE INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        )
+        await self.setup()
+        rows = [
+            (
+                str(config["configurable"]["thread_id"]),
+                str(config["configurable"]["checkpoint_ns"]),
+                str(config["configurable"]["checkpoint_id"]),
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        async with self.lock:
+            await self.conn.executemany(query, rows)
+            await self._commit_soon()
+
+    async def sweep(self, ttl_seconds: float) -> int:
+        """Deletes every thread idle for longer than `ttl_seconds`. Returns how many were deleted."""
+        await self.setup()
+        cutoff = time.time() - ttl_seconds
+        async with self.lock:
+            async with self.conn.execute(
+                "SELECT thread_id FROM thread_activity WHERE updated_at < ?", (cutoff,)
+            ) as cursor:
+                thread_ids = [row[0] for row in await cursor.fetchall()]
+            for thread_id in thread_ids:
+                await self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                await self.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+                await self.conn.execute("DELETE FROM thread_activity WHERE thread_id = ?", (thread_id,))
+            await self.conn.commit()
+        return len(thread_ids)
+
+    def start_sweeper(self, ttl_seconds: float, interval_seconds: float) -> None:
+        async def sweep_forever():
+            while True:
+                await asyncio.sleep(interval_seconds)
+                try:
+                    removed = await self.sweep(ttl_seconds)
+                    if removed:
+                        log.info("checkpoints_swept", threads=removed)
+                except Exception as e:
+                    log.exception("checkpoint_sweep_failed", error=str(e))
+
+        self._sweeper_task = asyncio.create_task(sweep_forever())
+
+    async def aclose(self) -> None:
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
+        await self.flush()
+        await self.conn.close()
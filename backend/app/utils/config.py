@@ -21,4 +21,171 @@ class Settings(BaseSettings):
     # LLM_PROVIDER: str = "ollama"
     # LLM_PROVIDER: str = "openrouter" 
 
-settings = Settings()
\ No newline at end of file
+    # Chat model clients, shared by tasks with the same provider, model and API key
+    LLM_CLIENT_POOL_SIZE: int = 32
+    LLM_CLIENT_IDLE_SECONDS: int = 30 * 60
+
+    # Provider SDKs and clients load on first use. With warm-up, the configured provider's client is built
+    # in the background at startup, and /ready answers 503 until it is done (/health answers at once).
+    WARMUP_ENABLED: bool = True
+
+    # Research tool APIs and the pooled HTTP clients that call them
+    TAVILY_BASE_URL: str = "https://api.tavily.com"
+    ARXIV_API_URL: str = "https://export.arxiv.org/api/query"
+    WIKIPEDIA_API_URL: str = "https://en.wikipedia.org/w/api.php"
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_SECONDS: float = 30.0
+    HTTP_TIMEOUT_SECONDS: float = 20.0
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+
+    # Tool call resilience. Timeouts apply per attempt, the deadline to a whole call including retries.
+    # A slow call is hedged with a second request past the latency percentile (0 disables hedging).
+    TOOL_TIMEOUT_WEB_SEARCH: float = 10.0
+    TOOL_TIMEOUT_ARXIV_SEARCH: float = 10.0
+    TOOL_TIMEOUT_WIKIPEDIA_SEARCH: float = 6.0
+    TOOL_DEADLINE_SECONDS: float = 20.0
+    TOOL_RETRIES: int = 1
+    TOOL_RETRY_BACKOFF_SECONDS: float = 0.5
+    TOOL_HEDGE_PERCENTILE: float = 95.0
+    TOOL_BREAKER_FAILURES: int = 5
+    TOOL_BREAKER_RESET_SECONDS: float = 30.0
+
+    # Per-task budgets, 0 for unlimited. A request can ask for tighter limits, never looser ones.
+    # Time counts the seconds spent running the task, not the wait for approval. Research stops
+    # early enough to leave the reserve fraction of the time and token budgets for the summarizer.
+    TASK_MAX_SECONDS: float = 0
+    TASK_MAX_TOKENS: int = 0
+    TASK_MAX_TOOL_CALLS: int = 0
+    TASK_BUDGET_SUMMARY_RESERVE: float = 0.25
+
+    # Admission control. Planning runs inside /research and resumed tasks in the background; beyond
+    # the running limit, runs wait in a bounded queue, and requests beyond that get a 429 with Retry-After.
+    PLANNING_MAX_RUNNING: int = 16
+    PLANNING_MAX_QUEUED: int = 32
+    RESUME_MAX_RUNNING: int = 8
+    RESUME_MAX_QUEUED: int = 64
+
+    # Where resumed research runs: 'inline' (in the API process) or 'queue' (jobs in a SQLite queue, run by
+    # worker processes sharing the checkpointer and result store; needs the sqlite checkpointer).
+    # In queue mode the API starts WORKER_PROCESSES workers; with 0, run `python -m app.worker` yourself.
+    # A job whose worker stops renewing its lease is handed to another worker.
+    EXECUTION_MODE: str = "inline"
+    WORKER_PROCESSES: int = 2
+    WORKER_CONCURRENCY: int = 4
+    JOB_QUEUE_PATH: str = "data/jobs.sqlite3"
+    JOB_LEASE_SECONDS: float = 60.0
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_POLL_INTERVAL_MS: int = 200
+    JOB_RETENTION_SECONDS: int = 24 * 60 * 60
+    # Workers write task events to the event log in batches: every EVENT_LOG_FLUSH_MS, or sooner once
+    # EVENT_LOG_FLUSH_CHARS of report text is waiting.
+    EVENT_LOG_FLUSH_MS: int = 50
+    EVENT_LOG_FLUSH_CHARS: int = 4096
+
+    # Token-bucket rate limits shared by all tasks, in requests per second (0 disables).
+    # The LLM defaults follow the providers' free tiers; the ArXiv API asks for one request every three seconds.
+    LLM_RATE_LIMIT_GROQ: float = 0.5
+    LLM_RATE_LIMIT_GOOGLE: float = 0.25
+    LLM_RATE_LIMIT_OPENROUTER: float = 0.33
+    LLM_RATE_LIMIT_OLLAMA: float = 0
+    LLM_RATE_LIMIT_BURST: int = 5
+    TOOL_RATE_LIMIT_WEB_SEARCH: float = 1.5
+    TOOL_RATE_LIMIT_ARXIV_SEARCH: float = 0.34
+    TOOL_RATE_LIMIT_WIKIPEDIA_SEARCH: float = 10.0
+    TOOL_RATE_LIMIT_BURST: int = 3
+
+    # Structured logs of tasks, written by a background thread: 'json' lines or 'otel' (OpenTelemetry's JSON layout),
+    # to LOG_FILE or stderr. Spans (nodes, agent chains, chat model and tool calls) are logged for the sampled
+    # share of tasks at INFO, with durations and payload sizes; LOG_LEVEL=DEBUG adds the payloads themselves.
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_FILE: Optional[str] = None
+    TRACE_SAMPLE_RATE: float = 1.0
+    TRACE_PAYLOAD_MAX_CHARS: int = 2000
+
+    # Prometheus metrics at /metrics. Worker processes send theirs to the API through the job queue database.
+    METRICS_ENABLED: bool = True
+    METRICS_WORKER_INTERVAL_SECONDS: float = 10.0
+
+    # Research fan-out: questions of one task run concurrently, bounded per task and across all tasks
+    RESEARCH_TASK_CONCURRENCY: int = 5
+    RESEARCH_GLOBAL_CONCURRENCY: int = 20
+    # Speculative research (opt-in): while a task waits for approval, the API process researches the planned
+    # questions with at most SPECULATIVE_RESEARCH_CONCURRENCY of the global slots, and the results of the questions
+    # the user keeps are used on resume, which waits up to SPECULATIVE_RESEARCH_WAIT_SECONDS for kept questions
+    # still in flight. Results of tasks not resumed within the TTL are dropped.
+    SPECULATIVE_RESEARCH_ENABLED: bool = False
+    SPECULATIVE_RESEARCH_CONCURRENCY: int = 4
+    SPECULATIVE_RESEARCH_WAIT_SECONDS: float = 30.0
+    SPECULATIVE_RESEARCH_TTL_SECONDS: int = 30 * 60
+
+    # Tool routing: the local router decides alone at or above this confidence, otherwise the LLM is asked.
+    # 0 never calls the LLM; values above 1 always do.
+    ROUTER_CONFIDENCE_THRESHOLD: float = 0.8
+
+    # Duplicate findings: exact matches plus near duplicates above the estimated Jaccard similarity.
+    # DEDUP_NUM_PERM must be a multiple of DEDUP_BANDS.
+    DEDUP_ENABLED: bool = True
+    DEDUP_SIMILARITY_THRESHOLD: float = 0.8
+    DEDUP_SHINGLE_SIZE: int = 5
+    DEDUP_NUM_PERM: int = 64
+    DEDUP_BANDS: int = 16
+
+    # Summarizer context packing. The window defaults to the provider's model (0); the output tokens are
+    # reserved for the report, and the margin absorbs differences between tokenizers.
+    SUMMARIZER_CONTEXT_WINDOW: int = 0
+    SUMMARIZER_OUTPUT_TOKENS: int = 2048
+    SUMMARIZER_MAX_INPUT_TOKENS: int = 100_000
+    CONTEXT_SAFETY_MARGIN: float = 0.9
+    # 'tiktoken' (falls back to 'chars' when unavailable) or 'chars' (four characters per token)
+    CONTEXT_TOKENIZER: str = "tiktoken"
+    # 'single' (one prompt with all findings), 'map_reduce' (condense each question in parallel, then merge)
+    # or 'auto', which uses map-reduce when the findings exceed the threshold or do not fit the context budget
+    SUMMARIZER_MODE: str = "auto"
+    SUMMARIZER_MAP_REDUCE_THRESHOLD_TOKENS: int = 12000
+    SUMMARIZER_MAP_CONCURRENCY: int = 4
+    SUMMARIZER_MAP_SUMMARY_WORDS: int = 250
+
+    # Tool result cache (SQLite on local disk). TTLs are in seconds; 0 disables caching for that tool.
+    TOOL_CACHE_ENABLED: bool = True
+    TOOL_CACHE_PATH: str = "data/tool_cache.sqlite3"
+    TOOL_CACHE_MAX_ENTRIES: int = 5000
+    TOOL_CACHE_TTL_WEB_SEARCH: int = 6 * 60 * 60
+    TOOL_CACHE_TTL_ARXIV_SEARCH: int = 7 * 24 * 60 * 60
+    TOOL_CACHE_TTL_WIKIPEDIA_SEARCH: int = 24 * 60 * 60
+
+    # Findings of earlier tasks, reused for similar questions without calling a tool. Questions match when
+    # the Jaccard similarity of their content words reaches the threshold; entries expire after the
+    # TOOL_CACHE_TTL_* of the tool that found them.
+    FINDINGS_INDEX_ENABLED: bool = True
+    FINDINGS_INDEX_PATH: str = "data/findings_index.sqlite3"
+    FINDINGS_INDEX_SIMILARITY: float = 0.75
+    FINDINGS_INDEX_MAX_ENTRIES: int = 20000
+
+    # LLM response cache: 'sqlite' (persistent, shared by workers), 'memory' or 'none'
+    LLM_CACHE_BACKEND: str = "sqlite"
+    LLM_CACHE_PATH: str = "data/llm_cache.sqlite3"
+    LLM_CACHE_MAX_ENTRIES: int = 10000
+
+    # Cassettes of agent chain and tool calls, for profiling captured traffic offline: 'off', 'record'
+    # (one cassette per task) or 'replay' (calls are served from the cassettes, without network).
+    # Replayed calls take their recorded latency times the scale; 0 replays them as fast as possible.
+    CASSETTE_MODE: str = "off"
+    CASSETTE_DIR: str = "data/cassettes"
+    CASSETTE_LATENCY_SCALE: float = 1.0
+
+    # Graph checkpointer: 'sqlite' (durable, file-backed) or 'memory'
+    CHECKPOINTER: str = "sqlite"
+    CHECKPOINT_PATH: str = "data/checkpoints.sqlite3"
+    CHECKPOINT_COMMIT_INTERVAL_MS: int = 20
+    # Threads idle for longer than the TTL are deleted by the background sweeper
+    CHECKPOINT_TTL_SECONDS: int = 24 * 60 * 60
+    CHECKPOINT_SWEEP_INTERVAL_SECONDS: int = 10 * 60
+
+    # Final results of completed tasks: kept in memory up to the budget, then spilled to disk
+    RESULT_STORE_DIR: str = "data/results"
+    RESULT_STORE_MEMORY_BUDGET_MB: int = 64
+    RESULT_STORE_TTL_SECONDS: int = 7 * 24 * 60 * 60
+
+settings = Settings()
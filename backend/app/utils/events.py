@@ -0,0 +1,99 @@
+"""
+In-process publish/subscribe of task progress events, consumed by the SSE endpoint.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+# Events after which a task produces nothing more
+TERMINAL_EVENTS = {"complete", "error"}
+
+
+class TaskEventBus:
+    """
+    Keeps a short history of events per task and pushes new ones to live subscribers.
+    Late subscribers first receive the history, so they never miss a transition. Only the
+    most recent `max_tasks` tasks keep their history.
+    """
+
+    def __init__(self, max_tasks: int = 1000, max_events_per_task: int = 500):
+        self.max_tasks = max_tasks
+        self.max_events_per_task = max_events_per_task
+        self._history: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # Report text streamed so far, per task; cleared when the task ends
+        self._reports: Dict[str, List[str]] = {}
+
+    def _record(self, task_id: str, message: Dict[str, Any]):
+        history = self._history.setdefault(task_id, [])
+        self._history.move_to_end(task_id)
+        if len(history) < self.max_events_per_task:
+            history.append(message)
+        while len(self._history) > self.max_tasks:
+            evicted_task_id, _ = self._history.popitem(last=False)
+            self._reports.pop(evicted_task_id, None)
+
+    def _push(self, task_id: str, message: Dict[str, Any]):
+        for queue in self._subscribers.get(task_id, ()):
+            queue.put_nowait(message)
+
+    def publish(self, task_id: str, event: str, data: Optional[Dict[str, Any]] = None):
+        message = {"event": event, "data": data or {}, "ts": time.time()}
+        if event in TERMINAL_EVENTS and self._reports.pop(task_id, None) is not None:
+            # The finished report lives in the result store; drop the streamed copy
+            self._history[task_id] = [m for m in self._history.get(task_id, ()) if m["event"] != "report_partial"]
+        self._record(task_id, message)
+        self._push(task_id, message)
+
+    def append_report(self, task_id: str, text: str):
+        """
+        Adds a streamed piece of the report. Live subscribers receive it as a 'report_token'
+        event; the history keeps a single 'report_partial' entry that replays the text so far.
+        """
+        parts = self._reports.get(task_id)
+        if parts is None:
+            parts = self._reports[task_id] = []
+            self._record(task_id, {"event": "report_partial", "data": None, "ts": time.time()})
+        parts.append(text)
+        self._push(task_id, {"event": "report_token", "data": {"text": text}, "ts": time.time()})
+
+    def partial_report(self, task_id: str) -> Optional[str]:
+        parts = self._reports.get(task_id)
+        return "".join(parts) if parts is not None else None
+
+    def has_history(self, task_id: str) -> bool:
+        return task_id in self._history
+
+    async def subscribe(self, task_id: str, heartbeat_seconds: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yields the task's past events, then live ones, until a terminal event.
+        Yields None after `heartbeat_seconds` without events, so callers can keep the connection alive.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        # Registering and copying the history happen without an await in between,
+        # so no event can fall between the two.
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        for message in list(self._history.get(task_id, ())):
+            if message["event"] == "report_partial":
+                message = {**message, "data": {"text": self.partial_report(task_id) or ""}}
+            queue.put_nowait(message)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield message
+                if message["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[task_id]
+
+
+event_bus = TaskEventBus()
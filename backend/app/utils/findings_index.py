@@ -0,0 +1,216 @@
+"""
+Index of the findings of earlier tasks, so a question that was researched recently, by any task,
+is answered without calling a tool again.
+"""
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from app.utils.config import settings
+from app.utils.storage import connect_sqlite
+
+_WORD_RE = re.compile(r"\w+")
+# Most entries a lookup compares a question with
+_MAX_CANDIDATES = 500
+# Words that say nothing about what a question is about
+_STOPWORDS = frozenset(
+    "a an and are as at be by can could did do does for from has have how in into is it its of on or s "
+    "should t that the their there these this those to was were what whats when where which who whom "
+    "whose why will with would".split()
+)
+
+
+def question_terms(question: str) -> FrozenSet[str]:
+    """The content words of a question, lowercased, with plural 's' endings dropped."""
+    terms = set()
+    for word in _WORD_RE.findall(question.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.add(word)
+    return frozenset(terms)
+
+
+def _numbers(terms) -> FrozenSet[str]:
+    # Years, versions and quantities change what a question asks, however similar the rest is
+    return frozenset(term for term in terms if term.isdigit())
+
+
+@dataclass
+class IndexedFindings:
+    """Findings of an earlier question that matched, and how closely."""
+    question: str
+    tool: str
+    findings: List[str]
+    sources: List[Dict[str, Any]]
+    similarity: float
+    age_seconds: float
+
+
+class FindingsIndex:
+    """
+    A SQLite-backed index from questions to the findings and sources a tool returned for them,
+    shared by the API and worker processes. Questions match when the Jaccard similarity of their
+    content words reaches the threshold and they have the same numbers in them; candidates are found through an inverted index of those
+    words. Entries expire after the TTL of the tool that found them, and the oldest are evicted
+    beyond `max_entries`.
+    """
+
+    def __init__(self, path: str, ttls: Dict[str, int], similarity: float, max_entries: int):
+        self.ttls = ttls
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS findings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT NOT NULL,
+                terms_key TEXT NOT NULL,
+                term_count INTEGER NOT NULL,
+                tool TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS findings_created ON findings (created_at);
+            CREATE INDEX IF NOT EXISTS findings_terms_key ON findings (terms_key, tool);
+            CREATE TABLE IF NOT EXISTS finding_terms (
+                term TEXT NOT NULL,
+                finding_id INTEGER NOT NULL,
+                PRIMARY KEY (term, finding_id)
+            ) WITHOUT ROWID;
+            """
+        )
+
+    def get(self, question: str) -> Optional[IndexedFindings]:
+        """The freshest, closest match for a question, or None when none is similar or fresh enough."""
+        terms = question_terms(question)
+        if not terms:
+            return None
+        now = time.time()
+        with self._lock:
+            best = None
+            numbers = _numbers(terms)
+            for finding_id, indexed_question, terms_key, tool, created_at, shared in self._candidates(terms):
+                indexed_terms = terms_key.split(" ")
+                similarity = shared / (len(terms) + len(indexed_terms) - shared)
+                if similarity < self.similarity or now - created_at > self.ttls.get(tool, 0):
+                    continue
+                if _numbers(indexed_terms) != numbers:
+                    continue
+                if best is None or (similarity, created_at) > (best[0], best[4]):
+                    best = (similarity, finding_id, indexed_question, tool, created_at)
+            if best is None:
+                self.misses += 1
+                return None
+            similarity, finding_id, indexed_question, tool, created_at = best
+            payload = self._conn.execute("SELECT payload FROM findings WHERE id = ?", (finding_id,)).fetchone()[0]
+            self.hits += 1
+        findings, sources = json.loads(zlib.decompress(payload))
+        return IndexedFindings(indexed_question, tool, findings, sources, round(similarity, 3), round(now - created_at, 1))
+
+    def _candidates(self, terms: FrozenSet[str]) -> List[tuple]:
+        """
+        The entries that can reach the threshold, with the number of terms they share with `terms`.
+        A match shares at least ceil(threshold * len(terms)) of the terms, so it contains at least one of
+        the len(terms) - that + 1 rarest ones: only entries holding one of those are looked at.
+        """
+        placeholders = ",".join("?" * len(terms))
+        frequencies = dict(self._conn.execute(
+            f"SELECT term, COUNT(*) FROM finding_terms WHERE term IN ({placeholders}) GROUP BY term", tuple(terms)
+        ).fetchall())
+        prefix_size = len(terms) - math.ceil(self.similarity * len(terms)) + 1
+        prefix = sorted(terms, key=lambda term: frequencies.get(term, 0))[:max(1, prefix_size)]
+        prefix = [term for term in prefix if frequencies.get(term)]
+        if not prefix:
+            return []
+        # When a prefix term is very common, the entries holding the most prefix terms, then the newest, are kept
+        candidate_ids = [row[0] for row in self._conn.execute(
+            f"SELECT finding_id FROM finding_terms WHERE term IN ({','.join('?' * len(prefix))})"
+            " GROUP BY finding_id ORDER BY COUNT(*) DESC, finding_id DESC LIMIT ?",
+            (*prefix, _MAX_CANDIDATES),
+        )]
+        return self._conn.execute(
+            "SELECT f.id, f.question, f.terms_key, f.tool, f.created_at, COUNT(*)"
+            " FROM finding_terms t JOIN findings f ON f.id = t.finding_id"
+            f" WHERE t.term IN ({placeholders}) AND t.finding_id IN ({','.join('?' * len(candidate_ids))})"
+            " GROUP BY f.id",
+            (*terms, *candidate_ids),
+        ).fetchall()
+
+    def put(self, question: str, tool: str, findings: List[str], sources: List[Dict[str, Any]]):
+        """Indexes a question's findings, replacing what the same tool found for the same words before."""
+        terms = question_terms(question)
+        if not terms or self.ttls.get(tool, 0) <= 0:
+            return
+        terms_key = " ".join(sorted(terms))
+        # default=str covers metadata such as the datetime.date ArXiv puts in 'Published'
+        payload = zlib.compress(json.dumps([findings, sources], separators=(",", ":"), default=str).encode("utf-8"))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                replaced = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM findings WHERE terms_key = ? AND tool = ?", (terms_key, tool))]
+                # Beyond the limit, the oldest entries go first
+                replaced += [row[0] for row in self._conn.execute(
+                    "SELECT id FROM findings ORDER BY created_at DESC LIMIT -1 OFFSET ?", (self.max_entries - 1,))]
+                self._delete(replaced)
+                finding_id = self._conn.execute(
+                    "INSERT INTO findings (question, terms_key, term_count, tool, payload, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (question, terms_key, len(terms), tool, payload, time.time()),
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO finding_terms (term, finding_id) VALUES (?, ?)", [(term, finding_id) for term in terms]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete(self, finding_ids: List[int]):
+        for start in range(0, len(finding_ids), 500):
+            batch = finding_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM finding_terms WHERE finding_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM findings WHERE id IN ({placeholders})", batch)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM finding_terms")
+            self._conn.execute("DELETE FROM findings")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM findings").fetchone()[0]
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "similarity": self.similarity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+        }
+
+
+findings_index: Optional[FindingsIndex] = None
+if settings.FINDINGS_INDEX_ENABLED:
+    findings_index = FindingsIndex(
+        settings.FINDINGS_INDEX_PATH,
+        ttls={
+            "web_search": settings.TOOL_CACHE_TTL_WEB_SEARCH,
+            "arxiv_search": settings.TOOL_CACHE_TTL_ARXIV_SEARCH,
+            "wikipedia_search": settings.TOOL_CACHE_TTL_WIKIPEDIA_SEARCH,
+        },
+        similarity=settings.FINDINGS_INDEX_SIMILARITY,
+        max_entries=settings.FINDINGS_INDEX_MAX_ENTRIES,
+    )
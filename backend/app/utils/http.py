@@ -0,0 +1,47 @@
+"""
+Long-lived, pooled HTTP clients shared by the research tools.
+"""
+import asyncio
+from typing import Optional
+
+import httpx
+
+from app.utils.config import settings
+
+USER_AGENT = "DeepResearch/1.0 (research agent; +https://github.com/ninadw25/DeepResearch)"
+
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_SECONDS,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.HTTP_TIMEOUT_SECONDS, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    The process-wide async client. Its connections belong to the event loop that opened them,
+    so a new client is created if it is first used from a different loop.
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout(), headers={"User-Agent": USER_AGENT})
+        _async_client_loop = loop
+    return _async_client
+
+
+async def aclose():
+    """Closes the client and its pooled connections; it is recreated on next use."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
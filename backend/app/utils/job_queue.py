@@ -0,0 +1,317 @@
+"""
+SQLite-backed job queue and event log, shared by the API process and the research workers.
+"""
+import asyncio
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.admission import QueueFullError
+from app.utils.config import settings
+from app.utils.logs import get_logger
+from app.utils.storage import connect_sqlite
+
+log = get_logger(__name__)
+
+
+@dataclass
+class Job:
+    id: int
+    task_id: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class JobQueue:
+    """
+    A durable FIFO of graph runs, claimed by workers under a lease.
+
+    A worker renews its lease while it runs a job. If the worker dies, the lease runs out and
+    the next claim hands the job to another worker, so a crash delays a job but never loses it.
+    Jobs are therefore run at least once; runs are resumed from the task's last checkpoint,
+    so nodes that completed before a crash are not repeated.
+    """
+
+    def __init__(self, path: str, lease_seconds: float):
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_until REAL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+            CREATE INDEX IF NOT EXISTS jobs_task ON jobs (task_id);
+            CREATE TABLE IF NOT EXISTS worker_metrics (
+                worker TEXT PRIMARY KEY,
+                snapshot TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+
+    def _retry_after(self) -> int:
+        """Seconds a job recently took from enqueue to completion, as a hint for rejected clients."""
+        mean = self._conn.execute(
+            "SELECT AVG(updated_at - created_at) FROM"
+            " (SELECT updated_at, created_at FROM jobs WHERE status = 'done' ORDER BY id DESC LIMIT 50)"
+        ).fetchone()[0]
+        return max(1, math.ceil(mean)) if mean else 30
+
+    def enqueue(self, task_id: str, payload: Dict[str, Any], max_queued: int) -> int:
+        """
+        Adds a job and returns its 1-based position among waiting jobs.
+        A task whose job is already waiting or running keeps that job (position 0 once it runs).
+        Raises QueueFullError when `max_queued` jobs are already waiting.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, status FROM jobs WHERE task_id = ? AND status IN ('queued', 'running')", (task_id,)
+                ).fetchone()
+                if row is None:
+                    queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                    if queued >= max_queued:
+                        raise QueueFullError("research", queued + 1, self._retry_after())
+                    job_id = self._conn.execute(
+                        "INSERT INTO jobs (task_id, payload, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                        (task_id, json.dumps(payload, default=str), now, now),
+                    ).lastrowid
+                elif row[1] == "running":
+                    self._conn.execute("COMMIT")
+                    return 0
+                else:
+                    job_id = row[0]
+                position = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND id <= ?", (job_id,)
+                ).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return position
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """Takes the oldest waiting job, or a running one whose worker stopped renewing its lease."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, lease_until = ?, updated_at = ?"
+                " WHERE id = (SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+                "             ORDER BY id LIMIT 1)"
+                " RETURNING id, task_id, payload, attempts",
+                (worker, now + self.lease_seconds, now, now),
+            ).fetchone()
+        if row is None:
+            return None
+        return Job(id=row[0], task_id=row[1], payload=json.loads(row[2]), attempts=row[3])
+
+    def renew(self, job_id: int, worker: str) -> bool:
+        """Extends a job's lease. Returns False when the job was handed to another worker."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, time.time(), job_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, job_id: int, worker: str):
+        """Puts a job that its worker is abandoning (e.g. on shutdown) back at the head of the queue."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, worker = NULL, lease_until = NULL, updated_at = ?"
+                " WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), job_id, worker),
+            )
+
+    def finish(self, job_id: int, worker: str, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ?",
+                ("failed" if error else "done", error, time.time(), job_id, worker),
+            )
+
+    def position(self, task_id: str) -> Optional[int]:
+        """1-based position of the task's waiting job, or None when it has none waiting."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND id <= ("
+                " SELECT id FROM jobs WHERE task_id = ? AND status = 'queued' ORDER BY id LIMIT 1)",
+                (task_id,),
+            ).fetchone()
+        return row[0] or None
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def prune(self, older_than_seconds: float) -> int:
+        """Deletes finished jobs, and the metrics of workers gone quiet, older than the given age."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - older_than_seconds,),
+            )
+            self._conn.execute("DELETE FROM worker_metrics WHERE updated_at < ?", (time.time() - older_than_seconds,))
+        return cursor.rowcount
+
+    def save_metrics(self, worker: str, snapshot: Dict[str, Any]):
+        """Stores a worker's latest metrics snapshot for the API's /metrics."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO worker_metrics (worker, snapshot, updated_at) VALUES (?, ?, ?)",
+                (worker, json.dumps(snapshot), time.time()),
+            )
+
+    def worker_metrics(self) -> List[Dict[str, Any]]:
+        """
+        The latest metrics snapshot of every worker. Those of stopped workers are kept until pruned,
+        so the totals do not drop when a worker restarts.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT snapshot FROM worker_metrics").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            expired = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'running' AND lease_until < ?", (time.time(),)
+            ).fetchone()[0]
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "expired_leases": expired,
+            "oldest_queued_seconds": round(time.time() - oldest, 1) if oldest else None,
+        }
+
+
+class EventLog:
+    """
+    Task progress events written by worker processes, for the API process to relay to its
+    event bus. Has the same publish and append_report methods as the bus.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, task_id TEXT NOT NULL, event TEXT NOT NULL,"
+            " data TEXT NOT NULL, ts REAL NOT NULL)"
+        )
+
+    def publish(self, task_id: str, event: str, data: Optional[Dict[str, Any]] = None):
+        self.publish_many([(task_id, event, data)])
+
+    def publish_many(self, events: List[Tuple[str, str, Optional[Dict[str, Any]]]]):
+        """Writes (task_id, event, data) events in one transaction, in order."""
+        now = time.time()
+        rows = [(task_id, event, json.dumps(data or {}, default=str), now) for task_id, event, data in events]
+        with self._lock:
+            self._conn.executemany("INSERT INTO events (task_id, event, data, ts) VALUES (?, ?, ?, ?)", rows)
+
+    def append_report(self, task_id: str, text: str):
+        self.publish(task_id, "report_token", {"text": text})
+
+    def last_id(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def read_after(self, last_id: int, limit: int = 1000) -> List[Tuple[int, str, str, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, task_id, event, data FROM events WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit)
+            ).fetchall()
+        return [(row[0], row[1], row[2], json.loads(row[3])) for row in rows]
+
+    def prune(self, older_than_seconds: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM events WHERE ts < ?", (time.time() - older_than_seconds,))
+        return cursor.rowcount
+
+
+class BufferedEventLog:
+    """
+    The event log as a worker's jobs write to it, without blocking their shared event loop.
+    Events are buffered in order and written in one transaction, in a thread, every
+    `flush_interval` seconds or as soon as `max_buffered_chars` of report text is waiting.
+    A task's consecutive report tokens are merged into one event.
+    """
+
+    def __init__(self, event_log: EventLog, flush_interval: float, max_buffered_chars: int):
+        self.event_log = event_log
+        self.flush_interval = flush_interval
+        self.max_buffered_chars = max_buffered_chars
+        self._events: List[Tuple[str, str, Dict[str, Any]]] = []
+        # The buffered report_token event of each task that more text can still be added to
+        self._open_reports: Dict[str, Dict[str, Any]] = {}
+        self._buffered_chars = 0
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+
+    def publish(self, task_id: str, event: str, data: Optional[Dict[str, Any]] = None):
+        self._open_reports.pop(task_id, None)
+        self._events.append((task_id, event, data or {}))
+        self._schedule()
+
+    def append_report(self, task_id: str, text: str):
+        report = self._open_reports.get(task_id)
+        if report is None:
+            report = self._open_reports[task_id] = {"text": ""}
+            self._events.append((task_id, "report_token", report))
+        report["text"] += text
+        self._buffered_chars += len(text)
+        self._schedule()
+
+    def _schedule(self):
+        if self._buffered_chars >= self.max_buffered_chars:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self):
+        flush = asyncio.ensure_future(self.flush())
+        self._flushes.add(flush)
+        flush.add_done_callback(self._flush_done)
+
+    def _flush_done(self, flush: asyncio.Future):
+        self._flushes.discard(flush)
+        if not flush.cancelled() and flush.exception() is not None:
+            log.warning("event_log_flush_failed", error=f"{type(flush.exception()).__name__}: {flush.exception()}")
+
+    async def flush(self):
+        """Writes everything buffered so far. Flushes run one at a time, so events stay in order."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        events, self._events, self._open_reports, self._buffered_chars = self._events, [], {}, 0
+        async with self._flush_lock:
+            if events:
+                await asyncio.to_thread(self.event_log.publish_many, events)
+
+
+job_queue: Optional[JobQueue] = None
+event_log: Optional[EventLog] = None
+if settings.EXECUTION_MODE == "queue":
+    job_queue = JobQueue(settings.JOB_QUEUE_PATH, lease_seconds=settings.JOB_LEASE_SECONDS)
+    event_log = EventLog(settings.JOB_QUEUE_PATH)
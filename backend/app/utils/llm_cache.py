@@ -0,0 +1,201 @@
+"""
+LLM response caches. The backend is chosen with settings.LLM_CACHE_BACKEND.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from app.utils.config import settings
+from app.utils.metrics import metrics
+from app.utils.storage import connect_sqlite
+
+
+# The app's provider names (settings.LLM_PROVIDER, CONTEXT_WINDOWS, metrics labels) by chat model class
+_PROVIDERS_BY_CLASS = {
+    "ChatGroq": "groq",
+    "ChatGoogleGenerativeAI": "google",
+    "ChatOpenAI": "openrouter",
+    "ChatOllama": "ollama",
+}
+# ... and by the '_type' of models that are not serializable
+_PROVIDERS_BY_TYPE = {"chat-ollama": "ollama"}
+_TYPE_RE = re.compile(r"\('_type', '([^']*)'\)")
+
+
+def _model_identity(llm_string: str) -> Tuple[str, str, str]:
+    """
+    Extracts (provider, model, temperature) from LangChain's llm_string.
+    For serializable chat models it starts with the JSON constructor of the model,
+    followed by '---' and the call parameters; for others it lists the parameters,
+    '_type' among them.
+    """
+    try:
+        constructor = json.loads(llm_string.split("---", 1)[0])
+        kwargs = constructor.get("kwargs", {})
+        class_name = constructor["id"][-1]
+        provider = _PROVIDERS_BY_CLASS.get(class_name, class_name)
+        model = kwargs.get("model") or kwargs.get("model_name") or "unknown"
+        return provider, str(model), str(kwargs.get("temperature"))
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        match = _TYPE_RE.search(llm_string)
+        if match:
+            return _PROVIDERS_BY_TYPE.get(match.group(1), match.group(1)), "unknown", "unknown"
+        return "unknown", "unknown", "unknown"
+
+
+def _count_lookup(hit: bool):
+    if metrics is not None:
+        metrics.cache_lookups.inc("llm", "hit" if hit else "miss")
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    A size-bounded LLM cache persisted in SQLite, so it survives restarts and is
+    shared by every uvicorn worker using the same file. Least recently used entries
+    are evicted once the cache holds more than `max_entries` generations.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, provider TEXT NOT NULL, model TEXT NOT NULL,"
+            " payload BLOB NOT NULL, accessed_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> Tuple[str, str, str]:
+        provider, model, temperature = _model_identity(llm_string)
+        raw = "\x1f".join([provider, model, temperature, llm_string, prompt])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest(), provider, model
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key, provider, model = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses[f"{provider}:{model}"] += 1
+                _count_lookup(hit=False)
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+            )
+            self.hits[f"{provider}:{model}"] += 1
+        _count_lookup(hit=True)
+        return [loads(generation) for generation in json.loads(zlib.decompress(row[0]))]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key, provider, model = self._key(prompt, llm_string)
+        payload = zlib.compress(json.dumps([dumps(generation) for generation in return_val]).encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, provider, model, payload, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, provider, model, payload, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            "backend": "sqlite",
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+class BoundedInMemoryLLMCache(BaseCache):
+    """
+    An in-memory LLM cache that evicts the least recently used generations beyond
+    `max_entries`, with hit/miss counters. It is per process and is lost on restart.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], RETURN_VAL_TYPE]" = OrderedDict()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = (prompt, llm_string)
+        with self._lock:
+            result = self._cache.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self._cache.move_to_end(key)
+                self.hits += 1
+        _count_lookup(hit=result is not None)
+        return result
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = (prompt, llm_string)
+        with self._lock:
+            self._cache[key] = return_val
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    # Nothing here blocks, so the async variants skip the executor BaseCache would use
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.lookup(prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.update(prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any) -> None:
+        self.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "entries": len(self._cache),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+        }
+
+
+def build_llm_cache() -> Optional[BaseCache]:
+    """
+    Creates the LLM cache selected by settings.LLM_CACHE_BACKEND ('sqlite', 'memory' or 'none').
+    """
+    backend = settings.LLM_CACHE_BACKEND.lower()
+    if backend == "sqlite":
+        return SQLiteLLMCache(settings.LLM_CACHE_PATH, settings.LLM_CACHE_MAX_ENTRIES)
+    if backend == "memory":
+        return BoundedInMemoryLLMCache(settings.LLM_CACHE_MAX_ENTRIES)
+    if backend == "none":
+        return None
+    raise ValueError(f"Unsupported LLM cache backend: '{settings.LLM_CACHE_BACKEND}'. Please choose 'sqlite', 'memory' or 'none'.")
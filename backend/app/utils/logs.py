@@ -0,0 +1,175 @@
+"""
+Structured logs of research tasks: one JSON line per record, written by a background thread.
+
+Loggers under `app` hand their records to a queue without formatting them, so logging on the
+event loop never waits on JSON encoding or I/O. A writer thread formats them as flat JSON lines
+('json') or in the layout of OpenTelemetry's JSON export ('otel').
+"""
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Any, Optional
+
+from langgraph.config import get_config
+
+from app.utils.config import settings
+
+# OpenTelemetry severity numbers of the standard levels
+_SEVERITY = {logging.DEBUG: 5, logging.INFO: 9, logging.WARNING: 13, logging.ERROR: 17, logging.CRITICAL: 21}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def current_task_id() -> Optional[str]:
+    """The task (graph thread) being run in this context, or None outside a graph run."""
+    try:
+        return get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        return None
+
+
+class StructuredLogger:
+    """A logger whose records carry fields, and the id of the task they were logged for."""
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+
+    def enabled(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def log(self, level: int, event: str, exc_info: bool = False, **fields: Any):
+        if not self._logger.isEnabledFor(level):
+            return
+        if "task_id" not in fields:
+            fields["task_id"] = current_task_id()
+        self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields: Any):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields: Any):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields: Any):
+        self.log(logging.WARNING, event, **fields)
+
+    def exception(self, event: str, **fields: Any):
+        """Logs an error with the traceback of the exception being handled."""
+        self.log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(name)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One flat JSON object per record: time, level, logger, event and the record's fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["error"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def _trace_id(task_id: Optional[str]) -> Optional[str]:
+    """Task ids are UUIDs, which make valid 128-bit trace ids; other ids are hashed to one."""
+    if not task_id:
+        return None
+    hex_id = str(task_id).replace("-", "")
+    if len(hex_id) == 32 and all(c in "0123456789abcdef" for c in hex_id.lower()):
+        return hex_id.lower()
+    return hashlib.md5(str(task_id).encode("utf-8")).hexdigest()
+
+
+def _span_id(run_id: Optional[str]) -> Optional[str]:
+    """64-bit span ids from run ids. LangChain's run ids are UUIDv7, whose random bits are the last ones."""
+    return str(run_id).replace("-", "")[-16:] if run_id else None
+
+
+class OpenTelemetryFormatter(logging.Formatter):
+    """
+    Spans in the field layout of OpenTelemetry's JSON span export, other records as OpenTelemetry
+    log records. Each line is one span or log record, ready for a collector's file receiver.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = dict(getattr(record, "fields", {}))
+        task_id = fields.pop("task_id", None)
+        if record.getMessage() == "span":
+            start_ns = int(fields.pop("start") * 1e9)
+            end_ns = start_ns + int(fields["duration_ms"] * 1e6)
+            status = fields.pop("status")
+            entry = {
+                "traceId": _trace_id(task_id),
+                "spanId": _span_id(fields.pop("span_id")),
+                "parentSpanId": _span_id(fields.pop("parent_id")),
+                "name": fields.pop("name"),
+                "kind": "SPAN_KIND_CLIENT" if fields.get("kind") in ("llm", "tool") else "SPAN_KIND_INTERNAL",
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(end_ns),
+                "attributes": {"task.id": task_id, **fields},
+                "status": {"code": "STATUS_CODE_OK" if status == "ok" else "STATUS_CODE_ERROR", "message": status},
+            }
+        else:
+            if record.exc_info:
+                fields["exception.stacktrace"] = self.formatException(record.exc_info)
+            entry = {
+                "timeUnixNano": str(int(record.created * 1e9)),
+                "severityNumber": _SEVERITY.get(record.levelno, 9),
+                "severityText": record.levelname,
+                "body": record.getMessage(),
+                "traceId": _trace_id(task_id),
+                "attributes": {"logger": record.name, "task.id": task_id, **fields},
+            }
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they are; the writer thread formats them."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging():
+    """
+    Routes the `app` loggers through a queue to a writer thread, at settings.LOG_LEVEL, to
+    settings.LOG_FILE or stderr. Called once per process; later calls do nothing.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    formats = {"json": JsonLinesFormatter, "otel": OpenTelemetryFormatter}
+    if settings.LOG_FORMAT not in formats:
+        raise ValueError(f"Unsupported log format: '{settings.LOG_FORMAT}'. Please choose 'json' or 'otel'.")
+
+    handler = logging.FileHandler(settings.LOG_FILE) if settings.LOG_FILE else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(formats[settings.LOG_FORMAT]())
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+    logger = logging.getLogger("app")
+    logger.setLevel(settings.LOG_LEVEL.upper())
+    logger.addHandler(_DeferredQueueHandler(records))
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Writes out the records still queued and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,252 @@
+"""
+Prometheus metrics for the research pipeline, served by /metrics in the text exposition format.
+
+Graph nodes, LLM chains, tool calls and chat model calls are measured by a callback handler added
+to every graph run, so nothing is measured, and nothing costs anything, when metrics are disabled.
+"""
+import bisect
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.utils.config import settings
+
+NODE_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+CHAIN_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TOOL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+
+# Run names of the agent chains (see Agents), and the label each is reported under
+CHAIN_LABELS = {
+    "planner_agent": "planner",
+    "tool_router": "router",
+    "decision_agent": "decider",
+    "summarizer_agent": "summarizer",
+    "condenser_agent": "condenser",
+    "reducer_agent": "reducer",
+}
+
+# LangChain's provider names, where they differ from ours. OpenRouter is called through the OpenAI client.
+_PROVIDER_LABELS = {"google_genai": "google", "openai": "openrouter"}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            series = [[list(key), value] for key, value in self._values.items()]
+        return {"type": "counter", "help": self.documentation, "labels": list(self.labelnames), "series": series}
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: the count of each bucket (not cumulative, the last one is +Inf) and the sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(labelvalues, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            series = [[list(key), list(counts), total[0]] for key, (counts, total) in self._series.items()]
+        return {
+            "type": "histogram", "help": self.documentation, "labels": list(self.labelnames),
+            "buckets": list(self.buckets), "series": series,
+        }
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Adds up the counters and histograms of several processes, series by series."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "series": []})
+            if metric.get("buckets") != target.get("buckets"):
+                # A process running a different version; its buckets cannot be added up
+                continue
+            index = {tuple(series[0]): series for series in target["series"]}
+            for series in metric["series"]:
+                existing = index.get(tuple(series[0]))
+                if existing is None:
+                    series = [list(series[0])] + [list(v) if isinstance(v, list) else v for v in series[1:]]
+                    target["series"].append(series)
+                    index[tuple(series[0])] = series
+                elif metric["type"] == "histogram":
+                    existing[1] = [a + b for a, b in zip(existing[1], series[1])]
+                    existing[2] += series[2]
+                else:
+                    existing[1] += series[1]
+    return merged
+
+
+def render(snapshot: Dict[str, Dict[str, Any]]) -> str:
+    """The metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for series in sorted(metric["series"], key=lambda s: s[0]):
+            labels = series[0]
+            if metric["type"] == "histogram":
+                cumulative = 0
+                for bound, count in zip(list(metric["buckets"]) + ["+Inf"], series[1]):
+                    cumulative += count
+                    le = f'le="{bound if bound == "+Inf" else _format_value(bound)}"'
+                    lines.append(f"{name}_bucket{_format_labels(metric['labels'], labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(metric['labels'], labels)} {_format_value(series[2])}")
+                lines.append(f"{name}_count{_format_labels(metric['labels'], labels)} {cumulative}")
+            else:
+                lines.append(f"{name}{_format_labels(metric['labels'], labels)} {_format_value(series[1])}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Times graph nodes, agent chains and tool calls, and counts chat model calls and tokens.
+    A graph node is the chain run whose name is the node that LangGraph puts in its metadata.
+    """
+    run_inline = True
+
+    def __init__(self, metrics: "ResearchMetrics"):
+        self._metrics = metrics
+        self._timers: Dict[UUID, Tuple[Histogram, str, float]] = {}
+        self._providers: Dict[UUID, str] = {}
+
+    def _start(self, run_id: UUID, histogram: Histogram, label: str):
+        self._timers[run_id] = (histogram, label, time.perf_counter())
+
+    def _finish(self, run_id: UUID, status: str):
+        timer = self._timers.pop(run_id, None)
+        if timer is not None:
+            histogram, label, started = timer
+            histogram.observe(time.perf_counter() - started, label, status)
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata: Optional[Dict[str, Any]] = None,
+                       **kwargs: Any):
+        name = kwargs.get("name")
+        if name in CHAIN_LABELS:
+            self._start(run_id, self._metrics.chain_seconds, CHAIN_LABELS[name])
+        elif metadata and name is not None and name == metadata.get("langgraph_node"):
+            self._start(run_id, self._metrics.node_seconds, name)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, "ok")
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        # The approval step pauses the graph by raising GraphInterrupt
+        self._finish(run_id, "interrupted" if type(error).__name__ == "GraphInterrupt" else "error")
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs: Any):
+        name = kwargs.get("name") or (serialized or {}).get("name", "unknown")
+        self._start(run_id, self._metrics.tool_seconds, name)
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, "error")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        provider = (metadata or {}).get("ls_provider", "unknown")
+        self._providers[run_id] = _PROVIDER_LABELS.get(provider, provider)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        provider = self._providers.pop(run_id, "unknown")
+        self._metrics.llm_requests.inc(provider, "ok")
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self._metrics.llm_tokens.inc(provider, "input", amount=usage.get("input_tokens", 0))
+                    self._metrics.llm_tokens.inc(provider, "output", amount=usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._metrics.llm_requests.inc(self._providers.pop(run_id, "unknown"), "error")
+
+
+class ResearchMetrics:
+    """The metrics of one process. Worker processes send snapshots of theirs to the API to be added up."""
+
+    def __init__(self):
+        self.node_seconds = Histogram(
+            "deepresearch_node_duration_seconds", "Time spent in each graph node.", ["node", "status"], NODE_BUCKETS)
+        self.chain_seconds = Histogram(
+            "deepresearch_llm_chain_duration_seconds", "Time taken by each agent chain call.",
+            ["chain", "status"], CHAIN_BUCKETS)
+        self.tool_seconds = Histogram(
+            "deepresearch_tool_duration_seconds", "Time taken by each research tool call, cache hits included.",
+            ["tool", "status"], TOOL_BUCKETS)
+        self.llm_requests = Counter(
+            "deepresearch_llm_requests_total", "Chat model calls per provider.", ["provider", "status"])
+        self.llm_tokens = Counter(
+            "deepresearch_llm_tokens_total", "Tokens per provider, as reported by the provider.", ["provider", "type"])
+        self.cache_lookups = Counter(
+            "deepresearch_cache_lookups_total", "Lookups in the LLM response cache, the tool result cache (per tool) and the findings index.",
+            ["cache", "result"])
+        self.callback = MetricsCallbackHandler(self)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        metrics = (self.node_seconds, self.chain_seconds, self.tool_seconds,
+                   self.llm_requests, self.llm_tokens, self.cache_lookups)
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def render(self, other_processes: Iterable[Dict[str, Dict[str, Any]]] = (),
+               gauges: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """This process's metrics plus those of `other_processes`, the cache hit ratios, and `gauges`."""
+        merged = merge_snapshots([self.snapshot(), *other_processes])
+        lookups: Dict[str, Dict[str, float]] = {}
+        for (cache, result), count in merged[self.cache_lookups.name]["series"]:
+            lookups.setdefault(cache, {})[result] = count
+        merged["deepresearch_cache_hit_ratio"] = {
+            "type": "gauge", "help": "Share of cache lookups that were hits.", "labels": ["cache"],
+            "series": [[[cache], counts.get("hit", 0) / sum(counts.values())] for cache, counts in lookups.items()],
+        }
+        merged.update(gauges or {})
+        return render(merged)
+
+
+def gauge(documentation: str, labelnames: Sequence[str], values: Dict[Tuple[str, ...], float]) -> Dict[str, Any]:
+    """A gauge read at scrape time, in the snapshot format `render` takes."""
+    return {"type": "gauge", "help": documentation, "labels": list(labelnames),
+            "series": [[list(key), value] for key, value in values.items()]}
+
+
+metrics: Optional[ResearchMetrics] = ResearchMetrics() if settings.METRICS_ENABLED else None
@@ -0,0 +1,195 @@
+"""
+Timeouts, hedged requests, retries and circuit breakers for calls to external services.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit breaker is open."""
+
+
+@dataclass
+class CallPolicy:
+    """How one service is called. A hedge_percentile of 0 disables hedging."""
+    timeout: float
+    deadline: float
+    retries: int = 1
+    backoff: float = 0.5
+    hedge_percentile: float = 0.0
+    hedge_min_samples: int = 20
+    breaker_failures: int = 5
+    breaker_reset_seconds: float = 30.0
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls and rejects calls while open.
+    After `reset_seconds` it lets a single trial call through (half-open): success closes it,
+    failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release(self):
+        """Frees the half-open trial of a call that was cancelled, so the next call can be the trial."""
+        self._trial_in_flight = False
+
+
+def _retryable(error: BaseException) -> bool:
+    """Client errors other than timeouts and rate limits will fail again, so they are not retried."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status in (408, 429)
+    return True
+
+
+class ResilientCaller:
+    """
+    Wraps calls to one service with a per-attempt timeout, an overall deadline, retries
+    with jittered exponential backoff, an optional hedged second request and a circuit breaker.
+
+    The hedge is sent when the first request is slower than the `hedge_percentile` of recent
+    successful calls; whichever answers first wins and the other is cancelled.
+    """
+
+    def __init__(self, name: str, policy: CallPolicy):
+        self.name = name
+        self.policy = policy
+        self.breaker = CircuitBreaker(policy.breaker_failures, policy.breaker_reset_seconds)
+        self._latencies: deque = deque(maxlen=500)
+        self.counters = {
+            "calls": 0, "successes": 0, "failures": 0, "timeouts": 0, "errors": 0,
+            "retries": 0, "hedges": 0, "hedge_wins": 0, "short_circuits": 0,
+        }
+
+    def _percentile(self, pct: float) -> Optional[float]:
+        if len(self._latencies) < self.policy.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    async def _attempt(self, fetch: Callable[[], Awaitable[T]], timeout: float) -> T:
+        """One attempt, possibly hedged. Raises asyncio.TimeoutError when nothing answered in time."""
+        hedge_after = self._percentile(self.policy.hedge_percentile) if self.policy.hedge_percentile else None
+        tasks = [asyncio.ensure_future(fetch())]
+        started = time.monotonic()
+        try:
+            if hedge_after is not None and hedge_after < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    self.counters["hedges"] += 1
+                    tasks.append(asyncio.ensure_future(fetch()))
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.counters["hedge_wins"] += 1
+                        self._latencies.append(time.monotonic() - started)
+                        return task.result()
+                    error = error or task.exception()
+            if error is not None and not pending:
+                raise error
+            raise asyncio.TimeoutError(f"{self.name} did not answer within {timeout:.1f}s")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, fetch: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs `fetch` under the policy. Raises CircuitOpenError without calling it while the
+        breaker is open, or the last error once retries or the deadline are exhausted.
+        """
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["short_circuits"] += 1
+            raise CircuitOpenError(f"{self.name} is temporarily unavailable (circuit open)")
+
+        try:
+            return await self._call(fetch)
+        except asyncio.CancelledError:
+            # A cancelled caller says nothing about the service, but must not keep the trial forever
+            self.breaker.release()
+            raise
+
+    async def _call(self, fetch: Callable[[], Awaitable[T]]) -> T:
+        deadline = time.monotonic() + self.policy.deadline
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                result = await self._attempt(fetch, min(self.policy.timeout, remaining))
+            except Exception as e:
+                self.counters["timeouts" if isinstance(e, asyncio.TimeoutError) else "errors"] += 1
+                # Full jitter keeps tasks that failed together from retrying together
+                backoff = random.uniform(0, self.policy.backoff * 2 ** attempt)
+                out_of_time = deadline - time.monotonic() - backoff <= 0
+                if attempt >= self.policy.retries or out_of_time or not _retryable(e):
+                    self.counters["failures"] += 1
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                self.counters["retries"] += 1
+                await asyncio.sleep(backoff)
+                continue
+            self.counters["successes"] += 1
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self._percentile(50), self._percentile(95)
+        return {
+            "breaker": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+            **self.counters,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
@@ -0,0 +1,265 @@
+"""
+Bounded store for the final states of completed research tasks.
+"""
+import asyncio
+import gzip
+import heapq
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.utils.config import settings
+
+
+@dataclass
+class _IndexEntry:
+    """What the store keeps in memory for every task, hot or spilled."""
+    stored_at: float
+    size: int = 0
+    in_memory: bool = False
+    # Whether the file holds this result, so spilling it again needs no write
+    on_disk: bool = False
+
+
+class ResultStore:
+    """
+    A dict-like store of final task states with a memory budget.
+
+    Results are kept in memory up to `memory_budget_bytes` (measured as their JSON size).
+    Least recently used results beyond the budget are spilled to gzip-compressed JSON files
+    in `directory` and paged back in when read. Results older than `ttl_seconds` are deleted.
+    With `write_through`, every result is also written to disk as soon as it is stored, so
+    other processes sharing the directory can read it.
+
+    The lock only guards the in-memory bookkeeping: encoding, compression and file I/O happen
+    outside it, so reading a result in memory never waits for another one's disk work.
+    Async code uses `aset` and `aget`, which do that work in a thread.
+    """
+
+    def __init__(self, directory: str, memory_budget_bytes: int, ttl_seconds: int, write_through: bool = False):
+        self.directory = directory
+        self.memory_budget_bytes = memory_budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self.write_through = write_through
+        self._hot: "OrderedDict[str, Any]" = OrderedDict()
+        self._hot_bytes = 0
+        self._index: Dict[str, _IndexEntry] = {}
+        # (stored_at, task_id) of every stored or paged-in result, oldest first, for expiry
+        self._expiry: List[Tuple[float, str]] = []
+        # Results picked to be spilled whose files are being written
+        self._spilling: Set[str] = set()
+        self._lock = threading.Lock()
+        self.spills = 0
+        self.page_ins = 0
+        os.makedirs(directory, exist_ok=True)
+        # Drop results left behind by earlier runs that are already past their TTL
+        for name in os.listdir(directory):
+            if name.endswith(".json.gz") and not self._fresh_on_disk(name[:-len(".json.gz")]):
+                os.remove(os.path.join(directory, name))
+
+    def _path(self, task_id: str) -> str:
+        # Task ids are generated uuids, but never let one escape the directory
+        return os.path.join(self.directory, f"{os.path.basename(task_id)}.json.gz")
+
+    def _write(self, task_id: str, encoded: bytes):
+        path = self._path(task_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(gzip.compress(encoded, compresslevel=5))
+        os.replace(tmp_path, path)
+
+    def _remove(self, task_id: str):
+        try:
+            os.remove(self._path(task_id))
+        except FileNotFoundError:
+            pass
+
+    def _fresh_on_disk(self, task_id: str) -> bool:
+        try:
+            return os.path.getmtime(self._path(task_id)) >= time.time() - self.ttl_seconds
+        except FileNotFoundError:
+            return False
+
+    def _read(self, task_id: str) -> Optional[Tuple[Any, int, float]]:
+        """Returns the stored value, its JSON size and when it was written, or None when there is no file."""
+        try:
+            with open(self._path(task_id), "rb") as f:
+                written_at = os.fstat(f.fileno()).st_mtime
+                encoded = gzip.decompress(f.read())
+        except FileNotFoundError:
+            return None
+        return json.loads(encoded), len(encoded), written_at
+
+    # --- In-memory bookkeeping, always under the lock ---
+
+    def _track(self, task_id: str, stored_at: float) -> _IndexEntry:
+        heapq.heappush(self._expiry, (stored_at, task_id))
+        return _IndexEntry(stored_at=stored_at)
+
+    def _forget(self, task_id: str):
+        entry = self._index.pop(task_id, None)
+        if entry and entry.in_memory:
+            self._hot.pop(task_id, None)
+            self._hot_bytes -= entry.size
+
+    def _pop_expired(self) -> List[str]:
+        """Forgets the results past their TTL and returns their ids, for their files to be removed."""
+        cutoff = time.time() - self.ttl_seconds
+        expired = []
+        while self._expiry and self._expiry[0][0] < cutoff:
+            stored_at, task_id = heapq.heappop(self._expiry)
+            entry = self._index.get(task_id)
+            # Results stored again since have a later heap entry of their own
+            if entry is not None and entry.stored_at == stored_at:
+                self._forget(task_id)
+                expired.append(task_id)
+        return expired
+
+    def _pick_spills(self) -> List[Tuple[str, _IndexEntry, Any]]:
+        """The least recently used results to move to disk to get back within the memory budget."""
+        picked, hot_bytes, hot_count = [], self._hot_bytes, len(self._hot)
+        for task_id, value in self._hot.items():
+            if hot_bytes <= self.memory_budget_bytes or hot_count <= 1:
+                break
+            entry = self._index[task_id]
+            hot_bytes -= entry.size
+            hot_count -= 1
+            if task_id not in self._spilling:
+                self._spilling.add(task_id)
+                picked.append((task_id, entry, value))
+        return picked
+
+    # --- Disk work, outside the lock ---
+
+    def _spill(self, picked: List[Tuple[str, _IndexEntry, Any]]):
+        """Writes the picked results that are not on disk yet, then drops them from memory."""
+        try:
+            for task_id, entry, value in picked:
+                if not entry.on_disk:
+                    self._write(task_id, json.dumps(value, default=str).encode("utf-8"))
+                    entry.on_disk = True
+        finally:
+            with self._lock:
+                for task_id, entry, _ in picked:
+                    self._spilling.discard(task_id)
+                    # Skipped when the result was stored again or deleted meanwhile
+                    if entry.on_disk and entry.in_memory and self._index.get(task_id) is entry:
+                        self._hot.pop(task_id, None)
+                        entry.in_memory = False
+                        self._hot_bytes -= entry.size
+                        self.spills += 1
+
+    def _cleanup(self, picked: List[Tuple[str, _IndexEntry, Any]], expired: List[str]):
+        self._spill(picked)
+        for task_id in expired:
+            self._remove(task_id)
+
+    def __setitem__(self, task_id: str, value: Any):
+        encoded = json.dumps(value, default=str).encode("utf-8")
+        # Keep the JSON round-tripped copy, so hot and paged-in results look the same
+        decoded = json.loads(encoded)
+        if self.write_through:
+            self._write(task_id, encoded)
+        else:
+            # A file left from an earlier result of the task would be paged in instead of this one
+            self._remove(task_id)
+        with self._lock:
+            self._forget(task_id)
+            entry = self._index[task_id] = self._track(task_id, time.time())
+            entry.size, entry.in_memory, entry.on_disk = len(encoded), True, self.write_through
+            self._hot[task_id] = decoded
+            self._hot_bytes += entry.size
+            picked, expired = self._pick_spills(), self._pop_expired()
+        self._cleanup(picked, expired)
+
+    def _entry(self, task_id: str) -> Tuple[Optional[_IndexEntry], bool]:
+        """The task's entry, and whether it had expired, in which case it is forgotten and None returned."""
+        entry = self._index.get(task_id)
+        if entry is not None and entry.stored_at < time.time() - self.ttl_seconds:
+            self._forget(task_id)
+            return None, True
+        return entry, False
+
+    def get(self, task_id: str, default: Any = None) -> Any:
+        with self._lock:
+            entry, expired = self._entry(task_id)
+            if entry is not None and entry.in_memory:
+                self._hot.move_to_end(task_id)
+                return self._hot[task_id]
+        if expired:
+            self._remove(task_id)
+            return default
+
+        # Spilled, or written by another process sharing the directory
+        if entry is None and not self._fresh_on_disk(task_id):
+            return default
+        loaded = self._read(task_id)
+        if loaded is None:
+            return default
+        value, size, written_at = loaded
+        with self._lock:
+            entry, expired = self._entry(task_id)
+            if expired:
+                return default
+            if entry is not None and entry.in_memory:
+                # Stored again or paged in by another thread while this one was reading
+                self._hot.move_to_end(task_id)
+                return self._hot[task_id]
+            if entry is None:
+                # Its TTL runs from when it was written, not from when this process first read it
+                entry = self._index[task_id] = self._track(task_id, written_at)
+            entry.size, entry.in_memory, entry.on_disk = size, True, True
+            self._hot[task_id] = value
+            self._hot_bytes += size
+            self.page_ins += 1
+            picked = self._pick_spills()
+        self._spill(picked)
+        return value
+
+    async def aset(self, task_id: str, value: Any):
+        await asyncio.to_thread(self.__setitem__, task_id, value)
+
+    async def aget(self, task_id: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._index.get(task_id)
+            if entry is not None and entry.in_memory and entry.stored_at >= time.time() - self.ttl_seconds:
+                self._hot.move_to_end(task_id)
+                return self._hot[task_id]
+        return await asyncio.to_thread(self.get, task_id, default)
+
+    def __getitem__(self, task_id: str) -> Any:
+        value = self.get(task_id)
+        if value is None:
+            raise KeyError(task_id)
+        return value
+
+    def __contains__(self, task_id: str) -> bool:
+        with self._lock:
+            entry = self._index.get(task_id)
+            if entry is not None:
+                return entry.stored_at >= time.time() - self.ttl_seconds
+        return self._fresh_on_disk(task_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tasks": len(self._index),
+                "in_memory": len(self._hot),
+                "in_memory_bytes": self._hot_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "spills": self.spills,
+                "page_ins": self.page_ins,
+            }
+
+
+final_results = ResultStore(
+    settings.RESULT_STORE_DIR,
+    memory_budget_bytes=settings.RESULT_STORE_MEMORY_BUDGET_MB * 1024 * 1024,
+    ttl_seconds=settings.RESULT_STORE_TTL_SECONDS,
+    # Worker processes store results that the API process serves
+    write_through=settings.EXECUTION_MODE == "queue",
+)
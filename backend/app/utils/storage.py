@@ -0,0 +1,22 @@
+"""
+Helpers for the small SQLite stores the backend keeps on local disk.
+"""
+import os
+import sqlite3
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Opens a SQLite connection suited to a store shared by threads and worker processes.
+    WAL mode lets readers run alongside a writer, and synchronous=NORMAL skips the
+    fsync on every commit, which is safe under WAL.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # isolation_level=None puts the connection in autocommit mode; callers open
+    # explicit transactions when they need several statements to be atomic.
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,138 @@
+"""
+Persistent cache for research tool results.
+"""
+import hashlib
+import json
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from app.utils.config import settings
+from app.utils.storage import connect_sqlite
+
+
+class CachedDocuments(Sequence):
+    """
+    A list of Documents read back from the cache.
+    The payload is only decompressed and turned into Document objects when first accessed.
+    """
+
+    def __init__(self, payload: bytes):
+        self._payload = payload
+        self._documents: Optional[List[Document]] = None
+
+    def _load(self) -> List[Document]:
+        if self._documents is None:
+            rows = json.loads(zlib.decompress(self._payload))
+            self._documents = [Document(page_content=content, metadata=metadata) for content, metadata in rows]
+        return self._documents
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+
+def serialize_documents(documents: Sequence[Document]) -> bytes:
+    """Packs documents as compressed JSON pairs of (page_content, metadata)."""
+    rows = [[doc.page_content, doc.metadata] for doc in documents]
+    # default=str covers metadata such as the datetime.date ArXiv puts in 'Published'
+    return zlib.compress(json.dumps(rows, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+class ToolResultCache:
+    """
+    A SQLite-backed cache of tool results with per-tool TTLs and LRU eviction.
+    Entries are keyed on the tool name, the normalized query and the tool parameters.
+    """
+
+    def __init__(self, path: str, ttls: Dict[str, int], max_entries: int):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            " key TEXT PRIMARY KEY, tool TEXT NOT NULL, payload BLOB NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tool_cache_accessed ON tool_cache (accessed_at)")
+
+    @staticmethod
+    def make_key(tool_name: str, query: str, params: Dict[str, Any]) -> str:
+        normalized_query = " ".join(query.lower().split())
+        raw = json.dumps([tool_name, normalized_query, params], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, tool_name: str, query: str, params: Dict[str, Any]) -> Optional[CachedDocuments]:
+        key = self.make_key(tool_name, query, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM tool_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses[tool_name] += 1
+                return None
+            payload, created_at = row
+            if now - created_at > self.ttls.get(tool_name, 0):
+                self._conn.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+                self.misses[tool_name] += 1
+                return None
+            self._conn.execute("UPDATE tool_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits[tool_name] += 1
+        return CachedDocuments(payload)
+
+    def put(self, tool_name: str, query: str, params: Dict[str, Any], documents: Sequence[Document]):
+        if self.ttls.get(tool_name, 0) <= 0:
+            return
+        key = self.make_key(tool_name, query, params)
+        payload = serialize_documents(documents)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, tool, payload, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, tool_name, payload, now, now),
+            )
+            # Keep only the most recently used entries
+            self._conn.execute(
+                "DELETE FROM tool_cache WHERE key IN ("
+                " SELECT key FROM tool_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM tool_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM tool_cache").fetchone()[0]
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+tool_cache: Optional[ToolResultCache] = None
+if settings.TOOL_CACHE_ENABLED:
+    tool_cache = ToolResultCache(
+        settings.TOOL_CACHE_PATH,
+        ttls={
+            "web_search": settings.TOOL_CACHE_TTL_WEB_SEARCH,
+            "arxiv_search": settings.TOOL_CACHE_TTL_ARXIV_SEARCH,
+            "wikipedia_search": settings.TOOL_CACHE_TTL_WIKIPEDIA_SEARCH,
+        },
+        max_entries=settings.TOOL_CACHE_MAX_ENTRIES,
+    )
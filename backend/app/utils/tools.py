@@ -1,92 +1,204 @@
 from langchain.tools import tool
 from langchain_core.utils.function_calling import convert_to_openai_tool
-from langchain_community.document_loaders import WikipediaLoader, ArxivLoader
-from langchain_tavily import TavilySearch
 from langchain_core.documents import Document # Import the Document class
-from typing import List
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
 
+import asyncio
+import functools
 import json
+import xml.etree.ElementTree as ET
+from app.utils.admission import tool_rate_limiters
+from app.utils.cassettes import cassettes
 from app.utils.config import settings
+from app.utils.http import get_async_client
+from app.utils.logs import get_logger
+from app.utils.metrics import metrics
+from app.utils.resilience import CallPolicy, CircuitOpenError, ResilientCaller
+from app.utils.tool_cache import tool_cache
+
+log = get_logger(__name__)
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+
+def _atom_text(entry: ET.Element, tag: str) -> str:
+    """Text of an Atom child element, with ArXiv's hard line wraps collapsed."""
+    return " ".join((entry.findtext(f"{_ATOM}{tag}") or "").split())
+
+def _policy(timeout: float, hedge: bool) -> CallPolicy:
+    return CallPolicy(
+        timeout=timeout,
+        deadline=settings.TOOL_DEADLINE_SECONDS,
+        retries=settings.TOOL_RETRIES,
+        backoff=settings.TOOL_RETRY_BACKOFF_SECONDS,
+        hedge_percentile=settings.TOOL_HEDGE_PERCENTILE if hedge else 0.0,
+        breaker_failures=settings.TOOL_BREAKER_FAILURES,
+        breaker_reset_seconds=settings.TOOL_BREAKER_RESET_SECONDS,
+    )
+
+# One caller per tool, shared by every task in the process, so a failing upstream trips one breaker.
+# Tavily bills every request, so web searches are never hedged.
+tool_callers = {
+    "web_search": ResilientCaller("web_search", _policy(settings.TOOL_TIMEOUT_WEB_SEARCH, hedge=False)),
+    "arxiv_search": ResilientCaller("arxiv_search", _policy(settings.TOOL_TIMEOUT_ARXIV_SEARCH, hedge=True)),
+    "wikipedia_search": ResilientCaller("wikipedia_search", _policy(settings.TOOL_TIMEOUT_WIKIPEDIA_SEARCH, hedge=True)),
+}
+
+async def _cached_search(
+    tool_name: str,
+    query: str,
+    params: Dict[str, Any],
+    fetch: Callable[[], Awaitable[Sequence[Document]]],
+) -> Sequence[Document]:
+    """
+    Serves a tool call from the tool result cache, or runs `fetch` under the tool's rate limit,
+    timeouts, retries and circuit breaker and stores its result. While the breaker is open, the call
+    fails fast with a 'No results' document. Other errors propagate, so failed searches are never cached.
+    """
+    if tool_cache is not None:
+        cached = await asyncio.to_thread(tool_cache.get, tool_name, query, params)
+        if metrics is not None:
+            metrics.cache_lookups.inc(tool_name, "hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
+
+    # Cache hits cost the upstream nothing, so only misses wait for the rate limiter
+    rate_limiter = tool_rate_limiters.get(tool_name)
+    if rate_limiter is not None:
+        await rate_limiter.aacquire()
+    try:
+        documents = await tool_callers[tool_name].call(fetch)
+    except CircuitOpenError as e:
+        log.warning("tool_short_circuited", tool=tool_name, error=str(e))
+        return [Document(page_content=f"No results were found: {e}.")]
+
+    if tool_cache is not None:
+        await asyncio.to_thread(tool_cache.put, tool_name, query, params, documents)
+    return documents
+
+async def _call_tool(
+    tool_name: str,
+    query: str,
+    params: Dict[str, Any],
+    fetch: Callable[[], Awaitable[Sequence[Document]]],
+) -> Sequence[Document]:
+    """A tool call, through the cassettes when calls are being recorded or replayed."""
+    if cassettes is None:
+        return await _cached_search(tool_name, query, params, fetch)
+    # Recorded around the cache, so a replay serves what the task was served
+    return await cassettes.call("tool", tool_name, {"query": query, **params},
+                                lambda: _cached_search(tool_name, query, params, fetch))
 
-# --- Instantiate Tavily Tool ---
-tavily_search_instance = TavilySearch(
-    max_results=3,
-    tavily_api_key=settings.TAVILY_API_KEY
-)
 @tool
-def web_search(query: str) -> List[Document]:
+async def web_search(query: str) -> List[Document]:
     """
     Performs a web search using Tavily.
-    This is an instrumented version for deep debugging.
     """
-    print("\n--- ENTERING web_search TOOL ---")
-    try:
-        print("1. Initializing TavilySearch...")
-        tavily_tool = TavilySearch(
-            max_results=3,
-            tavily_api_key=settings.TAVILY_API_KEY
+    async def fetch() -> List[Document]:
+        # Shared, keep-alive client: no new TCP/TLS handshake per question
+        response = await get_async_client().post(
+            f"{settings.TAVILY_BASE_URL}/search",
+            json={"query": query, "max_results": 3},
+            headers={"Authorization": f"Bearer {settings.TAVILY_API_KEY}"},
         )
-        print(f"2. TavilySearch initialized. Invoking with query: '{query}'")
-        dict_result = tavily_tool.invoke({"query": query})
-        
-        print("3. Invoke successful. Raw result received.")
-        # To avoid printing huge results, we'll just print the type and keys
-        print(f"   - Type of result: {type(dict_result)}")
-        if isinstance(dict_result, dict):
-            print(f"   - Keys found: {dict_result.keys()}")
-
-        results_list = dict_result.get("results", [])
-        
-        print(f"4. Extracted {len(results_list)} articles from the 'results' key.")
+        response.raise_for_status()
+        results_list = response.json().get("results", [])
         if not results_list:
-            print("5. No results found. Returning 'No results' document.")
             return [Document(page_content="No results were found for this search query.")]
 
-        print("6. Processing results into Document objects.")
-        documents = [
+        return [
             Document(
                 page_content=res.get("content", ""),
                 metadata={"source": res.get("url", "N/A")}
             )
             for res in results_list
         ]
-        print("7. Finished processing. Returning documents.")
-        return documents
 
+    try:
+        return await _call_tool("web_search", query, {"max_results": 3}, fetch)
     except Exception as e:
-        print(f"\n--- FATAL ERROR in web_search: {e} ---\n")
-        import traceback
-        traceback.print_exc()
+        log.exception("tool_failed", tool="web_search", error=str(e))
         return [Document(page_content=f"An error occurred during web search: {e}")]
 
 @tool
-def arxiv_search(query: str) -> List[Document]:
+async def arxiv_search(query: str) -> List[Document]:
     """
     Searches the ArXiv repository for academic papers.
     Returns a list of documents with summaries and source metadata.
     """
+    async def fetch() -> List[Document]:
+        # ArXiv's Atom API, the same search the ArxivLoader runs, over the shared client
+        response = await get_async_client().get(
+            settings.ARXIV_API_URL,
+            params={"search_query": query[:300], "start": 0, "max_results": 2},
+        )
+        response.raise_for_status()
+        root = ET.fromstring(response.content)
+        documents = []
+        for entry in root.iter(f"{_ATOM}entry"):
+            # Same metadata keys as ArxivLoader.get_summaries_as_docs
+            documents.append(Document(
+                page_content=_atom_text(entry, "summary"),
+                metadata={
+                    "Entry ID": _atom_text(entry, "id"),
+                    "Published": _atom_text(entry, "updated")[:10],
+                    "Title": _atom_text(entry, "title"),
+                    "Authors": ", ".join(a.findtext(f"{_ATOM}name") or "" for a in entry.findall(f"{_ATOM}author")),
+                },
+            ))
+        return documents or [Document(page_content="No results were found for this search query.")]
+
     try:
-        loader = ArxivLoader(query=query, load_max_docs=2)
-        documents = loader.get_summaries_as_docs()
-        # The loader already returns Document objects with metadata
-        return documents
+        return await _call_tool("arxiv_search", query, {"load_max_docs": 2}, fetch)
     except Exception as e:
+        log.exception("tool_failed", tool="arxiv_search", error=str(e))
         return [Document(page_content=f"An error occurred during ArXiv search: {e}")]
 
 @tool
-def wikipedia_search(query: str) -> List[Document]:
+async def wikipedia_search(query: str) -> List[Document]:
     """
     Searches Wikipedia for articles.
     Returns a list of documents with content and source metadata.
     """
+    async def fetch() -> List[Document]:
+        # One MediaWiki API call searches and returns the top article's plain text
+        response = await get_async_client().get(
+            settings.WIKIPEDIA_API_URL,
+            params={
+                "action": "query", "format": "json", "formatversion": 2,
+                "generator": "search", "gsrsearch": query, "gsrlimit": 1,
+                "prop": "extracts|info", "explaintext": 1, "inprop": "url",
+            },
+        )
+        response.raise_for_status()
+        pages = response.json().get("query", {}).get("pages", [])
+        if not pages:
+            return [Document(page_content="No results were found for this search query.")]
+        # Same shape as WikipediaLoader: content capped at 4000 characters, summary is the lead paragraph
+        return [
+            Document(
+                page_content=page.get("extract", "")[:4000],
+                metadata={
+                    "title": page.get("title", ""),
+                    "summary": page.get("extract", "").split("\n", 1)[0],
+                    "source": page.get("fullurl", ""),
+                },
+            )
+            for page in pages
+        ]
+
     try:
-        loader = WikipediaLoader(query=query, load_max_docs=1, doc_content_chars_max=4000)
-        # The loader already returns Document objects with metadata
-        return loader.load()
+        return await _call_tool(
+            "wikipedia_search", query, {"load_max_docs": 1, "doc_content_chars_max": 4000}, fetch
+        )
     except Exception as e:
+        log.exception("tool_failed", tool="wikipedia_search", error=str(e))
         return [Document(page_content=f"An error occurred during Wikipedia search: {e}")]
 
 # --- Update Tool Lists ---
 available_tools = [web_search, arxiv_search, wikipedia_search]
 
-converted_tools = [convert_to_openai_tool(t) for t in available_tools]
\ No newline at end of file
+
+@functools.lru_cache(maxsize=None)
+def get_converted_tools() -> List[Dict[str, Any]]:
+    """The tools in OpenAI function format, converted once on first use."""
+    return [convert_to_openai_tool(t) for t in available_tools]
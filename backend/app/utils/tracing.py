@@ -0,0 +1,183 @@
+"""
+Langfuse tracing, span logs and metrics for graph runs.
+"""
+import functools
+import logging
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.utils.config import settings
+from app.utils.logs import get_logger
+from app.utils.metrics import CHAIN_LABELS, metrics
+
+
+@functools.lru_cache(maxsize=None)
+def get_langfuse_handler():
+    """
+    The Langfuse callback handler shared by every task in the process. It is created on
+    first use because importing langfuse takes most of a second of startup.
+    """
+    from langfuse.langchain import CallbackHandler
+    return CallbackHandler()
+
+
+def _payload_chars(value: Any, max_items: int = 2000) -> int:
+    """
+    The approximate size of a payload: the length of the text in it (strings, message contents
+    and document contents), looking at no more than `max_items` values so large states stay cheap.
+    """
+    total, seen, stack = 0, 0, [value]
+    while stack and seen < max_items:
+        item = stack.pop()
+        seen += 1
+        if isinstance(item, str):
+            total += len(item)
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        else:
+            text = getattr(item, "page_content", None) or getattr(item, "content", None)
+            if isinstance(text, (str, list)):
+                stack.append(text)
+    return total
+
+
+def _preview(value: Any) -> str:
+    text = str(value)
+    limit = settings.TRACE_PAYLOAD_MAX_CHARS
+    return text if len(text) <= limit else text[:limit] + " …[truncated]"
+
+
+class SpanLogger(BaseCallbackHandler):
+    """
+    Logs a span for each graph node, agent chain, chat model call and tool call of a sampled task:
+    its name, parent, duration, status and payload sizes. At DEBUG level spans also carry the
+    (truncated) inputs and outputs. Other runs, such as prompt templates, are not logged; a span's
+    parent is its closest logged ancestor.
+    """
+    run_inline = True
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+        self._log = get_logger("app.spans")
+        self._spans: Dict[UUID, Dict[str, Any]] = {}
+        # Runs that are not logged, mapped to their closest logged ancestor
+        self._ancestors: Dict[UUID, Optional[UUID]] = {}
+
+    def _sampled(self, task_id: Optional[str]) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        # By task, so a sampled task is logged whole
+        return zlib.crc32(str(task_id).encode("utf-8")) % 10_000 < self.sample_rate * 10_000
+
+    def _ancestor(self, parent_run_id: Optional[UUID]) -> Optional[UUID]:
+        if parent_run_id is None or parent_run_id in self._spans:
+            return parent_run_id
+        return self._ancestors.get(parent_run_id)
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], metadata: Optional[Dict[str, Any]],
+               name: str, kind: str, payload: Any, **attributes: Any):
+        task_id = (metadata or {}).get("thread_id")
+        if not self._sampled(task_id):
+            return
+        parent = self._ancestor(parent_run_id)
+        span = {
+            "task_id": task_id,
+            "name": name,
+            "kind": kind,
+            "span_id": str(run_id),
+            "parent_id": str(parent) if parent else None,
+            "start": time.time(),
+            "input_chars": _payload_chars(payload),
+            **attributes,
+        }
+        if self._log.enabled(logging.DEBUG):
+            span["input"] = _preview(payload)
+        span["_started"] = time.perf_counter()
+        self._spans[run_id] = span
+
+    def _end(self, run_id: UUID, status: str, output: Any = None, error: Optional[BaseException] = None,
+             **attributes: Any):
+        self._ancestors.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        span["duration_ms"] = round((time.perf_counter() - span.pop("_started")) * 1000, 2)
+        span["status"] = status
+        span["output_chars"] = _payload_chars(output)
+        if error is not None:
+            span["error"] = f"{type(error).__name__}: {error}"
+        elif self._log.enabled(logging.DEBUG):
+            span["output"] = _preview(output)
+        span.update(attributes)
+        self._log.info("span", **span)
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                       metadata: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        name = kwargs.get("name")
+        if name in CHAIN_LABELS:
+            self._start(run_id, parent_run_id, metadata, CHAIN_LABELS[name], "chain", inputs)
+        elif metadata and name is not None and name == metadata.get("langgraph_node"):
+            self._start(run_id, parent_run_id, metadata, name, "node", inputs)
+        else:
+            self._ancestors[run_id] = self._ancestor(parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, "ok", outputs)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        if type(error).__name__ == "GraphInterrupt":
+            self._end(run_id, "interrupted")
+        else:
+            self._end(run_id, "error", error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                      metadata: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._start(run_id, parent_run_id, metadata, name, "tool", input_str)
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs: Any):
+        documents = output if isinstance(output, list) else None
+        self._end(run_id, "ok", output, results=len(documents) if documents is not None else None)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, "error", error=error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        metadata = metadata or {}
+        self._start(run_id, parent_run_id, metadata, "chat_model", "llm", messages,
+                    provider=metadata.get("ls_provider"), model=metadata.get("ls_model_name"))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        texts = [generation.text for generations in response.generations for generation in generations]
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        self._end(run_id, "ok", texts, input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, "error", error=error)
+
+
+# Spans are logged at INFO level, so none are collected when the level is above it or sampling is off
+span_logger: Optional[SpanLogger] = None
+if settings.TRACE_SAMPLE_RATE > 0 and logging.getLevelName(settings.LOG_LEVEL.upper()) <= logging.INFO:
+    span_logger = SpanLogger(settings.TRACE_SAMPLE_RATE)
+
+
+def get_run_callbacks() -> List[BaseCallbackHandler]:
+    """The callbacks of a graph run: Langfuse tracing, plus span logs and metrics when they are enabled."""
+    callbacks = [get_langfuse_handler()]
+    if span_logger is not None:
+        callbacks.append(span_logger)
+    if metrics is not None:
+        callbacks.append(metrics.callback)
+    return callbacks
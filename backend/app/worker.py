@@ -0,0 +1,250 @@
+"""
+Research workers: processes that take resume jobs from the job queue and run the graph.
+
+Started by the API in queue mode (EXECUTION_MODE=queue, WORKER_PROCESSES > 0), or on their own:
+    python -m app.worker --processes 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import List, Optional
+
+from langchain.globals import set_llm_cache
+from langgraph.types import Command
+
+from app.utils.admission import share_rate_limits
+from app.utils.cassettes import cassettes
+from app.utils.checkpointer import DurableSqliteSaver
+from app.utils.config import settings
+from app.utils.job_queue import BufferedEventLog, event_log, job_queue
+from app.utils.llm_cache import build_llm_cache
+from app.utils.logs import configure_logging, get_logger
+from app.utils.metrics import metrics
+from app.utils.result_store import final_results
+from app.utils.tracing import get_run_callbacks
+from app.workflow.graph import research_workflow
+from app.workflow.runner import run_graph, warm_up
+
+log = get_logger(__name__)
+
+
+async def _keep_lease(job, worker: str, run: asyncio.Task):
+    """Renews the job's lease while it runs; cancels the run if another worker has taken the job over."""
+    while True:
+        await asyncio.sleep(job_queue.lease_seconds / 3)
+        if not await asyncio.to_thread(job_queue.renew, job.id, worker):
+            log.warning("job_lease_lost", task_id=job.task_id, job_id=job.id, worker=worker)
+            run.cancel()
+            return
+
+
+async def _publish_metrics(worker: str):
+    """Sends this worker's metrics to the API every METRICS_WORKER_INTERVAL_SECONDS."""
+    while True:
+        await asyncio.sleep(settings.METRICS_WORKER_INTERVAL_SECONDS)
+        await asyncio.to_thread(job_queue.save_metrics, worker, metrics.snapshot())
+
+
+async def _run_job(graph, job, worker: str, events: BufferedEventLog):
+    """
+    Runs one job to completion. A retried job continues from the task's last checkpoint:
+    it resumes the approval pause if the task is still there, or picks up the remaining nodes.
+    """
+    task_id = job.task_id
+    config = {"configurable": {"thread_id": task_id}, "callbacks": get_run_callbacks()}
+    if job.attempts > settings.JOB_MAX_ATTEMPTS:
+        error = f"The research run failed {job.attempts - 1} times without finishing."
+        await final_results.aset(task_id, {"error": error})
+        events.publish(task_id, "error", {"detail": error})
+        await events.flush()
+        await asyncio.to_thread(job_queue.finish, job.id, worker, error)
+        return
+
+    try:
+        snapshot = await graph.aget_state({"configurable": {"thread_id": task_id}})
+        events.publish(task_id, "running")
+        if snapshot.interrupts:
+            final_state = await run_graph(graph, task_id, Command(resume=job.payload), config, events)
+        elif snapshot.next:
+            log.info("job_continued", task_id=task_id, job_id=job.id, attempt=job.attempts)
+            final_state = await run_graph(graph, task_id, None, config, events)
+        else:
+            # The graph finished, but the worker that ran it stopped before storing the result
+            final_state = snapshot.values
+        # The result is on disk before 'complete' is published, so the API can serve it at once
+        await final_results.aset(task_id, final_state)
+        events.publish(task_id, "complete")
+        await events.flush()
+        await asyncio.to_thread(job_queue.finish, job.id, worker)
+        log.info("job_completed", task_id=task_id, job_id=job.id, worker=worker)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log.exception("job_failed", task_id=task_id, job_id=job.id, worker=worker, error=str(e))
+        await final_results.aset(task_id, {"error": str(e)})
+        events.publish(task_id, "error", {"detail": str(e)})
+        await events.flush()
+        await asyncio.to_thread(job_queue.finish, job.id, worker, str(e))
+
+
+async def run_worker(worker: str, concurrency: int, rate_limit_shares: int):
+    """
+    Claims and runs up to `concurrency` jobs at a time until SIGTERM or SIGINT.
+    The process gets one of `rate_limit_shares` equal shares of every rate limit.
+    """
+    configure_logging()
+    set_llm_cache(build_llm_cache())
+    share_rate_limits(rate_limit_shares)
+    checkpointer = await DurableSqliteSaver.open(
+        settings.CHECKPOINT_PATH,
+        commit_interval=settings.CHECKPOINT_COMMIT_INTERVAL_MS / 1000
+    )
+    graph = research_workflow.compile(checkpointer=checkpointer)
+    if cassettes is not None:
+        await cassettes.aload()
+    # Shared by the worker's jobs, so their events reach the log in a few batched writes
+    events = BufferedEventLog(
+        event_log,
+        flush_interval=settings.EVENT_LOG_FLUSH_MS / 1000,
+        max_buffered_chars=settings.EVENT_LOG_FLUSH_CHARS,
+    )
+    if settings.WARMUP_ENABLED:
+        # Jobs are claimed only once the client is built, so the first job does not pay for it
+        try:
+            await asyncio.to_thread(warm_up)
+        except Exception as e:
+            log.exception("warm_up_failed", worker=worker, error=str(e))
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    slots = asyncio.Semaphore(concurrency)
+    running = {}
+
+    async def run(job):
+        task = asyncio.current_task()
+        lease = asyncio.create_task(_keep_lease(job, worker, task))
+        try:
+            await _run_job(graph, job, worker, events)
+        except asyncio.CancelledError:
+            # Shutting down, or the job was taken over: hand it back if it is still ours
+            await asyncio.to_thread(job_queue.release, job.id, worker)
+        finally:
+            lease.cancel()
+            running.pop(job.id, None)
+            slots.release()
+
+    publisher = asyncio.create_task(_publish_metrics(worker)) if metrics is not None else None
+    log.info("worker_ready", worker=worker, concurrency=concurrency)
+    while not stopping.is_set():
+        await slots.acquire()
+        job = await asyncio.to_thread(job_queue.claim, worker)
+        if job is None:
+            slots.release()
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=settings.JOB_POLL_INTERVAL_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        log.info("job_claimed", task_id=job.task_id, job_id=job.id, worker=worker, attempt=job.attempts)
+        running[job.id] = asyncio.create_task(run(job))
+
+    # Jobs still running go back to the queue for the next worker
+    for task in list(running.values()):
+        task.cancel()
+    await asyncio.gather(*running.values(), return_exceptions=True)
+    await events.flush()
+    if publisher is not None:
+        publisher.cancel()
+        await asyncio.to_thread(job_queue.save_metrics, worker, metrics.snapshot())
+    await checkpointer.aclose()
+    log.info("worker_stopped", worker=worker)
+
+
+def _worker_main(index: int, concurrency: int, rate_limit_shares: int):
+    worker = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    asyncio.run(run_worker(worker, concurrency, rate_limit_shares))
+
+
+class WorkerPool:
+    """
+    Keeps `processes` worker processes running, restarting any that crash. A job held by a
+    crashed worker goes back to the queue when its lease runs out.
+    """
+
+    def __init__(self, processes: int, concurrency: int):
+        self.processes = processes
+        self.concurrency = concurrency
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[Optional[multiprocessing.Process]] = [None] * processes
+        self._stopping = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+
+    def _spawn(self, index: int):
+        # The API process calls the same providers, so it keeps a share of the rate limits too
+        args = (index, self.concurrency, self.processes + 1)
+        process = self._context.Process(target=_worker_main, args=args, daemon=False)
+        process.start()
+        self._workers[index] = process
+
+    def _supervise(self):
+        while not self._stopping.wait(1.0):
+            for index, process in enumerate(self._workers):
+                # Workers exit with 0 only when asked to stop
+                if process is not None and not process.is_alive() and process.exitcode != 0:
+                    log.warning("worker_process_restarted", pid=process.pid, exit_code=process.exitcode)
+                    self.restarts += 1
+                    self._spawn(index)
+
+    def start(self):
+        for index in range(self.processes):
+            self._spawn(index)
+        self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+        self._supervisor.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Asks the workers to hand back their jobs and exit, and kills those that do not in time."""
+        self._stopping.set()
+        for process in self._workers:
+            if process is not None and process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self._workers:
+            if process is not None:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.kill()
+
+    def stats(self):
+        return {
+            "processes": self.processes,
+            "alive": sum(1 for p in self._workers if p is not None and p.is_alive()),
+            "restarts": self.restarts,
+            "concurrency": self.concurrency,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs research workers for the job queue (EXECUTION_MODE=queue).")
+    parser.add_argument("--processes", type=int, default=max(1, settings.WORKER_PROCESSES))
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY)
+    args = parser.parse_args()
+    if settings.EXECUTION_MODE != "queue":
+        raise SystemExit("Workers need EXECUTION_MODE=queue (in the environment or .env).")
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    pool = WorkerPool(args.processes, args.concurrency)
+    pool.start()
+    while not stop.wait(1.0):
+        pass
+    pool.stop()
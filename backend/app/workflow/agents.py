@@ -1,54 +1,44 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_ollama import ChatOllama 
-from langchain_openai import ChatOpenAI  
 
 from pydantic import BaseModel, Field
-from typing import List, Literal
+from typing import List, Literal, Optional
 
-import json
+from app.utils.admission import llm_rate_limiters
+from app.utils.cassettes import cassettes
+from app.utils.logs import get_logger
+from app.utils.tools import get_converted_tools
 
-from app.utils.config import settings
-from app.utils.tools import converted_tools
-
-import re
+log = get_logger(__name__)
 
 # --- LLM Initialization ---
-llm = None 
-
-if settings.LLM_PROVIDER == "groq":
-    print("🚀 Using Groq as the LLM provider.")
-    llm = ChatGroq(
-        groq_api_key=settings.GROQ_API_KEY,
-        model_name="llama3-8b-8192", 
-        temperature=0
-    )
-elif settings.LLM_PROVIDER == "google":
-    if not settings.GOOGLE_API_KEY:
-        raise ValueError("LLM_PROVIDER is set to 'google' but GOOGLE_API_KEY is missing.")
-    print("✨ Using Google Gemini as the LLM provider.")
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-1.5-flash",
-        google_api_key=settings.GOOGLE_API_KEY,
-        temperature=0
-    )
-elif settings.LLM_PROVIDER == "openrouter":
-    if not settings.OPENROUTER_API_KEY:
-        raise ValueError("LLM_PROVIDER is set to 'openrouter' but OPENROUTER_API_KEY is missing.")
-    print("🌐 Using OpenRouter as the LLM provider.")
-    llm = ChatOpenAI(
-        api_key=settings.OPENROUTER_API_KEY,
-        base_url="https://openrouter.ai/api/v1",
-        model="anthropic/claude-3.5-sonnet",  # You can change this to your preferred model
-        temperature=0
-    )
-elif settings.LLM_PROVIDER == "ollama":
-    print("🗿 Using local Ollama as the LLM provider.")
-    llm = ChatOllama(model="gemma3:4b", temperature=0)
-else:
-    raise ValueError(f"Unsupported LLM provider: '{settings.LLM_PROVIDER}'. Please choose 'groq', 'google', 'openrouter', or 'ollama'.")
+
+def create_llm(provider: str, model: str, api_key: Optional[str] = None):
+    """
+    Builds the chat model client for a provider. Each client owns its HTTP connection pool,
+    so callers should reuse it (see app/models/llm_registry.py) rather than build one per call.
+    All clients of a provider share its rate limiter, whichever task or key they serve.
+    Provider SDKs are imported here, on first use, so only the providers in use are ever loaded.
+    """
+    rate_limiter = llm_rate_limiters.get(provider)
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+        log.info("llm_client_created", provider=provider, model=model)
+        return ChatGroq(groq_api_key=api_key, model_name=model, temperature=0, rate_limiter=rate_limiter)
+    elif provider == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        log.info("llm_client_created", provider=provider, model=model)
+        return ChatGoogleGenerativeAI(model=model, google_api_key=api_key, temperature=0, rate_limiter=rate_limiter)
+    elif provider == "openrouter":
+        from langchain_openai import ChatOpenAI
+        log.info("llm_client_created", provider=provider, model=model)
+        return ChatOpenAI(api_key=api_key, base_url="https://openrouter.ai/api/v1", model=model, temperature=0,
+                          rate_limiter=rate_limiter)
+    elif provider == "ollama":
+        from langchain_ollama import ChatOllama
+        log.info("llm_client_created", provider=provider, model=model)
+        return ChatOllama(model=model, temperature=0, rate_limiter=rate_limiter)
+    raise ValueError(f"Unsupported LLM provider: '{provider}'. Please choose 'groq', 'google', 'openrouter', or 'ollama'.")
 
 
 class ResearchPlan(BaseModel):
@@ -166,25 +156,63 @@ summarizer_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-planner_agent = planner_prompt | llm.with_structured_output(ResearchPlan)
+# Map-reduce summarization: each question's findings are condensed on their own, then merged.
+# Footnote numbers are assigned once per run, so both stages must keep them as given.
+condenser_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system",
+         "You are a meticulous research assistant. Condense the findings below, gathered for one research sub-question, "
+         "into a summary of at most {max_words} words. Keep concrete facts, names and numbers.\n"
+         "IMPORTANT: After every fact, cite its source with the footnote marker shown next to the finding it came from, for example '[^3]'. "
+         "Use only the markers provided and never renumber them. Do not add a citations section.\n\n"
+         "--- BEGIN FINDINGS ---\n"
+         "{context}"
+         "--- END FINDINGS ---"
+        ),
+        ("user", "Research question: '{question}'. Write the condensed summary now.")
+    ]
+)
+
+reducer_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system",
+         "You are an expert research analyst. Your goal is to merge condensed research summaries into a comprehensive report.\n"
+         "You have been given a user's query, and one summary per research sub-question. The summaries cite their sources with markdown footnote markers such as '[^3]'.\n"
+         "Please write a detailed, well-structured report that directly answers the user's query.\n"
+         "IMPORTANT: Keep every footnote marker attached to the facts it supports, exactly as numbered. Never renumber or invent footnotes. "
+         "Do not write a 'Citations' section; it is appended automatically.\n\n"
+         "Here are the summaries you must use:\n"
+         "--- BEGIN SUMMARIES ---\n"
+         "{context}"
+         "--- END SUMMARIES ---"
+        ),
+        ("user", "My original query was: '{query}'. Now, please generate the full report based on the provided summaries.")
+    ]
+)
+
+def _named(name: str, chain, streaming: bool = False):
+    """Runs a chain under its name, behind a cassette when calls are being recorded or replayed."""
+    if cassettes is not None:
+        return cassettes.wrap_chain(name, chain, streaming)
+    return chain.with_config(run_name=name)
+
 
-if settings.LLM_PROVIDER != "ollama":    
-    tool_router = (
-        router_prompt
-        | llm.bind(tools=converted_tools, tool_choice="none")  # <-- The critical new instruction
-        | StrOutputParser()
-    )
-else:
-    tool_router = router_prompt | llm | StrOutputParser()
+class Agents:
+    """The chains of one research task, all built on the same chat model client."""
 
-if settings.LLM_PROVIDER != "ollama":    
-    decision_agent = (
-        decider_prompt
-        | llm.bind(tools=converted_tools, tool_choice="none")  # <-- The critical new instruction
-        | StrOutputParser()
-    )
-else:
-    decision_agent = decider_prompt | llm | StrOutputParser()
+    def __init__(self, llm, provider: str):
+        self.provider = provider
+        # Each chain runs under its attribute name, which traces and metrics report it by
+        self.planner_agent = _named("planner_agent", planner_prompt | llm.with_structured_output(ResearchPlan))
 
-summarizer_agent = summarizer_prompt | llm
+        if provider != "ollama":
+            # Tools are bound but never called, which keeps some providers from answering with a tool call
+            no_tool_llm = llm.bind(tools=get_converted_tools(), tool_choice="none")
+        else:
+            no_tool_llm = llm
+        self.tool_router = _named("tool_router", router_prompt | no_tool_llm | StrOutputParser())
+        self.decision_agent = _named("decision_agent", decider_prompt | no_tool_llm | StrOutputParser())
 
+        self.summarizer_agent = _named("summarizer_agent", summarizer_prompt | llm, streaming=True)
+        self.condenser_agent = _named("condenser_agent", condenser_prompt | llm | StrOutputParser())
+        self.reducer_agent = _named("reducer_agent", reducer_prompt | llm, streaming=True)
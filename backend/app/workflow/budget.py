@@ -0,0 +1,175 @@
+"""
+Per-task budgets for wall-clock time, LLM tokens and tool calls.
+"""
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Mapping, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+from app.utils.config import settings
+from app.workflow.context import count_tokens
+
+BUDGET_KEYS = ("max_seconds", "max_tokens", "max_tool_calls")
+
+
+class TokenMeter(BaseCallbackHandler):
+    """
+    Counts the tokens of every chat model call made while it is active. Uses the usage the
+    provider reports, or estimates prompt and completion tokens when the provider reports none.
+    """
+    run_inline = True
+
+    def __init__(self):
+        self.tokens = 0
+        self._prompt_estimates: Dict[UUID, int] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self._prompt_estimates[run_id] = sum(
+            count_tokens(str(message.content)) for batch in messages for message in batch
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        prompt_estimate = self._prompt_estimates.pop(run_id, 0)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self.tokens += usage.get("total_tokens", 0)
+                else:
+                    self.tokens += prompt_estimate + count_tokens(generation.text)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        # The prompt was still sent, and most providers bill it
+        self.tokens += self._prompt_estimates.pop(run_id, 0)
+
+
+# Every LLM call made in a context where a meter is set reports to it, without passing callbacks around
+_active_meter: ContextVar[Optional[TokenMeter]] = ContextVar("task_token_meter", default=None)
+register_configure_hook(_active_meter, inheritable=True)
+
+
+def budget_limits(requested: Optional[Mapping[str, Any]] = None) -> Dict[str, float]:
+    """
+    The limits of a new task: the tighter of the server's limit and the requested one for
+    each kind of budget. 0 means unlimited.
+    """
+    server = {
+        "max_seconds": settings.TASK_MAX_SECONDS,
+        "max_tokens": settings.TASK_MAX_TOKENS,
+        "max_tool_calls": settings.TASK_MAX_TOOL_CALLS,
+    }
+    requested = requested or {}
+    limits = {}
+    for key in BUDGET_KEYS:
+        values = [v for v in (server[key], requested.get(key)) if v]
+        limits[key] = min(values) if values else 0
+    return limits
+
+
+class TaskBudget:
+    """
+    One node's view of its task's budget. Created from the state at the start of a node, used as
+    a context manager around the node's work so its LLM calls are metered, and saved back into
+    the state at the end.
+
+    Time counts the seconds spent inside nodes, so the wait for human approval is free.
+    The research steps stop early enough to leave `reserve` of the time and token budgets
+    for the summarizer, so a task that runs out still ends with a report.
+    """
+
+    def __init__(self, state: Mapping[str, Any], reserve: float = None):
+        self.limits = state.get("budget") or {}
+        usage = state.get("budget_usage") or {}
+        self.reserve = settings.TASK_BUDGET_SUMMARY_RESERVE if reserve is None else reserve
+        self.seconds_before = usage.get("seconds", 0.0)
+        self.tokens_before = usage.get("tokens", 0)
+        self.tool_calls = usage.get("tool_calls", 0)
+        self.exhausted_by: Optional[str] = state.get("budget_exhausted")
+        self.meter = TokenMeter()
+        self.started = time.monotonic()
+        self._token = None
+
+    def __enter__(self) -> "TaskBudget":
+        self._token = _active_meter.set(self.meter)
+        return self
+
+    def __exit__(self, *exc_info):
+        _active_meter.reset(self._token)
+
+    @property
+    def seconds_used(self) -> float:
+        return self.seconds_before + time.monotonic() - self.started
+
+    @property
+    def tokens_used(self) -> int:
+        return self.tokens_before + self.meter.tokens
+
+    def _available(self, limit: float, with_reserve: bool) -> float:
+        return limit * (1 - self.reserve) if with_reserve else limit
+
+    def remaining_seconds(self, with_reserve: bool = False) -> Optional[float]:
+        """Seconds left, or None without a time limit. With the reserve, the research steps' share."""
+        limit = self.limits.get("max_seconds")
+        if not limit:
+            return None
+        return max(0.0, self._available(limit, with_reserve) - self.seconds_used)
+
+    def remaining_tokens(self, with_reserve: bool = False) -> Optional[int]:
+        """Tokens left, or None without a token limit. With the reserve, the research steps' share."""
+        limit = self.limits.get("max_tokens")
+        if not limit:
+            return None
+        return max(0, int(self._available(limit, with_reserve)) - self.tokens_used)
+
+    def remaining_tool_calls(self) -> Optional[int]:
+        """Tool calls left, or None without a tool call limit."""
+        limit = self.limits.get("max_tool_calls")
+        if not limit:
+            return None
+        return max(0, limit - self.tool_calls)
+
+    def exhausted(self, with_reserve: bool = False) -> Optional[str]:
+        """Which budget ('time' or 'tokens') has run out, if any."""
+        if self.remaining_seconds(with_reserve) == 0:
+            return "time"
+        if self.remaining_tokens(with_reserve) == 0:
+            return "tokens"
+        return None
+
+    def take_tool_call(self) -> bool:
+        """Counts a tool call. Returns False, counting nothing, when no tool calls are left."""
+        limit = self.limits.get("max_tool_calls")
+        if limit and self.tool_calls >= limit:
+            return False
+        self.tool_calls += 1
+        return True
+
+    def cut_short(self, reason: str):
+        """Records that work was skipped because the `reason` budget ran out. The first reason is kept."""
+        self.exhausted_by = self.exhausted_by or reason
+
+    def save(self, state: Dict[str, Any]):
+        state["budget_usage"] = {
+            "seconds": round(self.seconds_used, 3),
+            "tokens": self.tokens_used,
+            "tool_calls": self.tool_calls,
+        }
+        state["budget_exhausted"] = self.exhausted_by
+
+
+def budget_note(state: Mapping[str, Any]) -> str:
+    """The note appended to a report that was cut short, or an empty string."""
+    reason = state.get("budget_exhausted")
+    if not reason:
+        return ""
+    note = f"\n\n---\n*This report was cut short: the task ran out of its {reason} budget."
+    skipped = state.get("skipped_questions") or []
+    if skipped:
+        note += f" {len(skipped)} research question(s) were not researched:*\n"
+        note += "".join(f"\n- {question}" for question in skipped)
+        return note + "\n"
+    return note + " It is based on the research gathered so far.*\n"
@@ -0,0 +1,269 @@
+"""
+Token-budgeted packing of research findings into the summarizer's context.
+"""
+import math
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.utils.config import settings
+from app.utils.logs import get_logger
+
+log = get_logger(__name__)
+
+# Context windows of the model each provider is configured with in app/workflow/agents.py
+CONTEXT_WINDOWS = {
+    "groq": 8192,          # llama3-8b-8192
+    "google": 1_048_576,   # gemini-1.5-flash
+    "openrouter": 200_000, # anthropic/claude-3.5-sonnet
+    "ollama": 8192,        # gemma3:4b; Ollama's num_ctx is usually lower than the model's window
+}
+
+# Findings with these markers carry no information for the report
+_LOW_VALUE_MARKERS = ("Error:", "An error occurred", "No results were found")
+
+# Below this many tokens, a truncated finding is not worth its header and source line
+_MIN_TRUNCATED_TOKENS = 48
+_TRUNCATION_MARK = " …[truncated]"
+
+_encoder = None
+_encoder_lock = threading.Lock()
+_encoder_loaded = False
+
+
+def _get_encoder():
+    """Loads the tiktoken encoding once; None when tiktoken is disabled, missing or cannot fetch its data."""
+    global _encoder, _encoder_loaded
+    if _encoder_loaded:
+        return _encoder
+    with _encoder_lock:
+        if not _encoder_loaded:
+            if settings.CONTEXT_TOKENIZER == "tiktoken":
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    log.warning("tokenizer_unavailable", fallback="characters", error=f"{type(e).__name__}: {e}")
+            _encoder_loaded = True
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of `text` with tiktoken, or estimates them at four characters per token.
+    Neither matches every provider's tokenizer exactly, so budgets keep a safety margin.
+    """
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cuts `text` to at most `max_tokens` tokens, at a word boundary where possible."""
+    encoder = _get_encoder()
+    budget = max_tokens - count_tokens(_TRUNCATION_MARK)
+    if encoder is not None:
+        cut = encoder.decode(encoder.encode(text, disallowed_special=())[:budget])
+    else:
+        cut = text[:budget * 4]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut + _TRUNCATION_MARK
+
+
+def context_budget(provider: str, prompt_tokens: int) -> int:
+    """Tokens available to the research material, once the prompt and the report are accounted for."""
+    window = settings.SUMMARIZER_CONTEXT_WINDOW or CONTEXT_WINDOWS.get(provider, 8192)
+    available = window - settings.SUMMARIZER_OUTPUT_TOKENS - prompt_tokens
+    available = min(available, settings.SUMMARIZER_MAX_INPUT_TOKENS)
+    return max(0, int(available * settings.CONTEXT_SAFETY_MARGIN))
+
+
+@dataclass
+class ContextStats:
+    """What the packer kept and what it left out, in findings and tokens."""
+    budget_tokens: int
+    packed_tokens: int = 0
+    findings_packed: int = 0
+    findings_truncated: int = 0
+    findings_dropped: int = 0
+    tokens_dropped: int = 0
+    per_question: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class _Finding:
+    text: str
+    info: Optional[Dict[str, Any]]
+    rendered: str
+    tokens: int
+
+
+def _fit(finding: _Finding, text_tokens: int, render_finding: Callable[[str, Any], str]) -> str:
+    """Renders a truncated copy of the finding that fits in `text_tokens` plus its source line."""
+    limit = text_tokens + count_tokens(render_finding("", finding.info))
+    while True:
+        rendered = render_finding(_truncate(finding.text, text_tokens), finding.info)
+        # Tokens do not always split the same way after a cut, so check and shrink if needed
+        if count_tokens(rendered) <= limit or text_tokens <= 1:
+            return rendered
+        text_tokens = int(text_tokens * 0.9)
+
+
+def source_label(source_info: Optional[Dict[str, Any]]) -> str:
+    if not source_info:
+        return "Not available"
+    return str(source_info.get('source') or source_info.get('Title') or "Not available")
+
+
+def number_sources(findings: Dict[str, List[str]], sources: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]:
+    """Assigns every distinct source of the run a footnote number, in question and ranking order."""
+    numbers: Dict[str, int] = {}
+    for question, texts in findings.items():
+        question_sources = sources.get(question, [])
+        for j, text in enumerate(texts):
+            if j < len(question_sources) and not is_low_value(text):
+                label = source_label(question_sources[j])
+                if label != "Not available":
+                    numbers.setdefault(label, len(numbers) + 1)
+    return numbers
+
+
+def footnote_renderer(numbers: Dict[str, int]) -> Callable[[str, Optional[Dict[str, Any]]], str]:
+    """Renders findings with the run-wide footnote marker of their source, for pack_context."""
+    def render(text: str, info: Optional[Dict[str, Any]]) -> str:
+        number = numbers.get(source_label(info))
+        if number is None:
+            return f"Finding: {text}\nSource: Not available\n\n"
+        return f"Finding [^{number}]: {text}\nSource [^{number}]: {source_label(info)}\n\n"
+    return render
+
+
+_FOOTNOTE_RE = re.compile(r"\[\^(\d+)\]")
+
+
+def citations_section(report: str, numbers: Dict[str, int]) -> str:
+    """
+    The 'Citations' section for a report written with run-wide footnote numbers: the sources
+    it cites, or every source when the model left out the markers.
+    """
+    by_number = {number: label for label, number in numbers.items()}
+    cited = sorted({int(n) for n in _FOOTNOTE_RE.findall(report)} & by_number.keys()) or sorted(by_number)
+    if not cited:
+        return ""
+    lines = [f"[^{number}]: {by_number[number]}" for number in cited]
+    return "\n\n## Citations\n\n" + "\n".join(lines) + "\n"
+
+
+def is_low_value(text: str) -> bool:
+    stripped = text.strip()
+    return not stripped or stripped.startswith(_LOW_VALUE_MARKERS)
+
+
+def _fair_shares(demands: List[int], budget: int) -> List[int]:
+    """
+    Splits `budget` across questions: each gets an equal share, and what a question
+    does not need is handed on to the questions that need more.
+    """
+    shares = [0] * len(demands)
+    remaining = sorted(range(len(demands)), key=lambda i: demands[i])
+    left = budget
+    while remaining:
+        share = left // len(remaining)
+        index = remaining[0]
+        if demands[index] <= share:
+            shares[index] = demands[index]
+            left -= demands[index]
+            remaining.pop(0)
+        else:
+            # Everyone left needs at least an equal share; hand it out and stop
+            for index in remaining:
+                shares[index] = share
+            break
+    return shares
+
+
+def pack_context(
+    findings: Dict[str, List[str]],
+    sources: Dict[str, List[Dict[str, Any]]],
+    budget_tokens: int,
+    render_finding: Optional[Callable[[str, Dict[str, Any]], str]] = None,
+) -> Tuple[str, ContextStats]:
+    """
+    Builds the summarizer context from the findings, within `budget_tokens`.
+
+    Error and empty findings are dropped first, and questions left without findings are
+    left out. The remaining budget is shared fairly across
+    research questions; within a question, findings are kept in the tool's ranking order and
+    the last one that does not fit whole is truncated. The text is joined once at the end.
+    """
+    stats = ContextStats(budget_tokens=budget_tokens)
+    render_finding = render_finding or (lambda text, info: f"Finding: {text}\nSource: {source_label(info)}\n\n")
+
+    questions: List[Tuple[str, str, List[_Finding], int]] = []
+    for i, (question, texts) in enumerate(findings.items()):
+        header = f"Research Question {i+1}: {question}\n\n"
+        question_sources = sources.get(question, [])
+        kept, low_value = [], 0
+        for j, text in enumerate(texts):
+            if is_low_value(text):
+                low_value += 1
+                continue
+            info = question_sources[j] if j < len(question_sources) else None
+            rendered = render_finding(text, info)
+            kept.append(_Finding(text=text, info=info, rendered=rendered, tokens=count_tokens(rendered)))
+        questions.append((question, header, kept, low_value))
+
+    footer = "---\n\n"
+    footer_tokens = count_tokens(footer)
+    fixed_tokens = [count_tokens(header) + footer_tokens for _, header, _, _ in questions]
+    demands = [fixed + sum(f.tokens for f in kept) for fixed, (_, _, kept, _) in zip(fixed_tokens, questions)]
+    shares = _fair_shares(demands, budget_tokens)
+
+    parts: List[str] = []
+    emitted = 0
+    for (question, header, kept, low_value), fixed, share in zip(questions, fixed_tokens, shares):
+        question_stats = {"packed": 0, "truncated": 0, "dropped": low_value}
+        stats.per_question[question] = question_stats
+        left = share - fixed
+        question_parts, question_tokens = [], 0
+        for finding in kept:
+            if finding.tokens <= left:
+                question_parts.append(finding.rendered)
+                question_tokens += finding.tokens
+                left -= finding.tokens
+                question_stats["packed"] += 1
+                continue
+            overhead = count_tokens(render_finding("", finding.info))
+            if left - overhead >= _MIN_TRUNCATED_TOKENS:
+                rendered = _fit(finding, left - overhead, render_finding)
+                tokens = count_tokens(rendered)
+                question_parts.append(rendered)
+                question_tokens += tokens
+                left -= tokens
+                stats.tokens_dropped += finding.tokens - tokens
+                question_stats["truncated"] += 1
+            else:
+                stats.tokens_dropped += finding.tokens
+                question_stats["dropped"] += 1
+
+        # Questions left without material are not worth their header
+        if question_parts:
+            # Renumbered so the context has no gaps; never longer than the header that was budgeted
+            emitted += 1
+            parts.append(f"Research Question {emitted}: {question}\n\n")
+            parts.extend(question_parts)
+            parts.append(footer)
+            stats.packed_tokens += fixed + question_tokens
+
+    for question_stats in stats.per_question.values():
+        stats.findings_packed += question_stats["packed"]
+        stats.findings_truncated += question_stats["truncated"]
+        stats.findings_dropped += question_stats["dropped"]
+    return "".join(parts), stats
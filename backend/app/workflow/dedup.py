@@ -0,0 +1,152 @@
+"""
+Exact and near-duplicate removal of research findings, across questions and tools.
+"""
+import hashlib
+import re
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.workflow.context import count_tokens, is_low_value, source_label
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass
+class DedupStats:
+    """How many findings were removed and what that saved."""
+    findings_in: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    bytes_saved: int = 0
+    tokens_saved: int = 0
+    seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles, with the permutations drawn once from a fixed seed
+    so results are reproducible. Each permutation is a universal hash (a * x + b) mod p.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, 1 << 31, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, words: List[str]) -> np.ndarray:
+        word_hashes = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+        if len(words) < self.shingle_size:
+            word_hashes = np.append(word_hashes, np.zeros(self.shingle_size - len(words), dtype=np.uint64))
+        # Polynomial hash of every window of `shingle_size` words, computed for all windows at once
+        count = len(word_hashes) - self.shingle_size + 1
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset in range(self.shingle_size):
+            shingles = (shingles * np.uint64(1_000_003) + word_hashes[offset:offset + count]) & np.uint64(0xFFFFFFFF)
+        # Values stay below 2**63, so the arithmetic never wraps
+        return ((self._a * shingles + self._b) % _MERSENNE_PRIME).min(axis=1)
+
+
+def _merge_source(kept: Optional[Dict[str, Any]], question: str, dropped: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Records the dropped duplicate's source on the kept finding's metadata."""
+    label = source_label(dropped)
+    if kept is None or label == "Not available" or label == source_label(kept):
+        return kept
+    merged = dict(kept)
+    also_found_in = list(merged.get("also_found_in") or [])
+    if not any(entry.get("source") == label for entry in also_found_in):
+        also_found_in.append({"source": label, "question": question})
+    merged["also_found_in"] = also_found_in
+    return merged
+
+
+def dedupe_findings(
+    findings: Dict[str, List[str]],
+    sources: Dict[str, List[Dict[str, Any]]],
+    threshold: float = 0.8,
+    num_perm: int = 64,
+    bands: int = 16,
+    shingle_size: int = 5,
+) -> Tuple[Dict[str, List[str]], Dict[str, List[Dict[str, Any]]], DedupStats]:
+    """
+    Removes findings that repeat an earlier one, in question and ranking order.
+
+    Exact duplicates are found by hashing the normalized text. Near duplicates are found with
+    MinHash and LSH banding, so only findings that share a band are compared; a candidate is
+    dropped when its estimated Jaccard similarity to a kept finding reaches `threshold`.
+    The dropped finding's source is added to the kept one's 'also_found_in' metadata.
+    Error and empty findings are left alone.
+    """
+    started = time.perf_counter()
+    stats = DedupStats()
+    hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+    rows = num_perm // bands
+
+    exact_index: Dict[bytes, Tuple[str, int]] = {}
+    band_index: Dict[Tuple[int, bytes], List[Tuple[str, int]]] = defaultdict(list)
+    signatures: Dict[Tuple[str, int], np.ndarray] = {}
+    new_findings: Dict[str, List[str]] = {}
+    # Kept aligned with new_findings (None where a finding has no metadata)
+    aligned_sources: Dict[str, List[Optional[Dict[str, Any]]]] = {}
+
+    for question, texts in findings.items():
+        question_sources = sources.get(question, [])
+        kept_texts = new_findings[question] = []
+        kept_sources = aligned_sources[question] = []
+        for j, text in enumerate(texts):
+            info = question_sources[j] if j < len(question_sources) else None
+            if is_low_value(text):
+                kept_texts.append(text)
+                kept_sources.append(info)
+                continue
+            stats.findings_in += 1
+
+            words = _WORD_RE.findall(text.lower())
+            digest = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).digest()
+            match = exact_index.get(digest)
+            if match is not None:
+                stats.exact_duplicates += 1
+            else:
+                signature = hasher.signature(words)
+                band_keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(bands)]
+                candidates = dict.fromkeys(c for key in band_keys for c in band_index.get(key, ()))
+                match = next(
+                    (c for c in candidates if float(np.mean(signatures[c] == signature)) >= threshold),
+                    None,
+                )
+                if match is not None:
+                    stats.near_duplicates += 1
+
+            if match is not None:
+                kept_question, kept_position = match
+                target = aligned_sources[kept_question]
+                target[kept_position] = _merge_source(target[kept_position], question, info)
+                stats.bytes_saved += len(text.encode("utf-8"))
+                stats.tokens_saved += count_tokens(text)
+                continue
+
+            key = (question, len(kept_texts))
+            exact_index[digest] = key
+            signatures[key] = signature
+            for band_key in band_keys:
+                band_index[band_key].append(key)
+            kept_texts.append(text)
+            kept_sources.append(info)
+
+    # Sources are paired with findings by position, so a finding without one keeps an empty placeholder
+    new_sources = {
+        question: [info if info is not None else {} for info in infos]
+        for question, infos in aligned_sources.items()
+    }
+    stats.seconds = round(time.perf_counter() - started, 4)
+    return new_findings, new_sources, stats
@@ -1,33 +1,54 @@
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, StateGraph
-from langgraph.types import interrupt
+from langgraph.types import StreamWriter, interrupt
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.models.schemas import GraphState
-from app.workflow.agents import planner_agent, tool_router, summarizer_agent
+from app.models.llm_registry import llm_registry
+from app.workflow.agents import Agents, condenser_prompt, reducer_prompt, summarizer_prompt
+from app.workflow.budget import TaskBudget, budget_note
+from app.workflow.context import (
+    citations_section, context_budget, count_tokens, footnote_renderer, is_low_value, number_sources, pack_context,
+)
+from app.workflow.dedup import dedupe_findings
+from app.workflow.routing import parse_llm_route, route_question
 from app.utils.tools import available_tools
+from app.utils.config import settings
+from app.utils.findings_index import findings_index
+from app.utils.logs import get_logger
+from app.utils.metrics import metrics
+
+log = get_logger(__name__)
 
-def print_state(state: GraphState):
-    print("--- CURRENT STATE ---")
-    print(f"Query: {state['original_query']}")
-    print(f"Questions: {state['research_questions']}")
-    if findings := state.get('findings'):
-        if any(findings.values()):
-            print(f"Findings: {state.get('findings', {})}")
-    print("--------------------")
+# Shared by every task in the process, so the total number of in-flight questions stays bounded
+_global_research_slots = asyncio.Semaphore(settings.RESEARCH_GLOBAL_CONCURRENCY)
 
+def log_state(state: GraphState):
+    """Logs the task's query and questions; the findings, which can be large, only at DEBUG level."""
+    findings = state.get('findings') or {}
+    log.info("state", query=state['original_query'], questions=state['research_questions'],
+             findings=sum(len(f) for f in findings.values()))
+    if log.enabled(logging.DEBUG) and any(findings.values()):
+        log.debug("state_findings", findings=findings)
 
-def planner_node(state: GraphState) -> GraphState:
+
+async def planner_node(state: GraphState) -> GraphState:
     """
     Generates the initial research plan.
     """
-    task_id = state.get('task_id', 'UNKNOWN')
-    print(f"--- [Task: {task_id}] --- 🧠 RUNNING PLANNER ---")
-    
-    plan = planner_agent.invoke({"query": state["original_query"]})
+    agents = await llm_registry.afor_task(state)
+    with TaskBudget(state) as budget:
+        plan = await agents.planner_agent.ainvoke({"query": state["original_query"]})
     state["research_questions"] = plan.questions
     state["findings"] = {q: [] for q in plan.questions}
     state["sources"] = {q: [] for q in plan.questions}
+    budget.save(state)
     
-    print_state(state)
+    log_state(state)
     return state
 
 def human_approval_node(state: GraphState):
@@ -35,23 +56,103 @@ def human_approval_node(state: GraphState):
     Pauses the graph to wait for human approval.
     The user can review and edit the research questions.
     """
-    task_id = state['task_id']
-    print(f"--- [Task: {task_id}] --- ✋ PAUSING FOR HUMAN APPROVAL ---")
-    
+    # Runs again from the top on resume, when interrupt returns the approved questions
     resume_data = interrupt({"research_questions": state["research_questions"]})
-    
-    return {
-        "research_questions": resume_data["research_questions"],
-        "task_id": resume_data["task_id"]
-    }
+    questions = resume_data["research_questions"]
+
+    # Questions the user removed are dropped, so nothing found for them reaches the report
+    findings = {q: list((state.get("findings") or {}).get(q, [])) for q in questions}
+    sources = {q: list((state.get("sources") or {}).get(q, [])) for q in questions}
+    update = {"research_questions": questions, "task_id": resume_data["task_id"], "findings": findings, "sources": sources}
 
-def researcher_node(state: GraphState) -> GraphState:
+    # Research done ahead during the pause is taken over, in question order, while the budget allows.
+    # What it cost is charged to the task, except its time, which was spent waiting for approval.
+    speculative = resume_data.get("speculative") or {}
+    taken = 0
+    if speculative:
+        budget = TaskBudget(state)
+        for question in questions:
+            result = speculative.get(question)
+            if result is None or findings[question]:
+                continue
+            # Nothing is charged for a result that does not fit in what is left
+            tool_calls_left, tokens_left = budget.remaining_tool_calls(), budget.remaining_tokens(with_reserve=True)
+            if (budget.exhausted(with_reserve=True) or (tool_calls_left is not None and tool_calls_left < result["tool_calls"])
+                    or (tokens_left is not None and tokens_left < result["tokens"])):
+                break
+            budget.tool_calls += result["tool_calls"]
+            budget.meter.tokens += result["tokens"]
+            findings[question], sources[question] = result["findings"], result["sources"]
+            taken += 1
+        budget.save(update)
+    log.info("approved", questions=len(questions), researched_ahead=taken)
+    return update
+
+async def _research_question(question: str, tool_map: Dict, task_slots: asyncio.Semaphore, agents: Agents,
+                             budget: TaskBudget, writer: StreamWriter) -> Optional[Tuple[List[str], List[dict]]]:
+    """
+    Routes a single question to a tool and fetches its documents, unless a similar question was
+    researched recently enough by an earlier task, whose findings are then reused.
+    Returns the findings and sources for that question, or None when the task's budget ran out first.
+    """
+    if findings_index is not None:
+        indexed = await asyncio.to_thread(findings_index.get, question)
+        if metrics is not None:
+            metrics.cache_lookups.inc("findings_index", "hit" if indexed is not None else "miss")
+        if indexed is not None:
+            log.info("question_reused", question=question, indexed_question=indexed.question, tool=indexed.tool,
+                     similarity=indexed.similarity, age_seconds=indexed.age_seconds)
+            writer({
+                "event": "question_researched",
+                "question": question,
+                "tool": indexed.tool,
+                "routing": "findings_index",
+                "routing_confidence": indexed.similarity,
+                "results": len(indexed.findings),
+            })
+            return indexed.findings, indexed.sources
+
+    async with task_slots, _global_research_slots:
+        reason = budget.exhausted(with_reserve=True)
+        if reason is None and not budget.take_tool_call():
+            reason = "tool calls"
+        if reason is not None:
+            log.info("question_skipped", question=question, reason=f"out of {reason} budget")
+            budget.cut_short(reason)
+            return None
+        decision = route_question(question)
+        if decision.confidence < settings.ROUTER_CONFIDENCE_THRESHOLD:
+            # Not sure enough: ask the LLM, and keep the local guess if its answer names no tool
+            raw_answer = await agents.tool_router.ainvoke({"question": question})
+            decision = parse_llm_route(raw_answer, decision)
+        tool_name = decision.tool_name
+        log.info("route_decision", question=question, tool=tool_name, method=decision.method,
+                 confidence=round(decision.confidence, 3))
+
+        if tool_name not in tool_map:
+            return [f"Error: Tool '{tool_name}' is not available."], []
+
+        documents = await tool_map[tool_name].ainvoke({"query": question})
+        # Progress for clients following the task's event stream
+        writer({
+            "event": "question_researched",
+            "question": question,
+            "tool": tool_name,
+            "routing": decision.method,
+            "routing_confidence": round(decision.confidence, 3),
+            "results": len(documents),
+        })
+        findings, sources = [doc.page_content for doc in documents], [doc.metadata for doc in documents]
+        # Failed and empty searches are not worth reusing
+        if findings_index is not None and not all(is_low_value(finding) for finding in findings):
+            await asyncio.to_thread(findings_index.put, question, tool_name, findings, sources)
+        return findings, sources
+
+async def researcher_node(state: GraphState) -> GraphState:
     """
     For each research question, route to the best tool and execute it.
+    Questions are researched concurrently, so the node takes about as long as the slowest question.
     """
-    task_id = state.get('task_id', 'UNKNOWN')
-    print(f"--- [Task: {task_id}] --- 🔍 RUNNING RESEARCHER ---")
-    
     questions = state["research_questions"]
     tool_map = {tool.name: tool for tool in available_tools}
     
@@ -64,67 +165,269 @@ def researcher_node(state: GraphState) -> GraphState:
         state["findings"].setdefault(q, [])
         state["sources"].setdefault(q, [])
 
+    pending = []
     for question in questions:
         if state["findings"][question]:
-            print(f"--- ❓ SKIPPING QUESTION (already researched): {question} ---")
+            log.debug("question_skipped", question=question, reason="already researched")
             continue
+        if question not in pending:
+            pending.append(question)
 
-        print(f"--- ❓ RESEARCHING QUESTION: {question} ---")
-        tool_name = tool_router.invoke({"question": question}).strip()
-        print(f"--- 🛠️ Selected Tool: {tool_name} ---")
+    task_slots = asyncio.Semaphore(settings.RESEARCH_TASK_CONCURRENCY)
+    agents = await llm_registry.afor_task(state)
+    writer = get_stream_writer()
+    with TaskBudget(state) as budget:
+        tasks = [
+            asyncio.ensure_future(_research_question(question, tool_map, task_slots, agents, budget, writer))
+            for question in pending
+        ]
+        if tasks:
+            # Questions still running when the research share of the time budget is spent are abandoned
+            _, late = await asyncio.wait(tasks, timeout=budget.remaining_seconds(with_reserve=True))
+            for task in late:
+                task.cancel()
+            await asyncio.gather(*late, return_exceptions=True)
+            if late:
+                budget.cut_short("time")
 
-        if tool_name in tool_map:
-            tool_to_call = tool_map[tool_name]
-            documents = tool_to_call.invoke({"query": question})
-            for doc in documents:
-                state["findings"][question].append(doc.page_content)
-                state["sources"][question].append(doc.metadata)
-        else:
-            state["findings"][question].append(f"Error: Tool '{tool_name}' not found.")
+    # Merge in question order, so the result is deterministic regardless of completion order
+    skipped = []
+    for question, task in zip(pending, tasks):
+        result = None if task.cancelled() else task.result()
+        if result is None:
+            skipped.append(question)
+            continue
+        findings, sources = result
+        state["findings"][question].extend(findings)
+        state["sources"][question].extend(sources)
 
-    print("--- ✅ ALL RESEARCH COMPLETE ---")
+    state["skipped_questions"] = skipped
+    budget.save(state)
+    if skipped:
+        log.warning("budget_exhausted", reason=budget.exhausted_by, skipped=len(skipped), questions=len(pending))
+        get_stream_writer()({"event": "budget_exhausted", "reason": budget.exhausted_by, "skipped_questions": skipped})
     return state
 
-def summarize_node(state: GraphState) -> GraphState:
+async def research_ahead(question: str, state: GraphState, task_slots: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+    """
+    Researches one of the planned questions while the task waits for approval (see app/workflow/speculation.py).
+    Returns its findings and sources, and the tool calls and tokens they cost, for human_approval_node
+    to take over; None when nothing worth keeping was found.
+    """
+    agents = await llm_registry.afor_task(state)
+    tool_map = {tool.name: tool for tool in available_tools}
+    with TaskBudget(state) as budget:
+        tool_calls_before = budget.tool_calls
+        # Nobody follows the event stream of a task that is waiting for approval
+        result = await _research_question(question, tool_map, task_slots, agents, budget, writer=lambda chunk: None)
+    if result is None or all(is_low_value(finding) for finding in result[0]):
+        return None
+    return {"findings": result[0], "sources": result[1],
+            "tool_calls": budget.tool_calls - tool_calls_before, "tokens": budget.meter.tokens}
+
+async def dedup_node(state: GraphState) -> GraphState:
+    """
+    Removes findings that repeat earlier ones, within and across questions,
+    so the summarizer does not pay for the same text twice.
+    """
+    if not settings.DEDUP_ENABLED:
+        return state
+
+    findings, sources, stats = await asyncio.to_thread(
+        dedupe_findings,
+        state['findings'],
+        state['sources'],
+        threshold=settings.DEDUP_SIMILARITY_THRESHOLD,
+        num_perm=settings.DEDUP_NUM_PERM,
+        bands=settings.DEDUP_BANDS,
+        shingle_size=settings.DEDUP_SHINGLE_SIZE,
+    )
+    state["findings"], state["sources"] = findings, sources
+    state["dedup_stats"] = stats.as_dict()
+    log.info("deduplicated", **state["dedup_stats"])
+    get_stream_writer()({"event": "deduplicated", **state["dedup_stats"]})
+    return state
+
+def _chunk_text(chunk) -> str:
+    """Returns the text of a streamed message chunk, whose content may be a string or a list of parts."""
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in content
+        if isinstance(part, (str, dict))
+    )
+
+async def _stream_report(agent, inputs: Dict[str, Any], timings: Dict[str, float], started: float,
+                         budget: TaskBudget) -> str:
+    """
+    Streams a report-writing agent, forwarding each token to clients. Returns the full text,
+    or the text written so far when the task's time budget runs out.
+    """
+    writer = get_stream_writer()
+    report_parts = []
+
+    async def consume():
+        async for chunk in agent.astream(inputs):
+            text = _chunk_text(chunk)
+            if text:
+                if not report_parts:
+                    timings["first_token_seconds"] = round(time.perf_counter() - started, 3)
+                report_parts.append(text)
+                writer({"event": "report_token", "text": text})
+
+    try:
+        await asyncio.wait_for(consume(), timeout=budget.remaining_seconds())
+    except asyncio.TimeoutError:
+        log.warning("report_cut_short", reason="time", chars=sum(len(part) for part in report_parts))
+        budget.cut_short("time")
+    return "".join(report_parts)
+
+async def _condense_question(question: str, findings: List[str], sources: List[dict], numbers: Dict[str, int],
+                             map_slots: asyncio.Semaphore, agents: Agents) -> Optional[str]:
+    """
+    Map step: condenses one question's findings into a mini-summary that cites the run-wide footnotes.
+    Returns None when the question has no usable findings or the call fails.
+    """
+    async with map_slots:
+        max_words = settings.SUMMARIZER_MAP_SUMMARY_WORDS
+        prompt_tokens = count_tokens(condenser_prompt.format(context="", question=question, max_words=max_words))
+        budget = context_budget(agents.provider, prompt_tokens)
+        context, _ = await asyncio.to_thread(
+            pack_context, {question: findings}, {question: sources}, budget, footnote_renderer(numbers)
+        )
+        if not context:
+            return None
+        try:
+            summary = await agents.condenser_agent.ainvoke({"context": context, "question": question, "max_words": max_words})
+        except Exception as e:
+            log.warning("condense_failed", question=question, error=str(e))
+            return None
+        get_stream_writer()({"event": "question_condensed", "question": question})
+        return summary.strip()
+
+async def _map_reduce_report(state: GraphState, agents: Agents, timings: Dict[str, float], budget: TaskBudget) -> str:
+    """
+    Condenses every question in parallel, then merges the mini-summaries into the report.
+    The citations section is built from the footnote numbers, so they survive both stages.
+    """
+    numbers = number_sources(state['findings'], state['sources'])
+    map_slots = asyncio.Semaphore(settings.SUMMARIZER_MAP_CONCURRENCY)
+    questions = list(state['findings'])
+
+    started = time.perf_counter()
+    tasks = [
+        asyncio.ensure_future(_condense_question(
+            q, state['findings'][q], state['sources'].get(q, []), numbers, map_slots, agents
+        ))
+        for q in questions
+    ]
+    # With a time budget, half of what is left goes to the map step and the rest to the reduce step
+    map_timeout = budget.remaining_seconds()
+    _, late = await asyncio.wait(tasks, timeout=map_timeout / 2 if map_timeout is not None else None)
+    for task in late:
+        task.cancel()
+    await asyncio.gather(*late, return_exceptions=True)
+    if late:
+        budget.cut_short("time")
+    summaries = [None if task.cancelled() else task.result() for task in tasks]
+    timings["map_seconds"] = round(time.perf_counter() - started, 3)
+    condensed = {q: [summary] for q, summary in zip(questions, summaries) if summary}
+    log.info("map_step", condensed=len(condensed), questions=len(questions), seconds=timings["map_seconds"])
+    if not condensed:
+        raise RuntimeError("No research question could be condensed.")
+
+    started = time.perf_counter()
+    prompt_tokens = count_tokens(reducer_prompt.format(context="", query=state["original_query"]))
+    budget_tokens = context_budget(agents.provider, prompt_tokens)
+    context, _ = await asyncio.to_thread(pack_context, condensed, {}, budget_tokens, lambda text, info: f"{text}\n\n")
+    report = await _stream_report(agents.reducer_agent, {"context": context, "query": state["original_query"]},
+                                  timings, started, budget)
+    citations = citations_section(report, numbers)
+    if citations:
+        get_stream_writer()({"event": "report_token", "text": citations})
+    timings["reduce_seconds"] = round(time.perf_counter() - started, 3)
+    return report + citations
+
+async def summarize_node(state: GraphState) -> GraphState:
     """
     Synthesizes the findings and sources into a final report.
-    This is an instrumented version for deep debugging.
+    Large runs are summarized map-reduce style: per question first, then merged.
+    A task whose budget ran out gets a report of what was found, with a note saying it was cut short.
     """
-    task_id = state.get('task_id', 'UNKNOWN')
-    print(f"--- [Task: {task_id}] --- ✍️ RUNNING SUMMARIZER ---")
+    get_stream_writer()({"event": "summarizing"})
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
 
+    with TaskBudget(state) as budget:
+        state["final_report"] = await _summarize(state, budget, timings, started)
+        budget.save(state)
+    note = budget_note(state)
+    if note:
+        get_stream_writer()({"event": "report_token", "text": note})
+        state["final_report"] += note
+    return state
+
+async def _summarize(state: GraphState, budget: TaskBudget, timings: Dict[str, float], started: float) -> str:
+    """Writes the report within what is left of the task's budget. Returns the report text."""
     try:
-        print("1. Building context for summarizer...")
-        context = ""
-        for i, (question, findings) in enumerate(state['findings'].items()):
-            context += f"Research Question {i+1}: {question}\n\n"
-            for j, finding in enumerate(findings):
-                if j < len(state['sources'][question]):
-                    source_info = state['sources'][question][j]
-                    source = source_info.get('source') or source_info.get('Title')
-                    context += f"Finding: {finding}\nSource: {source}\n\n"
-                else:
-                    context += f"Finding: {finding}\nSource: Not available\n\n"
-            context += "---\n\n"
-        
-        print(f"2. Context built. Total length: {len(context)} characters.")
-        print("3. Invoking summarizer agent...")
+        agents = await llm_registry.afor_task(state)
+        prompt_tokens = count_tokens(summarizer_prompt.format(context="", query=state["original_query"]))
+        budget_tokens = context_budget(agents.provider, prompt_tokens)
+        # What is left of the task's token budget caps the context too
+        remaining_tokens = budget.remaining_tokens()
+        token_limited = remaining_tokens is not None and (
+            remaining_tokens - prompt_tokens - settings.SUMMARIZER_OUTPUT_TOKENS < budget_tokens
+        )
+        if token_limited:
+            budget_tokens = max(0, remaining_tokens - prompt_tokens - settings.SUMMARIZER_OUTPUT_TOKENS)
+            if not budget_tokens:
+                budget.cut_short("tokens")
+                return "The task ran out of its token budget before the report could be written."
+        # Token counting is CPU-bound on large runs, so keep it off the event loop
+        context, context_stats = await asyncio.to_thread(pack_context, state['findings'], state['sources'], budget_tokens)
+        state["context_stats"] = context_stats.as_dict()
+        timings["pack_seconds"] = round(time.perf_counter() - started, 3)
 
-        report = summarizer_agent.invoke({
-            "context": context,
-            "query": state["original_query"]
+        log.info("context_packed", **{k: v for k, v in state["context_stats"].items() if k != "per_question"})
+        get_stream_writer()({
+            "event": "context_packed",
+            **{k: v for k, v in state["context_stats"].items() if k != "per_question"},
         })
-        
-        print("4. Summarizer agent finished successfully.")
-        state["final_report"] = report.content
-        return state
+        if not context_stats.findings_packed and not context_stats.findings_truncated:
+            return "No usable research material was found, or none fits the model's context window."
+        if token_limited and context_stats.tokens_dropped:
+            budget.cut_short("tokens")
+
+        mode = settings.SUMMARIZER_MODE
+        if token_limited:
+            # Map-reduce reads every finding twice, so it does not fit a task that is short of tokens
+            mode = "single"
+        elif mode == "auto":
+            too_large = context_stats.packed_tokens > settings.SUMMARIZER_MAP_REDUCE_THRESHOLD_TOKENS
+            mode = "map_reduce" if too_large or context_stats.tokens_dropped else "single"
+
+        if mode == "map_reduce":
+            report = await _map_reduce_report(state, agents, timings, budget)
+        else:
+            # Stream the report so clients can show it while it is being written
+            summarize_started = time.perf_counter()
+            report = await _stream_report(agents.summarizer_agent, {
+                "context": context,
+                "query": state["original_query"]
+            }, timings, summarize_started, budget)
+            timings["summarize_seconds"] = round(time.perf_counter() - summarize_started, 3)
+
+        timings["total_seconds"] = round(time.perf_counter() - started, 3)
+        state["summary_stats"] = {"mode": mode, "timings": timings}
+        get_stream_writer()({"event": "summarized", "mode": mode, "timings": timings})
+        log.info("summarized", mode=mode, report_chars=len(report), **timings)
+        return report
 
     except Exception as e:
-        print(f"\n---  FATAL ERROR in summarize_node: {e} ---\n")
-        import traceback
-        traceback.print_exc()
-        state["final_report"] = "Error during summarization. The research material may have been too long for the language model to process."
-        return state
+        log.exception("summarize_failed", error=str(e))
+        return "Error during summarization. The research material may have been too long for the language model to process."
 
 
 workflow = StateGraph(GraphState)
@@ -132,13 +435,15 @@ workflow = StateGraph(GraphState)
 workflow.add_node("planner", planner_node)
 workflow.add_node("human_approval", human_approval_node)
 workflow.add_node("researcher", researcher_node)
+workflow.add_node("dedup", dedup_node)
 workflow.add_node("summarizer", summarize_node)
 
 workflow.set_entry_point("planner")
 
 workflow.add_edge("planner", "human_approval")
 workflow.add_edge("human_approval", "researcher")
-workflow.add_edge("researcher", "summarizer")
+workflow.add_edge("researcher", "dedup")
+workflow.add_edge("dedup", "summarizer")
 workflow.add_edge("summarizer", END)
 
 # research_workflow = workflow.compile()
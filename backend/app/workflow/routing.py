@@ -0,0 +1,189 @@
+"""
+Local, deterministic tool routing for research questions.
+
+Questions are scored by keyword patterns and a small naive Bayes classifier trained on
+built-in examples. Confident decisions skip the LLM router entirely; for the rest,
+the LLM's free-text answer is validated against the known tool names.
+"""
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+TOOL_NAMES = ("web_search", "wikipedia_search", "arxiv_search")
+
+
+@dataclass
+class RouteDecision:
+    """The tool chosen for a question, how sure the router is, and which stage decided."""
+    tool_name: str
+    confidence: float
+    method: str  # 'local', 'llm' or 'fallback'
+
+
+# Pattern boosts, added to the classifier's log-probabilities
+_PATTERNS: Dict[str, List[Tuple[re.Pattern, float]]] = {
+    "arxiv_search": [
+        (re.compile(r"\b(arxiv|preprints?|papers?|peer[- ]reviewed|publications?)\b"), 3.0),
+        (re.compile(r"\b(state[- ]of[- ]the[- ]art|sota|benchmarks?|ablation|theorem|proofs?)\b"), 2.0),
+        (re.compile(r"\b(neural|transformers?|diffusion models?|reinforcement learning|machine learning|deep learning|"
+                    r"llms?|large language models?|embeddings?|quantum|algorithms?|optimization|architectures?)\b"), 1.5),
+        (re.compile(r"\b(recent|latest) (research|advances|studies|work)\b"), 1.5),
+    ],
+    "web_search": [
+        (re.compile(r"\b(price|prices|cost|costs|cheapest|buy|deal|deals|discount|under \$?\d+|lakh|rupees|usd|\$\d+)\b"), 3.0),
+        (re.compile(r"\b(reviews?|ratings?|specs|specifications|vs\.?|versus|compare|comparison|best)\b"), 2.0),
+        (re.compile(r"\b(news|today|this week|this year|current|currently|latest|upcoming|release date|launch|launched|announced)\b"), 2.0),
+        (re.compile(r"\b(20[2-9]\d)\b"), 1.5),
+        (re.compile(r"\b(stock|weather|schedule|tickets|near me|how to install|download)\b"), 2.0),
+    ],
+    "wikipedia_search": [
+        (re.compile(r"^(who|when) (was|were|did|is)\b"), 3.0),
+        (re.compile(r"\b(history of|origins? of|biography|born|died|founded|invented|dynasty|empire|war|ancient|century)\b"), 2.0),
+        (re.compile(r"^what (is|are|was|were) (a |an |the )?\w+( \w+)?\??$"), 2.0),
+        (re.compile(r"\b(definition|define|meaning of|capital of|population of|located|geography)\b"), 2.0),
+    ],
+}
+
+# Seed examples for the naive Bayes classifier
+_TRAINING_EXAMPLES: Dict[str, List[str]] = {
+    "web_search": [
+        "What are the specs of the new ASUS ROG laptop?",
+        "What are user reviews for the Dell XPS 15?",
+        "What is the current price of Bitcoin?",
+        "Best budget smartphones to buy this year",
+        "Which streaming services have the most subscribers today?",
+        "Latest news about the electric vehicle market",
+        "How much does a Tesla Model 3 cost in India?",
+        "Compare iPhone and Pixel camera quality",
+        "What are the top rated restaurants in Bangalore?",
+        "When is the release date of the next PlayStation?",
+        "What companies announced layoffs this month?",
+        "How do customers rate the Sony WH-1000XM5 headphones?",
+        "What are the current mortgage interest rates?",
+        "Which cloud provider offers the cheapest GPU instances?",
+        "What are the system requirements for the latest Windows update?",
+        "Upcoming tech conferences and events",
+        "What is the market share of Android versus iOS?",
+        "Best gaming laptops under one lakh rupees",
+    ],
+    "wikipedia_search": [
+        "Who was the first emperor of Rome?",
+        "What is photosynthesis?",
+        "History of the Ottoman Empire",
+        "Who invented the telephone?",
+        "What is the capital of Australia?",
+        "When did World War II end?",
+        "Biography of Marie Curie",
+        "What is the theory of evolution?",
+        "Where is Mount Kilimanjaro located?",
+        "What was the Industrial Revolution?",
+        "Who founded the Mughal dynasty?",
+        "What are the main causes of the French Revolution?",
+        "What is the definition of democracy?",
+        "Who wrote Pride and Prejudice?",
+        "What is the population of Japan?",
+        "Origins of the Olympic Games",
+        "What is a black hole?",
+        "Who was Mahatma Gandhi?",
+    ],
+    "arxiv_search": [
+        "What are recent papers on transformer model optimization?",
+        "State of the art methods for image segmentation",
+        "Recent research on diffusion models for video generation",
+        "Papers about reinforcement learning from human feedback",
+        "How do sparse attention mechanisms reduce transformer complexity?",
+        "Latest advances in quantum error correction",
+        "Benchmarks for large language model reasoning",
+        "Techniques for federated learning with differential privacy",
+        "What are graph neural network architectures for molecules?",
+        "Research on retrieval augmented generation evaluation",
+        "Studies on scaling laws for neural language models",
+        "Novel algorithms for approximate nearest neighbor search",
+        "Preprints on protein structure prediction with deep learning",
+        "Methods for mitigating hallucination in LLMs",
+        "Theoretical analysis of stochastic gradient descent convergence",
+        "Recent work on gravitational wave detection",
+        "Contrastive learning approaches for representation learning",
+        "Efficient fine-tuning methods such as LoRA",
+    ],
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _features(text: str) -> List[str]:
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+class _NaiveBayes:
+    """A multinomial naive Bayes over word unigrams and bigrams with Laplace smoothing."""
+
+    def __init__(self, examples: Dict[str, List[str]]):
+        self.labels = list(examples)
+        counts = {label: Counter(f for text in texts for f in _features(text)) for label, texts in examples.items()}
+        vocabulary = set().union(*counts.values())
+        total_examples = sum(len(texts) for texts in examples.values())
+        self.log_priors = {label: math.log(len(texts) / total_examples) for label, texts in examples.items()}
+        self.log_likelihoods: Dict[str, Dict[str, float]] = {}
+        self.log_unseen: Dict[str, float] = {}
+        for label, counter in counts.items():
+            denominator = sum(counter.values()) + len(vocabulary) + 1
+            self.log_likelihoods[label] = {f: math.log((c + 1) / denominator) for f, c in counter.items()}
+            self.log_unseen[label] = math.log(1 / denominator)
+        self.vocabulary = vocabulary
+
+    def log_scores(self, text: str) -> Dict[str, float]:
+        # Features never seen in training carry no signal, so they are skipped
+        features = [f for f in _features(text) if f in self.vocabulary]
+        return {
+            label: self.log_priors[label] + sum(
+                self.log_likelihoods[label].get(f, self.log_unseen[label]) for f in features
+            )
+            for label in self.labels
+        }
+
+
+_classifier = _NaiveBayes(_TRAINING_EXAMPLES)
+
+
+def route_question(question: str) -> RouteDecision:
+    """
+    Picks a tool for the question without any network call.
+    The confidence is the softmax probability of the chosen tool.
+    """
+    normalized = " ".join(question.lower().split())
+    scores = _classifier.log_scores(normalized)
+    for tool_name, patterns in _PATTERNS.items():
+        for pattern, boost in patterns:
+            if pattern.search(normalized):
+                scores[tool_name] += boost
+
+    best = max(scores, key=scores.get)
+    total = sum(math.exp(score - scores[best]) for score in scores.values())
+    return RouteDecision(tool_name=best, confidence=1 / total, method="local")
+
+
+_ALIASES = (
+    ("wikipedia", "wikipedia_search"),
+    ("arxiv", "arxiv_search"),
+    ("tavily", "web_search"),
+    ("web", "web_search"),
+)
+
+
+def parse_llm_route(text: str, fallback: RouteDecision) -> RouteDecision:
+    """
+    Validates the LLM router's free-text answer (e.g. '`arxiv_search`' or 'Tool: Wikipedia').
+    Falls back to the local decision when the answer names no known tool.
+    """
+    answer = text.strip().lower()
+    for tool_name in TOOL_NAMES:
+        if tool_name in answer:
+            return RouteDecision(tool_name=tool_name, confidence=1.0, method="llm")
+    for alias, tool_name in _ALIASES:
+        if alias in answer:
+            return RouteDecision(tool_name=tool_name, confidence=1.0, method="llm")
+    return RouteDecision(tool_name=fallback.tool_name, confidence=fallback.confidence, method="fallback")
@@ -0,0 +1,64 @@
+"""
+Runs the research graph and forwards its progress to an event sink.
+Shared by the API process and the worker processes.
+"""
+import time
+from typing import Any, Dict, Protocol
+
+from app.models.llm_registry import llm_registry
+from app.utils.config import settings
+from app.utils.logs import get_logger
+from app.utils.tracing import get_langfuse_handler
+from app.workflow.context import count_tokens
+
+log = get_logger(__name__)
+
+
+class EventSink(Protocol):
+    """Where task progress goes: the in-process event bus, or the event log read by the API."""
+
+    def publish(self, task_id: str, event: str, data: Dict[str, Any] = None): ...
+
+    def append_report(self, task_id: str, text: str): ...
+
+
+async def run_graph(graph, task_id: str, graph_input: Any, config: dict, events: EventSink) -> Dict[str, Any]:
+    """
+    Runs the graph until it finishes or pauses at the approval step, publishing node
+    transitions and node progress to `events`. Returns the latest state.
+    """
+    state_values: Dict[str, Any] = {}
+    async for mode, chunk in graph.astream(graph_input, config, stream_mode=["updates", "custom", "values"]):
+        if mode == "values":
+            state_values = chunk
+        elif mode == "custom":
+            data = dict(chunk)
+            event = data.pop("event")
+            if event == "report_token":
+                events.append_report(task_id, data["text"])
+            else:
+                events.publish(task_id, event, data)
+        else:
+            for node_name, update in chunk.items():
+                if node_name == "__interrupt__":
+                    events.publish(task_id, "awaiting_input", {
+                        "research_questions": update[0].value.get("research_questions")
+                    })
+                elif node_name == "planner":
+                    events.publish(task_id, "planned", {"research_questions": update.get("research_questions")})
+                elif node_name == "researcher":
+                    events.publish(task_id, "research_complete")
+    return state_values
+
+
+def warm_up():
+    """
+    Does the slow first-use work before the first task needs it: imports the configured
+    provider's SDK and builds its client and chains, and loads the tokenizer and the tracing
+    handler. Blocks, so callers run it in a thread.
+    """
+    started = time.perf_counter()
+    llm_registry.get()
+    count_tokens("warm-up")
+    get_langfuse_handler()
+    log.info("warmed_up", provider=settings.LLM_PROVIDER, seconds=round(time.perf_counter() - started, 3))
@@ -0,0 +1,133 @@
+"""
+Speculative research while a task waits for the user to approve its plan.
+
+Most plans are approved unchanged or nearly so, so the planned questions are researched during the
+pause. On resume, the questions the user removed are cancelled and discarded, and the results of
+the ones they kept are handed to the graph with the resume value; human_approval_node takes them
+over and the researcher skips those questions. Edited questions are researched again, though the
+findings index (when enabled) often answers them from the speculative results.
+
+Speculation runs in the API process, which serves /research. Kept questions still being researched
+are waited for on resume, inline or before the job is queued for a worker; those still queued for a
+slot are cancelled, since the researcher starts them sooner.
+"""
+import asyncio
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+
+from langchain_core.runnables import RunnableLambda
+
+from app.models.schemas import GraphState
+from app.utils.config import settings
+from app.utils.logs import get_logger
+from app.utils.tracing import get_run_callbacks
+from app.workflow.graph import research_ahead
+
+log = get_logger(__name__)
+
+
+class Speculation:
+    """The research started ahead for each task waiting for approval, one asyncio task per question."""
+
+    def __init__(self, concurrency: int, wait_seconds: float, ttl_seconds: float):
+        self.wait_seconds = wait_seconds
+        self.ttl_seconds = ttl_seconds
+        # Shared by every task, so speculation never takes more than its share of the research slots
+        self._slots = asyncio.Semaphore(concurrency)
+        self._runs: Dict[str, Dict[str, asyncio.Task]] = {}
+        # The questions of each task that got a slot, as opposed to those still queued for one
+        self._running: Dict[str, Set[str]] = {}
+        self._expiry: Dict[str, asyncio.TimerHandle] = {}
+        self.counts: Counter = Counter()
+
+    def start(self, task_id: str, state: GraphState):
+        """Starts researching the planned questions of a task that has paused for approval."""
+        questions = list(dict.fromkeys(state.get("research_questions") or []))
+        if task_id in self._runs or not questions:
+            return
+        task_slots = asyncio.Semaphore(settings.RESEARCH_TASK_CONCURRENCY)
+        running = self._running[task_id] = set()
+
+        async def research(question: str) -> Optional[Dict[str, Any]]:
+            async with self._slots:
+                running.add(question)
+                return await research_ahead(question, state, task_slots)
+
+        # Run under the task's thread id, so logs, spans and metrics are attributed to it
+        config = {"configurable": {"thread_id": task_id}, "callbacks": get_run_callbacks(),
+                  "run_name": "speculative_research"}
+        runnable = RunnableLambda(research)
+        run = {question: asyncio.ensure_future(runnable.ainvoke(question, config)) for question in questions}
+        for task in run.values():
+            task.add_done_callback(self._log_failure)
+        self._runs[task_id] = run
+        self._expiry[task_id] = asyncio.get_running_loop().call_later(self.ttl_seconds, self._expire, task_id)
+        self.counts["started"] += len(questions)
+        log.info("speculation_started", task_id=task_id, questions=len(questions))
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("speculation_failed", error=f"{type(task.exception()).__name__}: {task.exception()}")
+
+    def _expire(self, task_id: str):
+        """Drops the research of a task that was not resumed in time."""
+        self._expiry.pop(task_id, None)
+        run = self._runs.pop(task_id, None) or {}
+        self._running.pop(task_id, None)
+        for task in run.values():
+            task.cancel()
+        self.counts["expired"] += len(run)
+        log.info("speculation_expired", task_id=task_id, questions=len(run))
+
+    async def collect(self, task_id: str, questions: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Ends a task's speculation: cancels the questions the user removed and returns the results of
+        those they kept. Kept questions already running get up to `wait_seconds` to finish; those
+        still queued for a slot are left to the researcher, which starts them at once.
+        """
+        handle = self._expiry.pop(task_id, None)
+        if handle is not None:
+            handle.cancel()
+        run = self._runs.pop(task_id, None)
+        running = self._running.pop(task_id, set())
+        if not run:
+            return {}
+        kept = set(questions)
+        for question, task in run.items():
+            if question not in kept:
+                task.cancel()
+        pending = [task for question, task in run.items() if question in kept & running and not task.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=self.wait_seconds)
+
+        results, outcome = {}, Counter()
+        for question, task in run.items():
+            if question not in kept:
+                outcome["discarded"] += 1
+            elif not task.done():
+                task.cancel()
+                outcome["cancelled"] += 1
+            elif task.cancelled() or task.exception() is not None or task.result() is None:
+                outcome["empty"] += 1
+            else:
+                results[question] = task.result()
+                outcome["kept"] += 1
+        self.counts.update(outcome)
+        log.info("speculation_collected", task_id=task_id, questions=len(questions), **outcome)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "waiting_tasks": len(self._runs),
+            "questions": dict(self.counts),
+        }
+
+
+speculation: Optional[Speculation] = None
+if settings.SPECULATIVE_RESEARCH_ENABLED:
+    speculation = Speculation(
+        settings.SPECULATIVE_RESEARCH_CONCURRENCY,
+        wait_seconds=settings.SPECULATIVE_RESEARCH_WAIT_SECONDS,
+        ttl_seconds=settings.SPECULATIVE_RESEARCH_TTL_SECONDS,
+    )
@@ -0,0 +1,151 @@
+"""
+Benchmark: a burst of research tasks against a rate-limited LLM provider, with and without admission control.
+
+The simulated provider serves --provider-rps requests per second (over a sliding one-second
+window) and answers 429 beyond that. Like the chat model clients, callers retry a 429 twice
+with backoff and then fail the task. Each task makes --calls-per-task sequential LLM calls.
+
+Without admission control every task starts at once, so most calls hit 429s and tasks fail
+after burning their retries. With it, calls go through the provider's token bucket and tasks
+through a bounded run queue: admitted tasks finish, and the overflow is rejected straight
+away with a Retry-After instead of failing late.
+
+Run from the backend directory:
+    python extras/bench_admission.py --tasks 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for key in ("GROQ_API_KEY", "TAVILY_API_KEY", "LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY", "LANGFUSE_HOST"):
+    os.environ.setdefault(key, "benchmark")
+
+from app.utils.admission import QueueFullError, RunQueue, TokenBucket
+
+
+class RateLimited(Exception):
+    pass
+
+
+class Provider:
+    """Answers in --latency-ms, or raises RateLimited past --provider-rps."""
+
+    def __init__(self, rps: int, latency: float):
+        self.rps = rps
+        self.latency = latency
+        self._recent = deque()
+        self.calls = 0
+        self.rejected = 0
+
+    async def complete(self):
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        self.calls += 1
+        if len(self._recent) >= self.rps:
+            self.rejected += 1
+            await asyncio.sleep(0.02)
+            raise RateLimited()
+        self._recent.append(now)
+        await asyncio.sleep(self.latency)
+
+
+async def llm_call(provider: Provider, limiter=None):
+    for attempt in range(3):
+        if limiter is not None:
+            await limiter.aacquire()
+        try:
+            return await provider.complete()
+        except RateLimited:
+            if attempt == 2:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+
+async def run_task(provider, calls, limiter=None):
+    for _ in range(calls):
+        await llm_call(provider, limiter)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(name, provider, ok, failed, rejected, latencies, reject_latencies, wall):
+    ok_ms = [x * 1000 for x in latencies] or [0]
+    rej_ms = statistics.mean(reject_latencies) * 1000 if reject_latencies else 0
+    print(f"{name:<22} {ok:>5} {failed:>7} {rejected:>9} {statistics.median(ok_ms):>8.0f} "
+          f"{percentile(ok_ms, 99):>8.0f} {rej_ms:>10.2f} {provider.rejected:>10} {wall:>7.1f}")
+
+
+async def without_admission(args):
+    provider = Provider(args.provider_rps, args.latency_ms / 1000)
+    latencies, failed = [], 0
+
+    async def one():
+        nonlocal failed
+        started = time.perf_counter()
+        try:
+            await run_task(provider, args.calls_per_task)
+            latencies.append(time.perf_counter() - started)
+        except RateLimited:
+            failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.tasks)))
+    report("no admission control", provider, len(latencies), failed, 0, latencies, [], time.perf_counter() - started)
+
+
+async def with_admission(args):
+    provider = Provider(args.provider_rps, args.latency_ms / 1000)
+    limiter = TokenBucket("provider", rate=args.provider_rps * 0.9, burst=max(1, args.provider_rps // 2))
+    queue = RunQueue("bench", max_running=args.max_running, max_queued=args.max_queued)
+    latencies, reject_latencies, failed, rejected = [], [], 0, 0
+
+    async def one(i):
+        nonlocal failed, rejected
+        started = time.perf_counter()
+        try:
+            queue.reserve(str(i))
+        except QueueFullError:
+            rejected += 1
+            reject_latencies.append(time.perf_counter() - started)
+            return
+        try:
+            async with queue.slot(str(i)):
+                await run_task(provider, args.calls_per_task, limiter)
+            latencies.append(time.perf_counter() - started)
+        except RateLimited:
+            failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.tasks)))
+    report("admission control", provider, len(latencies), failed, rejected, latencies, reject_latencies,
+           time.perf_counter() - started)
+    print(f"  queue: {queue.stats()}")
+    print(f"  limiter: {limiter.stats()}")
+
+
+async def main_async(args):
+    print(f"{'mode':<22} {'ok':>5} {'failed':>7} {'rejected':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'reject ms':>10} {'prov 429s':>10} {'wall s':>7}")
+    await without_admission(args)
+    await with_admission(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--calls-per-task", type=int, default=3)
+    parser.add_argument("--provider-rps", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--max-running", type=int, default=8)
+    parser.add_argument("--max-queued", type=int, default=64)
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""
+Benchmark: checkpoint write and read latency of the durable SQLite saver against InMemorySaver.
+
+Each iteration writes one checkpoint plus its pending writes, the way one graph
+super-step does, and then reads the latest checkpoint back. The state carries
+--payload-kb of findings text to mimic a research run.
+
+Run from the backend directory:
+    python extras/bench_checkpointer.py --iterations 500 --payload-kb 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver
+
+from app.utils.checkpointer import DurableSqliteSaver
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure(saver, iterations: int, payload_kb: int, threads: int):
+    findings = {"Benchmark question": ["x" * 1024] * payload_kb}
+    write_times, read_times = [], []
+    for i in range(iterations):
+        thread_id = f"bench-{i % threads}"
+        config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"findings": findings, "original_query": "Benchmark"}
+
+        started = time.perf_counter()
+        saved = await saver.aput(config, checkpoint, {"source": "loop", "step": i}, {})
+        await saver.aput_writes(saved, [("findings", findings)], task_id=f"task-{i}")
+        write_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await saver.aget_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}})
+        read_times.append(time.perf_counter() - started)
+    return write_times, read_times
+
+
+def report(name, write_times, read_times):
+    w = [x * 1000 for x in write_times]
+    r = [x * 1000 for x in read_times]
+    print(f"{name:<28} {statistics.median(w):>9.3f} {percentile(w, 99):>9.3f} "
+          f"{statistics.median(r):>9.3f} {percentile(r, 99):>9.3f}")
+
+
+async def main_async(args):
+    print(f"{'saver':<28} {'write p50':>9} {'write p99':>9} {'read p50':>9} {'read p99':>9}  (ms)")
+    report("InMemorySaver", *await measure(InMemorySaver(), args.iterations, args.payload_kb, args.threads))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for interval_ms in args.commit_interval_ms:
+            path = os.path.join(directory, f"checkpoints-{interval_ms}.sqlite3")
+            saver = await DurableSqliteSaver.open(path, commit_interval=interval_ms / 1000)
+            try:
+                timings = await measure(saver, args.iterations, args.payload_kb, args.threads)
+            finally:
+                await saver.aclose()
+            report(f"DurableSqliteSaver ({interval_ms} ms)", *timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--payload-kb", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=20, help="Number of distinct thread ids to spread writes over.")
+    parser.add_argument("--commit-interval-ms", type=int, nargs="+", default=[0, 20],
+                        help="Commit batching intervals to test; 0 commits every write.")
+    asyncio.run(main_async(parser.parse_args()))
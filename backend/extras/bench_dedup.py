@@ -0,0 +1,87 @@
+"""
+Benchmark: speed and recall of finding deduplication on synthetic research runs.
+
+Each run spreads N findings over several questions. A share of them are exact copies of
+earlier findings and another share are near copies (a few words edited), which is what
+overlapping Tavily, Wikipedia and ArXiv results look like. The report shows how long
+deduplication takes and how many of the planted duplicates it removed.
+
+Run from the backend directory:
+    python extras/bench_dedup.py --findings 100 300 1000 3000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The settings object requires these at import time; the benchmark never talks to a provider.
+for key in ("GROQ_API_KEY", "GOOGLE_API_KEY", "TAVILY_API_KEY",
+            "LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY", "LANGFUSE_HOST"):
+    os.environ.setdefault(key, "benchmark")
+os.environ.setdefault("CONTEXT_TOKENIZER", "chars")
+
+from app.workflow.dedup import dedupe_findings
+
+VOCABULARY = [f"w{i}" for i in range(5000)]
+
+
+def make_run(total: int, questions: int, duplicate_share: float, near_share: float, edit_rate: float, words: int,
+             rng: random.Random):
+    originals, texts, planted_exact, planted_near = [], [], 0, 0
+    for _ in range(total):
+        roll = rng.random()
+        if originals and roll < duplicate_share:
+            texts.append(rng.choice(originals))
+            planted_exact += 1
+        elif originals and roll < duplicate_share + near_share:
+            copy = rng.choice(originals).split()
+            # Edit a few words, like a snippet trimmed or reworded by another source
+            for _ in range(max(1, int(len(copy) * edit_rate))):
+                copy[rng.randrange(len(copy))] = rng.choice(VOCABULARY)
+            texts.append(" ".join(copy))
+            planted_near += 1
+        else:
+            text = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(words // 2, words)))
+            originals.append(text)
+            texts.append(text)
+
+    findings = {f"Question {q}": [] for q in range(questions)}
+    sources = {f"Question {q}": [] for q in range(questions)}
+    for i, text in enumerate(texts):
+        question = f"Question {i % questions}"
+        findings[question].append(text)
+        sources[question].append({"source": f"https://example.com/{i}"})
+    return findings, sources, planted_exact, planted_near
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    # A near copy processed before its original is kept and the original counts as the duplicate,
+    # so exact and near counts can trade places; the recall column compares the totals
+    print(f"{'findings':>8} {'exact':>11} {'near':>11} {'recall':>7} {'saved KB':>9} {'saved tok':>10} {'ms':>8} {'ms/finding':>10}")
+    for total in args.findings:
+        findings, sources, planted_exact, planted_near = make_run(
+            total, args.questions, args.duplicate_share, args.near_share, args.edit_rate, args.words, rng
+        )
+        started = time.perf_counter()
+        _, _, stats = dedupe_findings(findings, sources, threshold=args.threshold)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"{total:>8} {stats.exact_duplicates:>5}/{planted_exact:<5} {stats.near_duplicates:>5}/{planted_near:<5} "
+              f"{(stats.exact_duplicates + stats.near_duplicates) / max(1, planted_exact + planted_near):>7.1%} "
+              f"{stats.bytes_saved / 1024:>9.1f} {stats.tokens_saved:>10} {elapsed_ms:>8.1f} {elapsed_ms / total:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--findings", type=int, nargs="+", default=[100, 300, 1000, 3000])
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--words", type=int, default=400, help="Maximum words per finding.")
+    parser.add_argument("--duplicate-share", type=float, default=0.1)
+    parser.add_argument("--near-share", type=float, default=0.15)
+    parser.add_argument("--edit-rate", type=float, default=0.01, help="Share of words edited in a near copy.")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,497 @@
+"""
+Benchmark: the whole research pipeline, end to end and offline, at rising concurrency.
+
+The real FastAPI app runs under uvicorn in a child process, with two substitutions so the
+numbers measure the backend's own overhead rather than the providers':
+
+  LLM    `create_llm` returns a deterministic fake chat model: the planner gets a plan, the
+         router a tool name, the decider CONCLUDE, and the summarizer a report streamed in
+         chunks. Each call takes --llm-latency-ms, plus --llm-chunk-ms per streamed chunk.
+  tools  the shared HTTP client answers Tavily, ArXiv and Wikipedia requests itself after
+         --tool-latency-ms (± --tool-jitter), with made-up documents of --doc-chars. The tools'
+         parsing, caching, retries and circuit breakers all run as usual.
+
+Resumed runs execute in the API process, or with --queue-workers N in N worker processes fed
+through the SQLite job queue (EXECUTION_MODE=queue); the workers get the same fakes.
+Rate limits are off, and so are the caches and the findings index unless --caches is given.
+Every run uses a throwaway data directory. Each simulated user drives one task through
+/research -> /status -> /resume -> /status (polled) -> /results, then starts the next, taking
+--approval-ms to approve each plan (--speculate researches the plan in the meantime).
+Rejections (429) are retried after their Retry-After, capped at one second, and counted.
+
+For each concurrency level: throughput, task latency, p50/p95/p99 per endpoint, and the
+server's resident memory before and after (Linux only). Use --json to save the numbers
+and compare them across commits.
+
+Run from the backend directory:
+    python extras/bench_e2e.py --concurrency 1,4,16,32 --tasks-per-level 32 --json e2e.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_startup import free_port, wait_for
+
+ENDPOINTS = ("research", "resume", "status", "results")
+WORDS = ("model", "energy", "market", "protocol", "history", "network", "growth", "sensor", "policy",
+         "battery", "study", "design", "signal", "climate", "latency", "dataset", "theory", "survey")
+
+
+def bench_env(data_dir: str, args) -> dict:
+    """Dummy keys, no tracing, no rate limits and a throwaway data directory."""
+    env = dict(os.environ)
+    for key in ("GROQ_API_KEY", "GOOGLE_API_KEY", "OPENROUTER_API_KEY", "TAVILY_API_KEY",
+                "LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY", "LANGFUSE_HOST"):
+        env.setdefault(key, "benchmark")
+    env.update({
+        "LANGFUSE_TRACING_ENABLED": "false",
+        "EXECUTION_MODE": "queue" if args.queue_workers else "inline",
+        # The API's own worker pool would import the app without the fakes; the benchmark starts its own
+        "WORKER_PROCESSES": "0",
+        "WORKER_CONCURRENCY": str(args.worker_concurrency),
+        "WARMUP_ENABLED": "false",
+        "CHECKPOINT_PATH": os.path.join(data_dir, "checkpoints.sqlite3"),
+        "TOOL_CACHE_PATH": os.path.join(data_dir, "tool_cache.sqlite3"),
+        "FINDINGS_INDEX_PATH": os.path.join(data_dir, "findings_index.sqlite3"),
+        "LLM_CACHE_PATH": os.path.join(data_dir, "llm_cache.sqlite3"),
+        "JOB_QUEUE_PATH": os.path.join(data_dir, "jobs.sqlite3"),
+        "RESULT_STORE_DIR": os.path.join(data_dir, "results"),
+        "LOG_FILE": os.path.join(data_dir, "server.log"),
+        "TOOL_CACHE_ENABLED": "true" if args.caches else "false",
+        "LLM_CACHE_BACKEND": "sqlite" if args.caches else "none",
+        "FINDINGS_INDEX_ENABLED": "true" if args.caches else "false",
+        "SPECULATIVE_RESEARCH_ENABLED": "true" if args.speculate else "false",
+    })
+    for name in ("GROQ", "GOOGLE", "OPENROUTER", "OLLAMA"):
+        env[f"LLM_RATE_LIMIT_{name}"] = "0"
+    for name in ("WEB_SEARCH", "ARXIV_SEARCH", "WIKIPEDIA_SEARCH"):
+        env[f"TOOL_RATE_LIMIT_{name}"] = "0"
+    return env
+
+
+# --- Server side: the app with a fake chat model and stubbed upstream APIs ---
+
+def fake_chat_model(provider: str, model: str, latency: float, chunk_latency: float, report_words: int,
+                    questions: int):
+    """A chat model that answers each of the agents' prompts with deterministic, well-formed output."""
+    import re
+
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    def prompt_text(messages) -> str:
+        return "\n".join(str(message.content) for message in messages)
+
+    def reply(messages, tools, tool_choice) -> AIMessage:
+        text = prompt_text(messages)
+        usage = {"input_tokens": len(text) // 4}
+        if tools and tool_choice not in (None, "none"):
+            # with_structured_output: the planner's ResearchPlan
+            query = re.search(r"User Query: (.*)", text).group(1).strip()
+            templates = ["What is the history of {}?", "What are recent papers on {}?",
+                         "What is the latest news about {}?", "What are user reviews of {}?"]
+            plan = [templates[i % len(templates)].format(f"{query} (part {i + 1})") for i in range(questions)]
+            usage["output_tokens"] = 20 * questions
+            return AIMessage(content="", tool_calls=[{"name": tools[0]["function"]["name"], "args": {"questions": plan},
+                                                      "id": "plan", "type": "tool_call"}],
+                             usage_metadata={**usage, "total_tokens": usage["input_tokens"] + usage["output_tokens"]})
+        if "routing a user's question" in text:
+            question = text.rsplit("Question:", 1)[1]
+            content = "arxiv_search" if "papers" in question else (
+                "wikipedia_search" if "history" in question else "web_search")
+        elif "project manager" in text:
+            content = "CONCLUDE"
+        else:
+            # Condenser, summarizer and reducer: prose citing the footnotes they were given
+            markers = list(dict.fromkeys(re.findall(r"\[\^\d+\]", text))) or ["[^1]"]
+            words = report_words // 4 if "Condense the findings" in text else report_words
+            rng = random.Random(len(text))
+            content = " ".join(
+                rng.choice(WORDS) + (markers[i // 12 % len(markers)] if i % 12 == 11 else "") for i in range(words))
+        usage["output_tokens"] = len(content) // 4
+        return AIMessage(content=content,
+                         usage_metadata={**usage, "total_tokens": usage["input_tokens"] + usage["output_tokens"]})
+
+    class BenchmarkChatModel(BaseChatModel):
+        @property
+        def _llm_type(self) -> str:
+            return "benchmark-fake"
+
+        def _get_ls_params(self, stop=None, **kwargs):
+            return {"ls_provider": provider, "ls_model_name": model, "ls_model_type": "chat"}
+
+        def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+            return self.bind(tools=[convert_to_openai_tool(t) for t in tools], tool_choice=tool_choice, **kwargs)
+
+        def _generate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs):
+            time.sleep(latency)
+            return ChatResult(generations=[ChatGeneration(message=reply(messages, tools, tool_choice))])
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs):
+            await asyncio.sleep(latency)
+            return ChatResult(generations=[ChatGeneration(message=reply(messages, tools, tool_choice))])
+
+        async def _astream(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs):
+            await asyncio.sleep(latency)
+            message = reply(messages, tools, tool_choice)
+            words = message.content.split(" ")
+            for start in range(0, len(words), 8):
+                if start:
+                    await asyncio.sleep(chunk_latency)
+                text = " ".join(words[start:start + 8]) + ("" if start + 8 >= len(words) else " ")
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+                if run_manager:
+                    await run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=message.usage_metadata))
+
+    return BenchmarkChatModel()
+
+
+def stub_transport(latency: float, jitter: float, doc_chars: int):
+    """Answers the three research APIs with documents made up from the query, after a delay."""
+    import httpx
+
+    def document(query: str, index: int) -> str:
+        rng = random.Random(f"{query}/{index}")
+        words, size = [], 0
+        while size < doc_chars:
+            word = rng.choice(WORDS) if rng.random() > 0.1 else str(rng.randint(1, 9999))
+            words.append(word)
+            size += len(word) + 1
+        return " ".join(words)
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(max(0.0, latency * (1 + random.uniform(-jitter, jitter))))
+        host = request.url.host
+        if "tavily" in host:
+            query = json.loads(request.content)["query"]
+            return httpx.Response(200, json={"results": [
+                {"url": f"https://example.com/{abs(hash(query)) % 10**8}/{i}", "content": document(query, i)}
+                for i in range(3)
+            ]})
+        if "arxiv" in host:
+            query = request.url.params["search_query"]
+            entries = "".join(
+                f"<entry><id>http://arxiv.org/abs/{abs(hash(query)) % 10**4}.{i:05d}</id>"
+                f"<updated>2024-01-0{i + 1}T00:00:00Z</updated><title>Paper {i} on {query}</title>"
+                f"<summary>{document(query, i)}</summary><author><name>A. Author</name></author></entry>"
+                for i in range(2)
+            )
+            return httpx.Response(200, content=f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'.encode())
+        if "wikipedia" in host:
+            query = request.url.params["gsrsearch"]
+            return httpx.Response(200, json={"query": {"pages": [{
+                "title": query.title(), "fullurl": f"https://en.wikipedia.org/wiki/{abs(hash(query)) % 10**8}",
+                "extract": document(query, 0),
+            }]}})
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handle)
+
+
+def install_fakes(args):
+    """Puts the fake chat model and the stubbed upstream APIs in place of the real ones."""
+    import httpx
+
+    import app.models.llm_registry as llm_registry
+    import app.utils.tools as tools
+
+    llm_registry.create_llm = lambda provider, model, api_key=None: fake_chat_model(
+        provider, model, args.llm_latency_ms / 1000, args.llm_chunk_ms / 1000, args.report_words, args.questions)
+
+    transport = stub_transport(args.tool_latency_ms / 1000, args.tool_jitter, args.doc_chars)
+    clients = {}
+
+    def get_async_client() -> httpx.AsyncClient:
+        # One client per event loop, like app.utils.http
+        loop = asyncio.get_running_loop()
+        if loop not in clients:
+            clients[loop] = httpx.AsyncClient(transport=transport)
+        return clients[loop]
+
+    tools.get_async_client = get_async_client
+
+
+def serve(args):
+    """Runs the app with the fakes in place; the parent process drives it."""
+    import uvicorn
+
+    install_fakes(args)
+    import app.main
+    uvicorn.run(app.main.app, host="127.0.0.1", port=args.serve_port, log_level="warning")
+
+
+def serve_worker(args):
+    """Runs one research worker with the fakes in place, taking jobs the app queues."""
+    install_fakes(args)
+    from app.worker import run_worker
+    # The API process has rate limits off too, so the shares do not matter
+    asyncio.run(run_worker(f"bench:{os.getpid()}:{args.serve_worker}", args.worker_concurrency, 1))
+
+
+# --- Client side: simulated users ---
+
+def rss_mb(pid: int) -> Dict[str, Optional[float]]:
+    """Resident and peak resident memory of a process, from /proc (None elsewhere)."""
+    values = {"rss": None, "peak": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    values["rss"] = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    values["peak"] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return values
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+        **{f"p{p}_ms": round(percentile(samples, p) * 1000, 2) for p in (50, 95, 99)},
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+class TaskFailed(Exception):
+    pass
+
+
+class User:
+    """Runs tasks one after another and records the latency of every request."""
+
+    def __init__(self, client, args, latencies: Dict[str, List[float]], counters: Dict[str, int]):
+        self.client = client
+        self.args = args
+        self.latencies = latencies
+        self.counters = counters
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs):
+        while True:
+            started = time.perf_counter()
+            response = await self.client.request(method, url, **kwargs)
+            self.latencies[endpoint].append(time.perf_counter() - started)
+            if response.status_code != 429:
+                break
+            self.counters[f"{endpoint}_rejected"] += 1
+            await asyncio.sleep(min(1.0, float(response.headers.get("Retry-After", 1))))
+        if response.status_code >= 400:
+            raise TaskFailed(f"{endpoint}: HTTP {response.status_code}")
+        return response.json()
+
+    async def run_task(self, query: str):
+        task_id = (await self.request("research", "POST", "/research", json={"query": query}))["task_id"]
+        status = await self.request("status", "GET", f"/status/{task_id}")
+        if status["status"] != "AWAITING_INPUT":
+            raise TaskFailed(f"status after planning: {status['status']}")
+        if self.args.approval_ms:
+            # The user reviewing the plan
+            await asyncio.sleep(self.args.approval_ms / 1000)
+        await self.request("resume", "POST", f"/resume/{task_id}",
+                           json={"research_questions": status["research_questions"]})
+        deadline = time.perf_counter() + self.args.task_timeout
+        while status["status"] != "COMPLETE":
+            if time.perf_counter() > deadline:
+                raise TaskFailed("timed out")
+            await asyncio.sleep(self.args.poll_ms / 1000)
+            status = await self.request("status", "GET", f"/status/{task_id}")
+        report = await self.request("results", "GET", f"/results/{task_id}")
+        if not report.get("summary"):
+            raise TaskFailed("empty report")
+
+
+def make_query(index: int, distinct: int) -> str:
+    n = index % distinct if distinct else index
+    rng = random.Random(n)
+    return f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(WORDS)} {n}"
+
+
+async def run_level(base_url: str, concurrency: int, tasks: int, first_query: int, args) -> Dict[str, Any]:
+    import httpx
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    counters: Dict[str, int] = defaultdict(int)
+    task_seconds: List[float] = []
+    errors: Dict[str, int] = defaultdict(int)
+    next_task = iter(range(first_query, first_query + tasks))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.task_timeout) as client:
+        async def user_loop():
+            user = User(client, args, latencies, counters)
+            for index in next_task:
+                started = time.perf_counter()
+                try:
+                    await user.run_task(make_query(index, args.distinct_queries))
+                    task_seconds.append(time.perf_counter() - started)
+                except (TaskFailed, httpx.HTTPError) as e:
+                    errors[str(e) or type(e).__name__] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user_loop() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "tasks": tasks,
+        "completed": len(task_seconds),
+        "failed": sum(errors.values()),
+        "errors": dict(errors),
+        "rejected": {endpoint: counters[f"{endpoint}_rejected"] for endpoint in ENDPOINTS
+                     if counters[f"{endpoint}_rejected"]},
+        "wall_s": round(wall, 3),
+        "throughput_tasks_per_s": round(len(task_seconds) / wall, 3),
+        "task": summarize(task_seconds),
+        "endpoints": {endpoint: summarize(latencies[endpoint]) for endpoint in ENDPOINTS},
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    levels = [int(c) for c in args.concurrency.split(",")]
+    with tempfile.TemporaryDirectory() as data_dir:
+        port = free_port()
+        fake_args = [
+            "--llm-latency-ms", str(args.llm_latency_ms),
+            "--llm-chunk-ms", str(args.llm_chunk_ms), "--tool-latency-ms", str(args.tool_latency_ms),
+            "--tool-jitter", str(args.tool_jitter), "--doc-chars", str(args.doc_chars),
+            "--report-words", str(args.report_words), "--questions", str(args.questions),
+            "--worker-concurrency", str(args.worker_concurrency),
+        ]
+        output = None if args.verbose else subprocess.DEVNULL
+        env = bench_env(data_dir, args)
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve-port", str(port), *fake_args],
+                                  cwd=BACKEND, env=env, stdout=output, stderr=output)
+        workers = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve-worker", str(index), *fake_args],
+                             cwd=BACKEND, env=env, stdout=output, stderr=output)
+            for index in range(args.queue_workers)
+        ]
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            if not wait_for(f"{base_url}/health", time.perf_counter() + args.startup_timeout):
+                raise SystemExit(f"The server did not start within {args.startup_timeout:.0f}s")
+
+            # Unmeasured tasks first, so one-off costs (imports, the tokenizer, SQLite files) are paid
+            warm_up = asyncio.run(run_level(base_url, 1, args.warmup_tasks, 10**6, args)) if args.warmup_tasks else None
+            if warm_up and warm_up["failed"]:
+                raise SystemExit(f"Warm-up tasks failed: {warm_up['errors']}")
+            memory_start = rss_mb(server.pid)
+
+            print(f"{'users':>6} {'tasks':>6} {'failed':>6} {'429s':>5} {'tasks/s':>8} {'task p50':>9} "
+                  f"{'task p99':>9} {'research p99':>13} {'resume p99':>11} {'status p99':>11} "
+                  f"{'results p99':>12} {'rss MB':>8}")
+            results, first_query = [], 0
+            for concurrency in levels:
+                tasks = args.tasks_per_level or concurrency * args.rounds
+                before = rss_mb(server.pid)
+                level = asyncio.run(run_level(base_url, concurrency, tasks, first_query, args))
+                after = rss_mb(server.pid)
+                first_query += tasks
+                level["server_rss_mb"] = {
+                    "before": before["rss"], "after": after["rss"], "peak": after["peak"],
+                    "growth": round(after["rss"] - before["rss"], 1) if after["rss"] is not None else None,
+                }
+                results.append(level)
+
+                def p99(endpoint):
+                    return level["endpoints"][endpoint].get("p99_ms", float("nan"))
+                print(f"{concurrency:>6} {tasks:>6} {level['failed']:>6} {sum(level['rejected'].values()):>5} "
+                      f"{level['throughput_tasks_per_s']:>8.2f} {level['task'].get('p50_ms', float('nan')) / 1000:>8.2f}s "
+                      f"{level['task'].get('p99_ms', float('nan')) / 1000:>8.2f}s {p99('research'):>11.1f}ms "
+                      f"{p99('resume'):>9.1f}ms {p99('status'):>9.1f}ms {p99('results'):>10.1f}ms "
+                      f"{after['rss'] or float('nan'):>8.1f}")
+            memory_end = rss_mb(server.pid)
+        finally:
+            for process in (server, *workers):
+                process.terminate()
+            for process in (server, *workers):
+                process.wait(10)
+
+    summary = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "verbose", "serve_port", "serve_worker")},
+        "levels": results,
+        "server_rss_mb": {
+            "start": memory_start["rss"], "end": memory_end["rss"], "peak": memory_end["peak"],
+            "growth": round(memory_end["rss"] - memory_start["rss"], 1) if memory_end["rss"] is not None else None,
+        },
+    }
+    if summary["server_rss_mb"]["growth"] is not None:
+        print(f"\nserver memory: {memory_start['rss']:.1f} MB after warm-up, {memory_end['rss']:.1f} MB at the end "
+              f"(peak {memory_end['peak']:.1f} MB)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nSaved to {args.json}")
+    if any(level["failed"] for level in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16,32", help="comma-separated numbers of simultaneous users")
+    parser.add_argument("--tasks-per-level", type=int, default=0, help="tasks per level (default: users x --rounds)")
+    parser.add_argument("--rounds", type=int, default=2, help="tasks per user when --tasks-per-level is not set")
+    parser.add_argument("--warmup-tasks", type=int, default=2)
+    parser.add_argument("--questions", type=int, default=4, help="research questions in each plan")
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="per chat model call, before the first token")
+    parser.add_argument("--llm-chunk-ms", type=float, default=2, help="between streamed report chunks")
+    parser.add_argument("--report-words", type=int, default=400)
+    parser.add_argument("--tool-latency-ms", type=float, default=100)
+    parser.add_argument("--tool-jitter", type=float, default=0.2, help="± share of the tool latency, at random")
+    parser.add_argument("--doc-chars", type=int, default=1500, help="size of each stub search result")
+    parser.add_argument("--caches", action="store_true", help="keep the tool and LLM caches and the findings index on")
+    parser.add_argument("--distinct-queries", type=int, default=0,
+                        help="cycle through this many queries (default: every task is different)")
+    parser.add_argument("--approval-ms", type=float, default=0, help="time each user takes to approve the plan")
+    parser.add_argument("--speculate", action="store_true", help="research the plan while it waits for approval")
+    parser.add_argument("--queue-workers", type=int, default=0,
+                        help="run resumed tasks in this many worker processes (default: in the API process)")
+    parser.add_argument("--worker-concurrency", type=int, default=4, help="jobs each worker runs at a time")
+    parser.add_argument("--poll-ms", type=float, default=100, help="/status polling interval")
+    parser.add_argument("--task-timeout", type=float, default=120)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--verbose", action="store_true", help="show the server's output")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--serve-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--serve-worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve_port:
+        serve(args)
+    elif args.serve_worker is not None:
+        serve_worker(args)
+    else:
+        main(args)
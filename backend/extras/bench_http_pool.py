@@ -0,0 +1,162 @@
+"""
+Benchmark: per-call overhead of a fresh HTTP client per tool call versus the shared, pooled client.
+
+A local stub server answers like the Tavily, ArXiv and Wikipedia APIs. Every new connection
+waits --handshake-ms before it is served, standing in for the TCP and TLS handshakes to a
+remote API (the stub itself speaks plain HTTP). The pooled runs go through the real tools in
+app/utils/tools.py with the tool cache and rate limiters disabled.
+
+Run from the backend directory:
+    python extras/bench_http_pool.py --calls 200 --handshake-ms 30
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TAVILY_RESPONSE = json.dumps({"results": [
+    {"url": f"https://example.com/{i}", "content": "Stub search result. " * 40} for i in range(3)
+]}).encode()
+WIKIPEDIA_RESPONSE = json.dumps({"query": {"pages": [
+    {"title": "Stub", "fullurl": "https://en.wikipedia.org/wiki/Stub", "extract": "Stub article.\n" + "Text. " * 500}
+]}}).encode()
+ARXIV_RESPONSE = (
+    '<feed xmlns="http://www.w3.org/2005/Atom">'
+    + "".join(
+        f"<entry><id>http://arxiv.org/abs/{i}</id><updated>2024-01-01T00:00:00Z</updated>"
+        f"<title>Stub paper {i}</title><summary>{'Abstract. ' * 100}</summary>"
+        f"<author><name>Author {i}</name></author></entry>"
+        for i in range(2)
+    )
+    + "</feed>"
+).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Send headers and body in one write, so delayed ACKs do not stall keep-alive connections
+    wbufsize = 1 << 16
+    disable_nagle_algorithm = True
+    handshake_seconds = 0.0
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        StubHandler.connections += 1
+        time.sleep(self.handshake_seconds)
+
+    def _reply(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(TAVILY_RESPONSE, "application/json")
+
+    def do_GET(self):
+        if self.path.startswith("/arxiv"):
+            self._reply(ARXIV_RESPONSE, "application/atom+xml")
+        else:
+            self._reply(WIKIPEDIA_RESPONSE, "application/json")
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(handshake_ms: float) -> str:
+    StubHandler.handshake_seconds = handshake_ms / 1000
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def timed_calls(call, calls: int, concurrency: int):
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with slots:
+            started = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return latencies, time.perf_counter() - started
+
+
+def report(name, latencies, wall, connections):
+    ms = [x * 1000 for x in latencies]
+    print(f"{name:<44} {statistics.median(ms):>8.2f} {percentile(ms, 99):>8.2f} {wall:>8.2f} {connections:>6}")
+
+
+async def main_async(args):
+    base_url = start_stub(args.handshake_ms)
+    os.environ.update({
+        "TAVILY_BASE_URL": base_url,
+        "ARXIV_API_URL": f"{base_url}/arxiv",
+        "WIKIPEDIA_API_URL": f"{base_url}/w/api.php",
+        "TOOL_CACHE_ENABLED": "false",
+        # The tools' rate limiters would otherwise dominate the pooled timings
+        "TOOL_RATE_LIMIT_WEB_SEARCH": "0",
+        "TOOL_RATE_LIMIT_ARXIV_SEARCH": "0",
+        "TOOL_RATE_LIMIT_WIKIPEDIA_SEARCH": "0",
+    })
+    for key in ("GROQ_API_KEY", "GOOGLE_API_KEY", "TAVILY_API_KEY",
+                "LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY", "LANGFUSE_HOST"):
+        os.environ.setdefault(key, "benchmark")
+
+    import httpx
+    from app.utils import http
+    from app.utils.tools import arxiv_search, web_search, wikipedia_search
+
+    tools = [web_search, arxiv_search, wikipedia_search]
+
+    async def fresh_client_call(i):
+        # What the tools did before: a new client, so a new connection, for every call
+        async with httpx.AsyncClient() as client:
+            response = await client.post(f"{base_url}/search", json={"query": f"q{i}", "max_results": 3})
+            response.raise_for_status()
+            response.json()
+
+    async def pooled_tool_call(i):
+        await tools[i % len(tools)].ainvoke({"query": f"q{i}"})
+
+    print(f"{'mode':<44} {'p50 ms':>8} {'p99 ms':>8} {'wall s':>8} {'conns':>6}")
+    for concurrency in args.concurrency:
+        for name, call in (("fresh client per call", fresh_client_call), ("shared pooled client (tools)", pooled_tool_call)):
+            StubHandler.connections = 0
+            # The tools print progress; keep it out of the table
+            with contextlib.redirect_stdout(io.StringIO()):
+                latencies, wall = await timed_calls(call, args.calls, concurrency)
+            report(f"{name}, {concurrency} concurrent", latencies, wall, StubHandler.connections)
+    await http.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=30.0,
+                        help="Delay before a new connection is served, standing in for TCP+TLS setup.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10])
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,117 @@
+"""
+Benchmark: tail latency of tool calls with and without the resilience layer.
+
+A simulated upstream answers most calls quickly, some slowly, hangs on a few and fails some.
+The same call sequence is run bare and through ResilientCaller (timeouts, retries with jitter,
+hedging past the latency percentile). A second phase takes the upstream down entirely to show
+the circuit breaker failing fast.
+
+Run from the backend directory:
+    python extras/bench_resilience.py --calls 400
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.resilience import CallPolicy, CircuitOpenError, ResilientCaller
+
+
+class Upstream:
+    """Latency and failure model of a flaky search API."""
+
+    def __init__(self, args, seed: int):
+        self.args = args
+        self.rng = random.Random(seed)
+        self.down = False
+
+    async def fetch(self):
+        if self.down:
+            await asyncio.sleep(0.05)
+            raise ConnectionError("upstream down")
+        roll = self.rng.random()
+        if roll < self.args.hang_rate:
+            await asyncio.sleep(self.args.hang_seconds)
+        elif roll < self.args.hang_rate + self.args.slow_rate:
+            await asyncio.sleep(self.rng.uniform(1.0, 3.0))
+        else:
+            await asyncio.sleep(self.rng.lognormvariate(-2.3, 0.4))  # about 100 ms
+        if self.rng.random() < self.args.error_rate:
+            raise ConnectionError("upstream error")
+        return ["document"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(call, calls: int, concurrency: int):
+    latencies, successes = [], 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal successes
+        async with slots:
+            started = time.perf_counter()
+            try:
+                await call()
+                successes += 1
+            except Exception:
+                pass
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return latencies, successes
+
+
+def report(name, latencies, successes):
+    ms = [x * 1000 for x in latencies]
+    print(f"{name:<24} {statistics.median(ms):>8.0f} {percentile(ms, 99):>8.0f} {max(ms):>8.0f} "
+          f"{successes / len(latencies):>8.1%}")
+
+
+async def main_async(args):
+    policy = CallPolicy(timeout=args.timeout, deadline=args.deadline, retries=args.retries,
+                        backoff=0.1, hedge_percentile=args.hedge_percentile, breaker_failures=5,
+                        breaker_reset_seconds=2.0)
+    print(f"{'mode':<24} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'success':>8}")
+
+    bare = Upstream(args, seed=args.seed)
+    report("bare calls", *await run(bare.fetch, args.calls, args.concurrency))
+
+    upstream = Upstream(args, seed=args.seed)
+    caller = ResilientCaller("bench", policy)
+    report("resilient calls", *await run(lambda: caller.call(upstream.fetch), args.calls, args.concurrency))
+    stats = caller.stats()
+    print(f"  timeouts={stats['timeouts']} retries={stats['retries']} hedges={stats['hedges']} "
+          f"hedge_wins={stats['hedge_wins']} breaker_opens={stats['breaker_opens']}")
+
+    # Outage: every call fails. Once the breaker opens, calls are rejected without waiting.
+    upstream.down = True
+    latencies, _ = await run(lambda: caller.call(upstream.fetch), 200, 1)
+    stats = caller.stats()
+    print(f"outage: {stats['short_circuits']} of 200 calls short-circuited, breaker={stats['breaker']}, "
+          f"mean {statistics.mean(latencies) * 1000:.2f} ms per call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--hang-rate", type=float, default=0.01)
+    parser.add_argument("--hang-seconds", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.03)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--deadline", type=float, default=2.5)
+    parser.add_argument("--retries", type=int, default=1)
+    parser.add_argument("--hedge-percentile", type=float, default=90.0)
+    parser.add_argument("--seed", type=int, default=3)
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+Benchmark: accuracy and latency of the local tool router on a labeled question set.
+
+Each line of the dataset is {"question": ..., "tool": ...}. The report shows how many
+questions the local router is confident about at the configured threshold, its accuracy
+on those and overall, and the per-question routing latency.
+
+Run from the backend directory:
+    python extras/bench_routing.py --threshold 0.8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.workflow.routing import route_question
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_benchmark.jsonl")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main(args):
+    with open(args.dataset, encoding="utf-8") as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+
+    latencies, correct, confident, confident_correct = [], 0, 0, 0
+    confusion = Counter()
+    for example in examples:
+        # Repeat to get stable timings for a microsecond-scale call
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            decision = route_question(example["question"])
+        latencies.append((time.perf_counter() - started) / args.repeat)
+
+        is_correct = decision.tool_name == example["tool"]
+        correct += is_correct
+        confusion[(example["tool"], decision.tool_name)] += 1
+        if decision.confidence >= args.threshold:
+            confident += 1
+            confident_correct += is_correct
+        elif args.verbose:
+            print(f"  unsure ({decision.confidence:.2f}): {example['question']} -> {decision.tool_name}")
+        if args.verbose and not is_correct:
+            print(f"  wrong  ({decision.confidence:.2f}): {example['question']} -> {decision.tool_name}, expected {example['tool']}")
+
+    us = [x * 1e6 for x in latencies]
+    total = len(examples)
+    print(f"examples:                  {total}")
+    print(f"overall accuracy:          {correct / total:.1%}")
+    print(f"confident (>= {args.threshold:.2f}):       {confident / total:.1%} of questions skip the LLM")
+    print(f"accuracy when confident:   {confident_correct / confident:.1%}" if confident else "accuracy when confident:   n/a")
+    print(f"latency p50 / p99:         {statistics.median(us):.1f} / {percentile(us, 99):.1f} µs")
+    print("confusion (expected -> routed):")
+    for (expected, routed), count in sorted(confusion.items()):
+        print(f"  {expected:<17} -> {routed:<17} {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--verbose", action="store_true", help="Print unsure and misrouted questions.")
+    main(parser.parse_args())
@@ -0,0 +1,188 @@
+"""
+Benchmark: cold-start time of the API, and the import time of each module it loads.
+
+Every run starts a fresh interpreter, so nothing is shared between runs but the OS file cache
+(the first run is usually slower; medians are reported).
+
+  imports   `python -X importtime -c "import app.main"`: wall time, the cumulative import
+            time of each app module, and the heaviest third-party packages by self time.
+  deferred  the import time of each provider SDK on its own (shared dependencies included),
+            which the API loads only on first use.
+  serve     (--serve) starts uvicorn and times the first 200 from /health (accepting
+            requests) and from /ready (client warm-up done).
+
+Use --json to save the numbers and compare them across commits.
+
+Run from the backend directory:
+    python extras/bench_startup.py --runs 5 --serve
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROVIDER_SDKS = ["langchain_groq", "langchain_google_genai", "langchain_openai", "langchain_ollama"]
+
+
+def bench_env(data_dir: str) -> dict:
+    """Dummy keys, no tracing and a throwaway data directory, so runs are offline and independent."""
+    env = dict(os.environ)
+    for key in ("GROQ_API_KEY", "GOOGLE_API_KEY", "TAVILY_API_KEY",
+                "LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY", "LANGFUSE_HOST"):
+        env.setdefault(key, "benchmark")
+    env["LANGFUSE_TRACING_ENABLED"] = "false"
+    env.update({
+        "CHECKPOINT_PATH": os.path.join(data_dir, "checkpoints.sqlite3"),
+        "TOOL_CACHE_PATH": os.path.join(data_dir, "tool_cache.sqlite3"),
+        "FINDINGS_INDEX_PATH": os.path.join(data_dir, "findings_index.sqlite3"),
+        "LLM_CACHE_PATH": os.path.join(data_dir, "llm_cache.sqlite3"),
+        "JOB_QUEUE_PATH": os.path.join(data_dir, "jobs.sqlite3"),
+        "RESULT_STORE_DIR": os.path.join(data_dir, "results"),
+    })
+    return env
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Module -> (self µs, cumulative µs) from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def time_import(statement: str, env: dict):
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          cwd=BACKEND, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise SystemExit(f"`{statement}` failed:\n{proc.stderr[-2000:]}")
+    return wall, parse_importtime(proc.stderr)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, deadline: float) -> bool:
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def time_serve(env: dict, timeout: float):
+    """Seconds from launching uvicorn to the first 200 from /health, then from /ready."""
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+                            cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = started + timeout
+        health = wait_for(f"http://127.0.0.1:{port}/health", deadline)
+        health_s = time.perf_counter() - started
+        ready = health and wait_for(f"http://127.0.0.1:{port}/ready", deadline)
+        ready_s = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    if not ready:
+        raise SystemExit(f"The server was not ready within {timeout:.0f}s")
+    return health_s, ready_s
+
+
+def median_ms(samples) -> float:
+    return statistics.median(samples) / 1000
+
+
+def main(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = bench_env(data_dir)
+
+        walls, runs = [], []
+        for _ in range(args.runs):
+            wall, modules = time_import("import app.main", env)
+            walls.append(wall)
+            runs.append(modules)
+        print(f"import app.main: median {statistics.median(walls):.2f}s, "
+              f"min {min(walls):.2f}s over {args.runs} runs")
+
+        cumulative, by_package = defaultdict(list), defaultdict(list)
+        for modules in runs:
+            packages = defaultdict(int)
+            for name, (self_us, cumulative_us) in modules.items():
+                cumulative[name].append(cumulative_us)
+                packages[name.split(".")[0]] += self_us
+            for package, self_us in packages.items():
+                by_package[package].append(self_us)
+
+        app_modules = sorted((name for name in cumulative if name == "app" or name.startswith("app.")),
+                             key=lambda name: -statistics.median(cumulative[name]))
+        print(f"\n{'app module':<34} {'cumulative ms':>14}")
+        for name in app_modules[:args.top]:
+            print(f"{name:<34} {median_ms(cumulative[name]):>14.1f}")
+
+        packages = sorted((p for p in by_package if p != "app"), key=lambda p: -statistics.median(by_package[p]))
+        print(f"\n{'third-party package':<34} {'self ms':>14}")
+        for package in packages[:args.top]:
+            print(f"{package:<34} {median_ms(by_package[package]):>14.1f}")
+
+        loaded = set().union(*runs)
+        print(f"\n{'provider SDK (first use)':<34} {'import ms':>14} {'loaded at startup':>18}")
+        deferred = {}
+        for sdk in PROVIDER_SDKS:
+            _, modules = time_import(f"try:\n    import {sdk}\nexcept ImportError:\n    pass", env)
+            deferred[sdk] = modules[sdk][1] / 1000 if sdk in modules else None
+            shown = f"{deferred[sdk]:.1f}" if deferred[sdk] is not None else "not installed"
+            print(f"{sdk:<34} {shown:>14} {'yes' if sdk in loaded else 'no':>18}")
+
+        results = {
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "import_wall_s": {"median": statistics.median(walls), "min": min(walls)},
+            "app_modules_ms": {name: median_ms(cumulative[name]) for name in app_modules},
+            "packages_self_ms": {p: median_ms(by_package[p]) for p in packages},
+            "provider_sdks_ms": deferred,
+        }
+
+        if args.serve:
+            health, ready = zip(*(time_serve(env, args.timeout) for _ in range(args.runs)))
+            print(f"\nuvicorn: /health after {statistics.median(health):.2f}s, "
+                  f"/ready after {statistics.median(ready):.2f}s (medians)")
+            results["serve_s"] = {"health": statistics.median(health), "ready": statistics.median(ready)}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--serve", action="store_true", help="also time uvicorn until /health and /ready answer")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", help="write the results to this file")
+    main(parser.parse_args())
@@ -0,0 +1,105 @@
+"""
+Benchmark: /status latency while N research plans are being generated at once.
+
+The planner LLM is replaced with a fake that sleeps for --plan-latency seconds, so the
+numbers measure only the API and graph overhead. If the graph blocked the event loop,
+/status p99 would grow with N; on the async path it should stay flat.
+
+Run from the backend directory:
+    python extras/bench_status_latency.py --concurrency 0 1 4 16 64
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The settings object requires these at import time; the benchmark never talks to a provider.
+for key in ("GROQ_API_KEY", "GOOGLE_API_KEY", "TAVILY_API_KEY",
+            "LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY", "LANGFUSE_HOST"):
+    os.environ.setdefault(key, "benchmark")
+# Keep Langfuse out of the measurement: its callback handler becomes a no-op
+os.environ.setdefault("LANGFUSE_TRACING_ENABLED", "false")
+# The ASGI transport does not run the lifespan, so use the saver that needs no startup
+os.environ.setdefault("CHECKPOINTER", "memory")
+
+from types import SimpleNamespace
+
+import httpx
+from langchain_core.runnables import RunnableLambda
+
+import app.main as main
+import app.workflow.graph as graph
+from app.workflow.agents import ResearchPlan
+
+
+def install_fake_planner(latency: float):
+    async def fake_plan(_inputs):
+        await asyncio.sleep(latency)
+        return ResearchPlan(questions=[f"Benchmark question {i}" for i in range(5)])
+
+    # Every task gets the fake planner, whatever provider it asks for
+    agents = SimpleNamespace(provider="benchmark", planner_agent=RunnableLambda(fake_plan))
+    async def no_credential(provider, api_key=None):
+        return None
+
+    async def fake_agents(state):
+        return agents
+
+    graph.llm_registry.aregister = no_credential
+    graph.llm_registry.afor_task = fake_agents
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_round(client, concurrency: int, plan_latency: float, poll_interval: float):
+    latencies = []
+    stop = asyncio.Event()
+
+    async def poll_status():
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = await client.get("/status/benchmark-idle-task")
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+            await asyncio.sleep(poll_interval)
+
+    async def start_plan(i):
+        response = await client.post("/research", json={"query": f"Benchmark query {i}"})
+        response.raise_for_status()
+
+    poller = asyncio.create_task(poll_status())
+    if concurrency:
+        await asyncio.gather(*(start_plan(i) for i in range(concurrency)))
+    else:
+        await asyncio.sleep(plan_latency)
+    stop.set()
+    await poller
+    return latencies
+
+
+async def main_async(args):
+    install_fake_planner(args.plan_latency)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'plans':>6} {'samples':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for concurrency in args.concurrency:
+            latencies = await run_round(client, concurrency, args.plan_latency, args.poll_interval)
+            ms = [x * 1000 for x in latencies]
+            print(f"{concurrency:>6} {len(ms):>8} {statistics.median(ms):>8.2f} "
+                  f"{percentile(ms, 99):>8.2f} {max(ms):>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[0, 1, 4, 16, 64])
+    parser.add_argument("--plan-latency", type=float, default=1.0, help="Seconds the fake planner takes.")
+    parser.add_argument("--poll-interval", type=float, default=0.01, help="Seconds between /status polls.")
+    asyncio.run(main_async(parser.parse_args()))
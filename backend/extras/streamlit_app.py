@@ -37,6 +37,30 @@ def get_task_status(task_id):
         st.warning(f"Could not retrieve task status: {e}")
         return None
 
+def wait_for_task_event(task_id, wanted_events, on_event=None):
+    """
+    Follows the task's Server-Sent Events stream until one of `wanted_events` (or an error) arrives.
+    Every other event is passed to `on_event`, if given.
+    Returns the event name and its data, or None if the stream could not be read.
+    """
+    try:
+        with requests.get(f"{BACKEND_URL}/events/{task_id}", stream=True, timeout=(10, None)) as response:
+            response.raise_for_status()
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:") and event:
+                    data = json.loads(line[len("data:"):].strip() or "{}")
+                    if event in wanted_events or event == "error":
+                        return event, data
+                    if on_event:
+                        on_event(event, data)
+                    event = None
+    except requests.exceptions.RequestException as e:
+        st.warning(f"Could not follow task events: {e}")
+    return None
+
 def resume_task(task_id, research_questions):
     """Sends the approved/edited plan to the backend to resume the task."""
     try:
@@ -95,13 +119,26 @@ if not st.session_state.task_id:
                     st.success("Task started! Polling for research plan...")
                     st.rerun()
 
-# 2. Polling and HITL Approval Form
+# 2. Waiting for the plan and HITL Approval Form
 if st.session_state.task_id and st.session_state.task_status != "COMPLETE":
-    with st.spinner("Polling for agent status..."):
-        status_data = get_task_status(st.session_state.task_id)
-        if status_data:
-            st.session_state.task_status = status_data.get("status")
-            st.session_state.research_questions = status_data.get("research_questions", [])
+    if st.session_state.task_status not in ("AWAITING_INPUT", "RESUMED"):
+        with st.spinner("Waiting for the agent's research plan..."):
+            update = wait_for_task_event(st.session_state.task_id, {"awaiting_input", "complete"})
+            if update:
+                event, data = update
+                if event == "awaiting_input":
+                    st.session_state.task_status = "AWAITING_INPUT"
+                    st.session_state.research_questions = data.get("research_questions", [])
+                elif event == "complete":
+                    st.session_state.task_status = "COMPLETE"
+                else:
+                    st.error(f"Research failed: {data.get('detail')}")
+            else:
+                # Fall back to a single status check if the event stream is unavailable
+                status_data = get_task_status(st.session_state.task_id)
+                if status_data:
+                    st.session_state.task_status = status_data.get("status")
+                    st.session_state.research_questions = status_data.get("research_questions", [])
 
     # If agent is waiting for input, show the approval form
     if st.session_state.task_status == "AWAITING_INPUT" and st.session_state.research_questions:
@@ -122,23 +159,47 @@ if st.session_state.task_id and st.session_state.task_status != "COMPLETE":
             if approve_button:
                 with st.spinner("Sending approved plan to agent..."):
                     resume_response = resume_task(st.session_state.task_id, edited_questions)
-                    if resume_response and resume_response.get("status") == "RESUMED":
+                    if resume_response and resume_response.get("status") in ("RESUMED", "QUEUED"):
                         st.success("Agent has resumed research in the background!")
                         st.session_state.task_status = "RESUMED"
                         st.rerun()
 
-    # If agent is running after approval, show progress
+    # If agent is running after approval, follow its events until the report is ready
     elif st.session_state.task_status == "RESUMED":
         st.warning("⏳ **Research in Progress:** The agent is now executing the approved plan. This may take a moment. The page will automatically update when the final report is ready.")
-        time.sleep(5) # Wait before re-checking status
-        st.rerun()
+        report_placeholder = st.empty()
+        report_parts = []
+
+        def show_report_progress(event, data):
+            # Render the report while the summarizer is still writing it
+            if event == "report_partial":
+                report_parts[:] = [data.get("text", "")]
+            elif event == "report_token":
+                report_parts.append(data.get("text", ""))
+            else:
+                return
+            report_placeholder.markdown("".join(report_parts))
+
+        with st.spinner("Researching..."):
+            update = wait_for_task_event(st.session_state.task_id, {"complete"}, on_event=show_report_progress)
+        if update and update[0] == "complete":
+            st.session_state.task_status = "COMPLETE"
+            st.rerun()
+        elif update:
+            st.error(f"Research failed: {update[1].get('detail')}")
+        else:
+            time.sleep(5) # Event stream unavailable; wait before re-checking status
+            status_data = get_task_status(st.session_state.task_id)
+            if status_data and status_data.get("status") == "COMPLETE":
+                st.session_state.task_status = "COMPLETE"
+            st.rerun()
 
     # If the task is somehow complete, move to the final report stage
     elif st.session_state.task_status == "COMPLETE":
         st.rerun()
     
     else:
-        # Initial state before the plan is ready
+        # The plan is not ready yet
         st.info("Waiting for the agent to generate the research plan...")
         time.sleep(3)
         st.rerun()
@@ -0,0 +1,39 @@
+import asyncio
+
+from app.utils.resilience import CallPolicy, ResilientCaller
+
+
+def test_cancelled_half_open_trial_frees_the_breaker():
+    async def scenario():
+        caller = ResilientCaller("service", CallPolicy(timeout=5, deadline=5, retries=0, breaker_failures=1,
+                                                       breaker_reset_seconds=0))
+
+        async def fail():
+            raise RuntimeError("down")
+
+        async def hang():
+            await asyncio.sleep(60)
+
+        async def answer():
+            return "ok"
+
+        try:
+            await caller.call(fail)
+        except RuntimeError:
+            pass
+        assert caller.breaker.state == "open"
+
+        # The half-open trial is cancelled while it waits for the service
+        trial = asyncio.ensure_future(caller.call(hang))
+        await asyncio.sleep(0.01)
+        assert caller.breaker.state == "half_open"
+        trial.cancel()
+        try:
+            await trial
+        except asyncio.CancelledError:
+            pass
+
+        assert await caller.call(answer) == "ok"
+        assert caller.breaker.state == "closed"
+
+    asyncio.run(scenario())
@@ -19,38 +19,18 @@ export default function ApprovalScreen({ taskId, onPlanApproved }) {
       setLoading(true);
       setError('');
       
-      // Poll for the research questions
-      const pollInterval = setInterval(async () => {
-        try {
-          const response = await api.getTaskStatus(taskId);
-          
-          if (response.status === 'AWAITING_INPUT' && response.research_questions) {
-            setResearchQuestions(response.research_questions);
-            setLoading(false);
-            clearInterval(pollInterval);
-          } else if (response.status === 'COMPLETE') {
-            // If already complete, go straight to results
-            onPlanApproved();
-            clearInterval(pollInterval);
-          }
-        } catch (err) {
-          console.error('Error fetching questions:', err);
-          setError('Failed to fetch research questions');
-          setLoading(false);
-          clearInterval(pollInterval);
-        }
-      }, 2000);
-
-      // Clear interval after 30 seconds to prevent infinite polling
-      setTimeout(() => {
-        clearInterval(pollInterval);
-        if (loading) {
-          setError('Timeout waiting for research questions');
-          setLoading(false);
-        }
-      }, 30000);
-
+      // Wait for the plan on the task's event stream
+      const response = await api.waitForPlan(taskId);
+      
+      if (response.status === 'AWAITING_INPUT' && response.research_questions) {
+        setResearchQuestions(response.research_questions);
+        setLoading(false);
+      } else if (response.status === 'COMPLETE') {
+        // If already complete, go straight to results
+        onPlanApproved();
+      }
     } catch (err) {
+      console.error('Error fetching questions:', err);
       setError(err.message || 'Failed to fetch research questions');
       setLoading(false);
     }
@@ -10,6 +10,7 @@ export default function ReportDisplay({ taskId, onReset }) {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [progress, setProgress] = useState('Initializing...');
+  const [partialReport, setPartialReport] = useState('');
 
   useEffect(() => {
     if (!taskId) return;
@@ -20,7 +21,8 @@ export default function ReportDisplay({ taskId, onReset }) {
         setError(null);
         
         const data = await api.getResults(taskId, {
-          onProgress: setProgress
+          onProgress: setProgress,
+          onPartialReport: setPartialReport
         });
         
         setResults(data);
@@ -40,11 +42,23 @@ export default function ReportDisplay({ taskId, onReset }) {
       <div className="min-h-screen bg-gradient-to-br from-slate-50 to-blue-50 p-4">
         <div className="max-w-6xl mx-auto space-y-8">
           <LoadingState title="Research in Progress" subtitle={progress} />
-          <div className="space-y-6">
-            <div className="loading-pulse modern-card h-64"></div>
-            <div className="loading-pulse modern-card h-48"></div>
-            <div className="loading-pulse modern-card h-56"></div>
-          </div>
+          {partialReport ? (
+            <div className="report-summary-card">
+              <h2 className="text-xl font-semibold text-gray-900 mb-6 flex items-center gap-2">
+                <span className="text-purple-500">📋</span>
+                Executive Summary (writing...)
+              </h2>
+              <div className="prose-modern">
+                <Markdown>{partialReport}</Markdown>
+              </div>
+            </div>
+          ) : (
+            <div className="space-y-6">
+              <div className="loading-pulse modern-card h-64"></div>
+              <div className="loading-pulse modern-card h-48"></div>
+              <div className="loading-pulse modern-card h-56"></div>
+            </div>
+          )}
         </div>
       </div>
     );
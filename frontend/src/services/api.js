@@ -46,12 +46,77 @@ export function hasValidReport(report) {
   return isSummaryReady(report);
 }
 
-// Strict fetch: wait for COMPLETE, then poll /results until summary is ready
+// Human-readable progress messages for the task event stream
+const EVENT_MESSAGES = {
+  planning: 'Planning research...',
+  planned: 'Research plan ready',
+  awaiting_input: 'Waiting for plan approval',
+  resumed: 'Research started',
+  running: 'Researching...',
+  research_complete: 'Research complete, preparing report...',
+  summarizing: 'Writing the report...',
+  complete: 'Report ready',
+};
+
+const TASK_EVENTS = [
+  ...Object.keys(EVENT_MESSAGES), 'question_researched', 'report_partial', 'report_token', 'error',
+];
+
+// The server answers 429 with a Retry-After header when its run queues are full
+function busyError(response) {
+  const retryAfter = response.headers.get('Retry-After');
+  return new Error(`The server is busy. Please try again in ${retryAfter || 'a few'} seconds.`);
+}
+
+// Subscribe to the task's Server-Sent Events stream; returns a function that closes it
+export function subscribeToTaskEvents(taskId, { onEvent, onError } = {}) {
+  const source = new EventSource(`${API_BASE_URL}/events/${encodeURIComponent(taskId)}`);
+  TASK_EVENTS.forEach((name) => {
+    source.addEventListener(name, (e) => {
+      let data = {};
+      try { data = JSON.parse(e.data || '{}'); } catch (_) { /* keep empty payload */ }
+      if (typeof onEvent === 'function') onEvent(name, data);
+      if (name === 'complete' || name === 'error') source.close();
+    });
+  });
+  source.onerror = (err) => {
+    // EventSource reconnects on its own while the stream is open; only report a closed stream
+    if (source.readyState === EventSource.CLOSED && typeof onError === 'function') onError(err);
+  };
+  return () => source.close();
+}
+
+function describeEvent(name, data) {
+  if (name === 'question_researched') return `Researched: ${data.question}`;
+  return EVENT_MESSAGES[name] || name;
+}
+
+// Wait for the 'complete' event on the task's event stream, passing along the report as it streams
+function waitForCompletion(taskId, onProgress, onPartialReport) {
+  let partialReport = '';
+  return new Promise((resolve, reject) => {
+    subscribeToTaskEvents(taskId, {
+      onEvent: (name, data) => {
+        if (name === 'report_partial' || name === 'report_token') {
+          partialReport = name === 'report_partial' ? data.text || '' : partialReport + (data.text || '');
+          if (typeof onPartialReport === 'function') onPartialReport(partialReport);
+          return;
+        }
+        if (typeof onProgress === 'function') onProgress(describeEvent(name, data));
+        if (name === 'complete') resolve();
+        if (name === 'error') reject(new Error(data.detail || 'Research failed'));
+      },
+      onError: () => reject(new Error('Lost connection to the task event stream')),
+    });
+  });
+}
+
+// Fallback: wait for COMPLETE, then poll /results until summary is ready
 async function getResultsStrict(taskId, { pollIntervalMs = 2000, onProgress } = {}) {
   // 1) Wait for COMPLETE
   while (true) {
     try {
-      const res = await fetch(`http://127.0.0.1:8000/status/${encodeURIComponent(taskId)}`, {
+      const res = await fetch(`${API_BASE_URL}/status/${encodeURIComponent(taskId)}`, {
         headers: { 'Cache-Control': 'no-store' },
       });
       if (res.ok) {
@@ -72,7 +137,7 @@ async function getResultsStrict(taskId, { pollIntervalMs = 2000, onProgress } =
   // 2) Poll results until summary is actually populated
   while (true) {
     try {
-      const res = await fetch(`http://127.0.0.1:8000/results/${encodeURIComponent(taskId)}`, {
+      const res = await fetch(`${API_BASE_URL}/results/${encodeURIComponent(taskId)}`, {
         headers: { 'Cache-Control': 'no-store' },
       });
       if (res.ok) {
@@ -87,6 +152,60 @@ async function getResultsStrict(taskId, { pollIntervalMs = 2000, onProgress } =
   }
 }
 
+// Event-driven fetch: wait for the 'complete' event, then read /results once
+async function getResultsFromEvents(taskId, { onProgress, onPartialReport, ...opts } = {}) {
+  if (typeof EventSource === 'undefined') return getResultsStrict(taskId, { onProgress, ...opts });
+
+  try {
+    await waitForCompletion(taskId, onProgress, onPartialReport);
+  } catch (err) {
+    if (err.message === 'Lost connection to the task event stream') {
+      return getResultsStrict(taskId, { onProgress, ...opts });
+    }
+    throw err;
+  }
+
+  const res = await fetch(`${API_BASE_URL}/results/${encodeURIComponent(taskId)}`, {
+    headers: { 'Cache-Control': 'no-store' },
+  });
+  if (!res.ok) {
+    const body = await res.json().catch(() => ({}));
+    throw new Error(body.detail || `Failed to fetch results: ${res.statusText}`);
+  }
+  return res.json();
+}
+
+// Wait for the planner's questions via the event stream (polling /status as a fallback)
+async function waitForPlan(taskId, { pollIntervalMs = 2000 } = {}) {
+  if (typeof EventSource !== 'undefined') {
+    try {
+      return await new Promise((resolve, reject) => {
+        const close = subscribeToTaskEvents(taskId, {
+          onEvent: (name, data) => {
+            if (name === 'awaiting_input') {
+              close();
+              resolve({ status: 'AWAITING_INPUT', research_questions: data.research_questions });
+            } else if (name === 'complete') {
+              resolve({ status: 'COMPLETE' });
+            } else if (name === 'error') {
+              reject(new Error(data.detail || 'Planning failed'));
+            }
+          },
+          onError: () => reject(new Error('Lost connection to the task event stream')),
+        });
+      });
+    } catch (err) {
+      if (err.message !== 'Lost connection to the task event stream') throw err;
+    }
+  }
+
+  while (true) {
+    const status = await api.getTaskStatus(taskId);
+    if (status.status === 'AWAITING_INPUT' || status.status === 'COMPLETE') return status;
+    await sleep(pollIntervalMs);
+  }
+}
+
 // If you have an existing api object, replace its getResults implementation:
 export const api = {
   // Start a new research task (long timeout)
@@ -104,6 +223,7 @@ export const api = {
       body,
     }, LONG_TIMEOUT_MS);
     
+    if (response.status === 429) throw busyError(response);
     if (!response.ok) {
       throw new Error(`Failed to start research: ${response.statusText}`);
     }
@@ -132,6 +252,7 @@ export const api = {
       body: JSON.stringify({ research_questions: researchQuestions }),
     }, LONG_TIMEOUT_MS);
     
+    if (response.status === 429) throw busyError(response);
     if (!response.ok) {
       throw new Error(`Failed to resume task: ${response.statusText}`);
     }
@@ -139,8 +260,11 @@ export const api = {
     return response.json();
   },
 
-  // Replace the api.getResults to use strict mode
-  getResults: (taskId, opts) => getResultsStrict(taskId, opts),
+  // Wait for the planner's research questions
+  waitForPlan: (taskId, opts) => waitForPlan(taskId, opts),
+
+  // Wait for completion over the event stream, then fetch the final report
+  getResults: (taskId, opts) => getResultsFromEvents(taskId, opts),
 };
 
 export default api;